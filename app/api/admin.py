@@ -7,7 +7,10 @@ from app.core.security import get_current_user
 from app.models.user import UserDB
 from app.schemas.transaction import DepositRequest, TransactionResponse
 from app.schemas.auth import UserResponse
+from app.schemas.task import DeadLetterResponse, DeadLetterReplayResponse
 from app.repositories import deposit, get_transactions, get_user_by_id
+from app.rabbitmq.publisher import publisher
+from app.core.metrics import counters
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -98,3 +101,40 @@ def get_all_transactions(
     ]
 
 
+@router.get(
+    "/dead-letters",
+    response_model=List[DeadLetterResponse],
+    summary="Задачи из dead letter очереди (только для админов)"
+)
+def list_dead_letters(
+    limit: int = Query(50, ge=1, le=500, description="Максимальное количество задач"),
+    admin: UserDB = Depends(require_admin),
+):
+    try:
+        return publisher.get_dead_letters(limit)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+
+@router.post(
+    "/dead-letters/replay",
+    response_model=DeadLetterReplayResponse,
+    summary="Вернуть задачи из dead letter очереди в работу (только для админов)"
+)
+def replay_dead_letters(
+    limit: int = Query(100, ge=1, le=1000, description="Сколько задач вернуть в очередь"),
+    admin: UserDB = Depends(require_admin),
+):
+    try:
+        replayed = publisher.replay_dead_letters(limit)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return DeadLetterReplayResponse(replayed=replayed)
+
+
+@router.get(
+    "/metrics",
+    summary="Счётчики этого процесса API (только для админов)"
+)
+def get_metrics(admin: UserDB = Depends(require_admin)):
+    return counters.snapshot()
@@ -0,0 +1,79 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+
+from app.core.config import settings
+from app.core.events import user_events
+from app.core.security import verify_token
+from app.db.base import SessionLocal
+from app.repositories import get_user_by_id
+
+router = APIRouter(prefix="/users/me", tags=["events"])
+
+# EventSource не умеет передавать заголовки, поэтому токен можно передать и в query
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+def _authenticate(token: Optional[str]) -> str:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    if not token:
+        raise credentials_exception
+    payload = verify_token(token, credentials_exception)
+
+    # пользователя проверяем один раз при подключении: открытый поток не держит соединение с БД
+    db = SessionLocal()
+    try:
+        user = get_user_by_id(db, payload.get("sub"))
+    finally:
+        db.close()
+    if user is None:
+        raise credentials_exception
+    return user.id
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _stream(request: Request, user_id: str, queue: asyncio.Queue) -> AsyncIterator[str]:
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                # комментарий держит соединение живым через прокси
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        user_events.unsubscribe(user_id, queue)
+
+
+@router.get(
+    "/events/stream",
+    summary="Поток событий пользователя (Server-Sent Events)",
+    description="Изменения баланса, новые транзакции и готовые предсказания по мере появления",
+)
+async def event_stream(
+    request: Request,
+    token: Optional[str] = Query(None, description="JWT, если нельзя передать заголовок Authorization"),
+    bearer: Optional[str] = Depends(optional_oauth2_scheme),
+):
+    user_id = _authenticate(bearer or token)
+    queue = user_events.subscribe(user_id)
+    return StreamingResponse(
+        _stream(request, user_id, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
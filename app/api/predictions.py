@@ -1,18 +1,157 @@
-from typing import List
-import uuid
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import re
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.events import user_events
+from app.core.metrics import counters
 from app.db.base import get_db
 from app.core.security import get_current_user
+from app.models.prediction import PredictionDB
 from app.models.user import UserDB
-from app.schemas.prediction import PredictionRequest, PredictionResponse
-from app.repositories import add_prediction, get_predictions, withdraw
+from app.schemas.prediction import (
+    PredictionBatchRequest,
+    PredictionBatchResponse,
+    PredictionRequest,
+    PredictionResponse,
+)
+from app.repositories import (
+    IdempotencyKeyTaken,
+    get_idempotent_prediction,
+    get_prediction,
+    get_predictions,
+    fail_unpublished_predictions,
+    save_prediction_results,
+    submit_predictions,
+)
+from app.rabbitmq.outbox import outbox_relay
 from app.rabbitmq.publisher import publisher
+from app.rabbitmq.results import result_notifier
+from app.workers.inline import inline_executor
 
 router = APIRouter(prefix="", tags=["predictions"])
 
-PREDICTION_COST = 10.0
+PREDICTION_COST = settings.PREDICTION_COST
+
+IDEMPOTENCY_KEY_DESCRIPTION = "Повтор запроса с тем же ключом вернёт то же предсказание без нового списания"
+WAIT_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)(ms|s)?$")
+
+
+def _prediction_response(prediction: PredictionDB) -> PredictionResponse:
+    return PredictionResponse(
+        id=prediction.id,
+        user_id=prediction.user_id,
+        input_data=prediction.input_data,
+        output_data=prediction.output_data,
+        model_type=prediction.model_type,
+        confidence=prediction.confidence,
+        status=prediction.status,
+        error=prediction.error,
+        created_at=prediction.created_at.isoformat(),
+    )
+
+
+def _submit(
+    db: Session,
+    current_user: UserDB,
+    texts: List[str],
+    priority: str,
+    outbox: bool,
+    idempotency_key: Optional[str] = None,
+    needs_broker: bool = True,
+) -> Tuple[List[Dict[str, Any]], float, List[Dict[str, Any]]]:
+    # брокер недоступен: отвечаем сразу и ничего не списываем. Задаче, которую посчитаем
+    # на месте, брокер не нужен — при открытом breaker inline как раз лучше очереди
+    if needs_broker and not publisher.breaker.allow():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Task queue is unavailable, try again later",
+            headers={"Retry-After": str(max(1, round(publisher.breaker.snapshot()['retry_in_seconds'])))},
+        )
+
+    total = PREDICTION_COST * len(texts)
+    if current_user.balance < total:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Insufficient funds. Required: {total}, Available: {current_user.balance}",
+        )
+
+    # одна транзакция: условное списание, строки предсказаний, записи в журнале и outbox;
+    # параллельные запросы одного пользователя не теряют обновления баланса
+    try:
+        return submit_predictions(
+            db=db,
+            user_id=current_user.id,
+            inputs=texts,
+            model_type="text_to_command",
+            cost=PREDICTION_COST,
+            task_fields={
+                'priority': priority,
+                # после дедлайна воркер не считает задачу, а возвращает деньги
+                'deadline': time.time() + settings.ML_TASK_DEADLINE_SECONDS,
+            },
+            outbox=outbox,
+            idempotency_key=idempotency_key,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+
+
+def _replay(
+    db: Session,
+    current_user: UserDB,
+    idempotency_key: Optional[str],
+    text: str,
+) -> Optional[PredictionResponse]:
+    # повтор запроса с тем же ключом: отдаём то же предсказание, не трогая баланс и очередь
+    if not idempotency_key:
+        return None
+    prediction = get_idempotent_prediction(db, current_user.id, idempotency_key)
+    if prediction is None:
+        return None
+    if prediction.input_data != text:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    counters.inc("idempotent_replays")
+    return _prediction_response(prediction)
+
+
+def _parse_wait(value: Optional[str]) -> float:
+    if not value:
+        return 0.0
+    match = WAIT_PATTERN.match(value.strip())
+    if match is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="wait must look like 5s, 500ms or 5",
+        )
+    seconds = float(match.group(1)) / (1000.0 if match.group(2) == "ms" else 1.0)
+    return min(seconds, settings.PREDICTION_WAIT_MAX_SECONDS)
+
+
+def _use_outbox() -> bool:
+    return settings.TASK_PUBLISH_MODE == "outbox"
+
+
+def _publish_failed(db: Session, prediction: PredictionDB, detail: str) -> HTTPException:
+    # оплаченная задача не ушла в очередь и строки outbox у неё нет: без возврата
+    # предсказание висело бы в pending, а деньги были бы списаны
+    fail_unpublished_predictions(db, [prediction.id], detail, PREDICTION_COST)
+    user_events.publish(prediction.user_id, {
+        'type': 'prediction',
+        'prediction_ids': [prediction.id],
+        'status': 'failed',
+    })
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail)
 
 
 @router.post(
@@ -23,67 +162,123 @@ PREDICTION_COST = 10.0
 def predict_text(
     payload: PredictionRequest,
     current_user: UserDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, max_length=255, description=IDEMPOTENCY_KEY_DESCRIPTION),
 ):
-    db.refresh(current_user)
-    
-    if current_user.balance < PREDICTION_COST:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Insufficient funds. Required: {PREDICTION_COST}, Available: {current_user.balance}",
+    replay = _replay(db, current_user, idempotency_key, payload.text)
+    if replay is not None:
+        return replay
+
+    inline = inline_executor.should_run_inline("text_to_command")
+    # строка outbox пишется вместе со списанием и при inline-расчёте: если процесс упадёт
+    # до сохранения результата, оплаченную задачу досчитает воркер
+    try:
+        predictions, _, tasks = _submit(
+            db, current_user, [payload.text], payload.priority, outbox=_use_outbox(),
+            idempotency_key=idempotency_key, needs_broker=not inline,
         )
+    except IdempotencyKeyTaken:
+        return _replay(db, current_user, idempotency_key, payload.text)
+    prediction = PredictionDB(**predictions[0])
+    task_data = tasks[0]
+
+    if inline:
+        result = inline_executor.run(task_data)
+        if result is not None:
+            # дешёвая модель посчитана прямо в запросе: ответ сразу, без очереди и опроса
+            save_prediction_results(db, [result], settle_outbox=_use_outbox())
+            user_events.publish(prediction.user_id, {
+                'type': 'prediction',
+                'prediction_ids': [prediction.id],
+                'status': result['status'],
+            })
+            return _prediction_response(db.get(PredictionDB, prediction.id))
+
+    counters.inc("predictions_queued")
+    if _use_outbox():
+        outbox_relay.notify()
+    elif not publisher.publish_task(task_data):
+        # в том числе задача, не посчитанная inline: списание прошло мимо breaker-а,
+        # и при открытой цепи публикация отказывает сразу
+        raise _publish_failed(db, prediction, "Failed to publish task to queue")
+
+    return _prediction_response(prediction)
 
-    task_id = str(uuid.uuid4())
-    prediction_id = str(uuid.uuid4())
-    
-    prediction = add_prediction(
-        db=db,
-        id=prediction_id,
-        user_id=current_user.id,
-        input_data=payload.text,
-        output_data=None,
-        model_type="text_to_command",
-        confidence=None,
-        task_id=task_id,
-    )
 
+@router.post(
+    "/predict/text/sync",
+    response_model=PredictionResponse,
+    summary="Отправить текст и дождаться ответа ML-модели (RPC через очередь)",
+)
+def predict_text_sync(
+    payload: PredictionRequest,
+    current_user: UserDB = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, max_length=255, description=IDEMPOTENCY_KEY_DESCRIPTION),
+):
+    replay = _replay(db, current_user, idempotency_key, payload.text)
+    if replay is not None:
+        return replay
+
+    # задача идёт мимо outbox: ответ воркер присылает в очередь ответов этого процесса
     try:
-        withdraw(
-            db=db,
-            user_id=current_user.id,
-            amount=PREDICTION_COST,
-            description=f"Оплата предсказания #{prediction.id}",
-        )
-    except ValueError as e:
-        db.delete(prediction)
-        db.commit()
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e),
+        predictions, _, tasks = _submit(
+            db, current_user, [payload.text], payload.priority, outbox=False,
+            idempotency_key=idempotency_key,
         )
+    except IdempotencyKeyTaken:
+        return _replay(db, current_user, idempotency_key, payload.text)
+    prediction = PredictionDB(**predictions[0])
+    # соединение с БД на время ожидания не держим
+    db.rollback()
 
-    task_data = {
-        'task_id': task_id,
-        'user_id': current_user.id,
-        'task_type': 'text_to_command',
-        'input_data': payload.text,
-        'prediction_id': prediction.id
-    }
+    counters.inc("predictions_queued")
+    counters.inc("prediction_rpc_calls")
+    try:
+        reply = publisher.call(tasks[0])
+    except Exception as e:
+        print(f"Error publishing RPC task: {e}")
+        raise _publish_failed(db, prediction, "Failed to publish task to queue")
+
+    if reply is None:
+        # воркер не успел: задача останется в очереди, результат можно дождаться через GET
+        counters.inc("prediction_rpc_timeouts")
+        return _prediction_response(prediction)
+
+    prediction.output_data = reply.get('output_data')
+    prediction.confidence = reply.get('confidence')
+    prediction.status = reply.get('status')
+    prediction.error = reply.get('error')
+    return _prediction_response(prediction)
+
+
+@router.post(
+    "/predict/text/batch",
+    response_model=PredictionBatchResponse,
+    summary="Отправить пачку текстов на обработку ML-моделью",
+)
+def predict_text_batch(
+    payload: PredictionBatchRequest,
+    current_user: UserDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    predictions, balance, tasks = _submit(
+        db, current_user, payload.texts, payload.priority, outbox=_use_outbox()
+    )
 
-    if not publisher.publish_task(task_data):
+    counters.inc("predictions_queued", len(tasks))
+    if _use_outbox():
+        outbox_relay.notify()
+    elif not publisher.publish_tasks(tasks):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to publish task to queue"
+            detail="Failed to publish tasks to queue"
         )
 
-    return PredictionResponse(
-        id=prediction.id,
-        user_id=prediction.user_id,
-        input_data=prediction.input_data,
-        output_data=prediction.output_data,
-        model_type=prediction.model_type,
-        confidence=prediction.confidence,
-        created_at=prediction.created_at.isoformat(),
+    return PredictionBatchResponse(
+        prediction_ids=[prediction['id'] for prediction in predictions],
+        charged=PREDICTION_COST * len(predictions),
+        balance=balance,
     )
 
 
@@ -98,16 +293,48 @@ def list_predictions(
     db: Session = Depends(get_db),
 ):
     predictions = get_predictions(db, user_id=current_user.id, limit=limit)
-    return [
-        PredictionResponse(
-            id=p.id,
-            user_id=p.user_id,
-            input_data=p.input_data,
-            output_data=p.output_data,
-            model_type=p.model_type,
-            confidence=p.confidence,
-            created_at=p.created_at.isoformat(),
-        )
-        for p in predictions
-    ]
+    return [_prediction_response(p) for p in predictions]
+
+
+def _read_prediction(db: Session, prediction_id: str, user_id: str) -> Optional[PredictionResponse]:
+    # выполняется в пуле потоков, чтобы запросы к БД не блокировали event loop;
+    # соединение с БД возвращаем в пул до ожидания результата
+    prediction = get_prediction(db, prediction_id, user_id)
+    response = _prediction_response(prediction) if prediction is not None else None
+    db.rollback()
+    return response
+
+
+@router.get(
+    "/predictions/{prediction_id}",
+    response_model=PredictionResponse,
+    summary="Получить предсказание, при необходимости дождавшись результата",
+)
+async def get_prediction_result(
+    prediction_id: str,
+    wait: Optional[str] = Query(
+        None, description="Сколько ждать готового результата: 5s, 500ms; не больше PREDICTION_WAIT_MAX_SECONDS"
+    ),
+    current_user: UserDB = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    timeout = _parse_wait(wait)
+    user_id = current_user.id
+    # подписываемся до чтения из БД: результат, записанный между чтением и ожиданием, не потеряется
+    future = result_notifier.subscribe(prediction_id) if timeout > 0 else None
+    try:
+        response = await run_in_threadpool(_read_prediction, db, prediction_id, user_id)
+        if response is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prediction not found")
+        if future is None or response.status != 'pending':
+            return response
 
+        counters.inc("prediction_waits")
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            counters.inc("prediction_wait_timeouts")
+        return await run_in_threadpool(_read_prediction, db, prediction_id, user_id)
+    finally:
+        if future is not None:
+            result_notifier.unsubscribe(prediction_id, future)
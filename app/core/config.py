@@ -1,3 +1,6 @@
+from typing import List
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,12 +14,77 @@ class Settings(BaseSettings):
     RABBITMQ_USER: str = "guest"
     RABBITMQ_PASSWORD: str = "guest"
     RABBITMQ_QUEUE: str = "ml_tasks"
+    RABBITMQ_EXCHANGE: str = "ml_tasks"
+    RABBITMQ_RESULTS_EXCHANGE: str = "ml_results"
+    RABBITMQ_MAX_PRIORITY: int = 10
+    RABBITMQ_HEARTBEAT: int = 30
+    RABBITMQ_QUEUE_MAX_LENGTH: int = 10000
+    RABBITMQ_QUEUE_OVERFLOW: str = "drop-head"
+    PREDICTION_COST: float = 10.0
+    PREDICTION_BATCH_MAX_SIZE: int = 100
+    PREDICTION_WAIT_MAX_SECONDS: int = 30
+    PREDICTION_RPC_TIMEOUT_MS: int = 5000
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_KEEPALIVE_SECONDS: int = 15
+    EVENTS_RETRY_MS: int = 3000
+    TASK_PUBLISH_MODE: str = "outbox"
+    PUBLISHER_BATCH_SIZE: int = 500
+    PUBLISHER_MAX_PENDING: int = 10000
+    BROKER_CALL_BUDGET_MS: int = 2000
+    BROKER_BREAKER_FAILURE_THRESHOLD: int = 3
+    BROKER_BREAKER_RESET_TIMEOUT_MS: int = 10000
+    PUBLISHER_RECONNECT_DELAY_MS: int = 1000
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL_MS: int = 500
+    OUTBOX_MAX_BACKOFF_MS: int = 30000
+    OUTBOX_RETENTION_HOURS: int = 24
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+    ML_TASK_DEADLINE_SECONDS: int = 60
+    PREDICTION_EXECUTION_MODE: str = "queue"
+    PREDICTION_INLINE_THREADS: int = 4
+    PREDICTION_INLINE_MAX_IN_FLIGHT: int = 16
+    PREDICTION_INLINE_TIMEOUT_MS: int = 200
+    PREDICTION_INLINE_MAX_QUEUE_DEPTH: int = 10
+    PREDICTION_INLINE_DEPTH_TTL_MS: int = 1000
+    ML_TASK_MAX_ATTEMPTS: int = 4
+    ML_TASK_RETRY_DELAYS_MS: List[int] = [1000, 5000, 20000]
+    ML_WORKER_BATCH_SIZE: int = 1
+    ML_WORKER_BATCH_TIMEOUT_MS: int = 50
+    ML_WORKER_FAIR_SCHEDULING: bool = False
+    ML_WORKER_FAIR_WINDOW: int = 256
+    ML_WORKER_TASK_TYPES: List[str] = ["text_to_command"]
+    ML_WORKER_PROCESSES: int = 1
+    ML_WORKER_HEALTH_PORT: int = 8081
+    ML_WORKER_ENGINE: str = "blocking"
+    ML_WORKER_CONCURRENCY: int = 8
+    ML_WORKER_INFERENCE_THREADS: int = 2
+    ML_WORKER_DEDUPE: bool = True
+    ML_WORKER_ESCALATION_MODEL: str = ""
+    ML_CASCADE_CONFIDENCE_THRESHOLD: float = 0.7
+    INTENT_CLASSIFIER_PATH: str = "models/intent_classifier.npz"
+    PREDICTION_CACHE_SIZE: int = 10000
+    PREDICTION_CACHE_TTL_SECONDS: int = 300
+    PREDICTION_CACHE_SHARED: bool = False
     
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore"
     )
 
+    @model_validator(mode="after")
+    def check_retry_delays_fit_deadline(self):
+        # дедлайн лежит в теле задачи и ретраями не продлевается: если задержки ретраев
+        # в сумме не короче него, последняя попытка всегда приходит просроченной
+        delays = self.ML_TASK_RETRY_DELAYS_MS
+        if delays:
+            total = sum(delays[min(attempt, len(delays)) - 1] for attempt in range(1, self.ML_TASK_MAX_ATTEMPTS))
+            if total >= self.ML_TASK_DEADLINE_SECONDS * 1000:
+                raise ValueError(
+                    f"ML_TASK_RETRY_DELAYS_MS add up to {total} ms over {self.ML_TASK_MAX_ATTEMPTS} attempts, "
+                    f"which does not fit into ML_TASK_DEADLINE_SECONDS={self.ML_TASK_DEADLINE_SECONDS}"
+                )
+        return self
+
 
 settings = Settings()
 
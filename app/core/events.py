@@ -0,0 +1,55 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import settings
+
+RESYNC = {"type": "resync"}
+
+
+# события пользователя (баланс, транзакции, предсказания) для открытых SSE-потоков этого процесса;
+# publish можно звать из любого потока, подписчик читает свою asyncio.Queue в event loop-е
+class UserEvents:
+    def __init__(self):
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = [s for s in self._subscribers.get(user_id, []) if s[1] is not queue]
+            if subscribers:
+                self._subscribers[user_id] = subscribers
+            else:
+                self._subscribers.pop(user_id, None)
+
+    def subscribers(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put, queue, event)
+            except RuntimeError:
+                # event loop подписчика уже закрыт
+                pass
+
+
+def _put(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+    if queue.full():
+        # клиент не успевает читать: вместо накопления просим его перечитать всё разом
+        while not queue.empty():
+            queue.get_nowait()
+        event = RESYNC
+    queue.put_nowait(event)
+
+
+user_events = UserEvents()
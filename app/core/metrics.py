@@ -0,0 +1,72 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# счётчики воркера, которые супервизор собирает со всех процессов
+WORKER_COUNTERS = (
+    "tasks_shed_deadline",
+    "tasks_shed_overflow",
+    "tasks_dedupe_lookups",
+    "tasks_dedupe_hits",
+    # каскад text_to_command: stage0 — правила, stage1 — модель для эскалаций
+    "cascade_predictions",
+    "cascade_escalations",
+    "cascade_stage0_calls",
+    "cascade_stage0_seconds",
+    "cascade_stage1_calls",
+    "cascade_stage1_seconds",
+    # кэш предсказаний text_to_command (CachedModel)
+    "prediction_cache_hits",
+    "prediction_cache_shared_hits",
+    "prediction_cache_misses",
+    "prediction_cache_evictions",
+)
+
+
+def cascade_summary(values: Dict[str, float]) -> Dict[str, float]:
+    # доля эскалаций — это доля трафика, под которую нужен пул тяжёлых воркеров
+    predictions = values.get("cascade_predictions", 0.0)
+    summary = {
+        "cascade_escalation_rate": values.get("cascade_escalations", 0.0) / predictions if predictions else 0.0,
+    }
+    for stage in (0, 1):
+        calls = values.get(f"cascade_stage{stage}_calls", 0.0)
+        seconds = values.get(f"cascade_stage{stage}_seconds", 0.0)
+        summary[f"cascade_stage{stage}_avg_ms"] = seconds / calls * 1000 if calls else 0.0
+    return summary
+
+
+def cache_hit_rate(values: Dict[str, float]) -> float:
+    hits = values.get("prediction_cache_hits", 0.0) + values.get("prediction_cache_shared_hits", 0.0)
+    lookups = hits + values.get("prediction_cache_misses", 0.0)
+    return hits / lookups if lookups else 0.0
+
+
+def dedupe_hit_rate(values: Dict[str, float]) -> float:
+    lookups = values.get("tasks_dedupe_lookups", 0.0)
+    return values.get("tasks_dedupe_hits", 0.0) / lookups if lookups else 0.0
+
+
+class Counters:
+    def __init__(self):
+        self._values: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0) -> None:
+        with self._lock:
+            self._values[name] += value
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._values.get(name, 0.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+counters = Counters()
@@ -45,7 +45,7 @@ def verify_token(token: str, credentials_exception: HTTPException) -> dict:
         raise credentials_exception
 
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> UserDB:
@@ -1,13 +1,19 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from app.db.base import Base, engine, SessionLocal
-from app.api import auth, balance, transactions, predictions, admin, calendar
+from app.api import auth, balance, transactions, predictions, admin, calendar, events
 from app.repositories import create_user
+from app.core.config import settings
+from app.rabbitmq.circuit_breaker import OPEN
+from app.rabbitmq.outbox import outbox_relay
 from app.rabbitmq.publisher import publisher
+from app.rabbitmq.results import result_listener
+from app.workers.inline import inline_executor
 
 
 def init_demo_data() -> None:
@@ -52,7 +58,15 @@ async def lifespan(app: FastAPI):
         publisher._connect()
     except Exception as e:
         print(f"Warning: Could not connect to RabbitMQ at startup: {e}")
+    if settings.TASK_PUBLISH_MODE == "outbox":
+        # задачи публикует фоновый relay, запросы не ждут брокер
+        outbox_relay.start()
+    # очередь результатов привязывается к обменнику до первых запросов: иначе результаты,
+    # пришедшие раньше первого ожидания, ни до кого не дошли бы
+    result_listener.start()
     yield
+    outbox_relay.stop()
+    inline_executor.shutdown()
     publisher.close()
 
 
@@ -81,6 +95,10 @@ app = FastAPI(
             "name": "predictions",
             "description": "Работа с ML-предсказаниями",
         },
+        {
+            "name": "events",
+            "description": "Поток событий пользователя (Server-Sent Events)",
+        },
     ],
 )
 
@@ -98,6 +116,7 @@ app.include_router(transactions.router)
 app.include_router(predictions.router)
 app.include_router(admin.router)
 app.include_router(calendar.router)
+app.include_router(events.router)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -140,5 +159,9 @@ async def health():
     """
     Health check endpoint
     """
-    return {"status": "healthy"}
+    broker = publisher.breaker.snapshot()
+    if broker['state'] == OPEN:
+        # 503: балансировщик и оркестратор уводят трафик с инстанса, который не может принять задачи
+        return JSONResponse(status_code=503, content={"status": "unavailable", "broker": broker})
+    return {"status": "healthy", "broker": broker}
 
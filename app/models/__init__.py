@@ -2,6 +2,9 @@ from app.models.user import UserDB
 from app.models.transaction import TransactionDB, TransactionTypeDB
 from app.models.prediction import PredictionDB
 from app.models.calendar_event import CalendarEventDB
+from app.models.outbox import OutboxDB
+from app.models.idempotency_key import IdempotencyKeyDB
+from app.models.prediction_cache import PredictionCacheDB
 
 __all__ = [
     "UserDB",
@@ -9,6 +12,9 @@ __all__ = [
     "TransactionTypeDB",
     "PredictionDB",
     "CalendarEventDB",
+    "OutboxDB",
+    "IdempotencyKeyDB",
+    "PredictionCacheDB",
 ]
 
 
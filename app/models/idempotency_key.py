@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, ForeignKey, UniqueConstraint
+
+from app.db.base import Base
+
+
+class IdempotencyKeyDB(Base):
+    __tablename__ = "idempotency_keys"
+    # уникальность (user_id, key) — арбитр для одновременных повторов одного запроса
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),)
+
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    key = Column(String, nullable=False)
+    prediction_id = Column(String, ForeignKey("predictions.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
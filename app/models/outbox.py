@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Text, Integer, DateTime
+
+from app.db.base import Base
+
+
+class OutboxDB(Base):
+    __tablename__ = "task_outbox"
+
+    id = Column(String, primary_key=True, index=True)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    sent_at = Column(DateTime, nullable=True, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
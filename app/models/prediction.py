@@ -15,6 +15,8 @@ class PredictionDB(Base):
     output_data = Column(String, nullable=True)
     model_type = Column(String, nullable=False)
     confidence = Column(Float, nullable=True)
+    status = Column(String, default="pending", nullable=False)
+    error = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     user = relationship("UserDB", back_populates="predictions")
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, Text, DateTime
+
+from app.db.base import Base
+
+
+class PredictionCacheDB(Base):
+    __tablename__ = "prediction_cache"
+
+    # sha256 ключа CachedModel: тип модели, дата и нормализованный текст
+    key = Column(String(64), primary_key=True)
+    output_data = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
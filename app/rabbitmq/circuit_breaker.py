@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import counters
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+# closed: вызовы идут к брокеру, BROKER_BREAKER_FAILURE_THRESHOLD неудач подряд размыкают цепь;
+# open: вызовы отклоняются сразу, без сети; через BROKER_BREAKER_RESET_TIMEOUT_MS — half-open;
+# half-open: вызовы снова идут к брокеру как пробные — первый успех замыкает цепь, первая неудача размыкает
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        reset_timeout_ms: Optional[int] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.BROKER_BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = (reset_timeout_ms or settings.BROKER_BREAKER_RESET_TIMEOUT_MS) / 1000.0
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            print(f"Circuit {self.name} half-open, probing")
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            allowed = self._current_state() != OPEN
+        if not allowed:
+            counters.inc(f"{self.name}_breaker_rejected")
+        return allowed
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit {self.name} is open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"Circuit {self.name} closed")
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or (state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                counters.inc(f"{self.name}_breaker_opened")
+                print(f"Circuit {self.name} opened after {self._failures} failures")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            retry_in = max(0.0, self._opened_at + self.reset_timeout - time.monotonic()) if state == OPEN else 0.0
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_in_seconds': round(retry_in, 3),
+            }
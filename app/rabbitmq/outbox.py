@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import counters
+from app.db.base import SessionLocal
+from app.rabbitmq.publisher import RabbitMQPublisher, publisher as default_publisher
+from app.repositories import claim_outbox, mark_outbox_failed, mark_outbox_sent, purge_outbox
+
+PUBLISH_MODES = ["outbox", "direct"]
+
+PURGE_INTERVAL = 60.0
+
+
+class OutboxRelay:
+    def __init__(self, publisher: Optional[RabbitMQPublisher] = None):
+        # publish_tasks ждёт publisher confirms; запросы API брокера не ждут вовсе
+        self.publisher = publisher or default_publisher
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failures = 0
+        self._last_purge = 0.0
+
+    def notify(self):
+        self._wakeup.set()
+
+    def run_once(self) -> int:
+        db = SessionLocal()
+        try:
+            rows = claim_outbox(db, settings.OUTBOX_BATCH_SIZE)
+            if not rows:
+                db.rollback()
+                return 0
+
+            ids = [row.id for row in rows]
+            tasks = [json.loads(row.payload) for row in rows]
+            if not self.publisher.publish_tasks(tasks):
+                mark_outbox_failed(db, ids, "Failed to publish tasks to queue")
+                raise RuntimeError(f"Failed to publish {len(ids)} outbox tasks")
+
+            mark_outbox_sent(db, ids)
+            counters.inc("outbox_published", len(ids))
+            return len(ids)
+        finally:
+            db.close()
+
+    def _purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        db = SessionLocal()
+        try:
+            purge_outbox(db, datetime.utcnow() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS))
+        finally:
+            db.close()
+
+    def _delay(self) -> float:
+        delay_ms = settings.OUTBOX_POLL_INTERVAL_MS * (2 ** min(self._failures, 10))
+        return min(delay_ms, settings.OUTBOX_MAX_BACKOFF_MS) / 1000.0
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                sent = self.run_once()
+                self._failures = 0
+                self._purge()
+            except Exception as e:
+                print(f"Outbox relay error: {e}")
+                counters.inc("outbox_publish_failures")
+                self._failures += 1
+                sent = 0
+
+            if sent >= settings.OUTBOX_BATCH_SIZE:
+                # в outbox остались строки — сразу берём следующую пачку
+                continue
+            if self._failures:
+                # брокер недоступен: новые задачи не будят relay раньше конца паузы
+                self._stopping.wait(self._delay())
+            else:
+                self._wakeup.wait(self._delay())
+            self._wakeup.clear()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+        print("Outbox relay started")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+
+outbox_relay = OutboxRelay()
@@ -1,70 +1,206 @@
 import json
+import threading
+import time
 import pika
-from typing import Dict, Any
+from concurrent.futures import Future, wait
+from typing import Dict, Any, List, Optional
 from app.core.config import settings
+from app.rabbitmq.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.rabbitmq.publisher_thread import PublisherThread, connection_parameters
+from app.rabbitmq.topology import (
+    ATTEMPT_HEADER,
+    DEADLINE_HEADER,
+    ERROR_HEADER,
+    ORIGIN_HEADER,
+    dead_letter_queue_name,
+    declare_topology,
+    origin_queue,
+)
 
 
 class RabbitMQPublisher:
     def __init__(self):
+        # синхронное соединение — для редких служебных операций (глубина очереди, dead letters),
+        # задачи публикует поток ввода-вывода PublisherThread
         self.connection = None
         self.channel = None
+        self._lock = threading.RLock()
+        self._io = PublisherThread()
+        # пока брокер недоступен, вызовы отклоняются сразу, не дожидаясь таймаутов
+        self.breaker = CircuitBreaker("broker")
 
     def _connect(self):
-        try:
-            credentials = pika.PlainCredentials(
-                settings.RABBITMQ_USER,
-                settings.RABBITMQ_PASSWORD
-            )
-            parameters = pika.ConnectionParameters(
-                host=settings.RABBITMQ_HOST,
-                port=settings.RABBITMQ_PORT,
-                credentials=credentials,
-                heartbeat=600,
-                blocked_connection_timeout=300
-            )
-            self.connection = pika.BlockingConnection(parameters)
-            self.channel = self.connection.channel()
-            self.channel.queue_declare(queue=settings.RABBITMQ_QUEUE, durable=True)
-        except Exception as e:
-            print(f"Error connecting to RabbitMQ: {e}")
-            raise
+        with self._lock:
+            try:
+                self.connection = pika.BlockingConnection(connection_parameters())
+                self.channel = self.connection.channel()
+                declare_topology(self.channel)
+            except Exception as e:
+                print(f"Error connecting to RabbitMQ: {e}")
+                raise
+            finally:
+                self._io.start()
+
+    def publish_async(self, task_data: Dict[str, Any]) -> Future:
+        self._io.start()
+        return self._io.submit(task_data)
 
     def publish_task(self, task_data: Dict[str, Any]) -> bool:
-        def _do_publish() -> None:
-            if not self.connection or self.connection.is_closed:
-                self._connect()
-
-            message = json.dumps(task_data)
-            self.channel.basic_publish(
-                exchange="",
-                routing_key=settings.RABBITMQ_QUEUE,
-                body=message,
-                properties=pika.BasicProperties(
-                    delivery_mode=2,
-                ),
+        return self.publish_tasks([task_data])
+
+    def publish_tasks(self, tasks: List[Dict[str, Any]]) -> bool:
+        if not self.breaker.allow():
+            print("Error publishing tasks: broker circuit is open")
+            return False
+        futures = [self.publish_async(task_data) for task_data in tasks]
+        done, not_done = wait(futures, timeout=settings.BROKER_CALL_BUDGET_MS / 1000.0)
+        for future in not_done:
+            # ещё не ушедшие задачи не публикуем: вызывающий получит False и решит сам
+            future.cancel()
+        errors = [future.exception() for future in done if future.exception() is not None]
+        if not_done or errors:
+            print(
+                f"Error publishing tasks: {len(not_done)} not confirmed in time, "
+                f"{len(errors)} failed{': ' + str(errors[0]) if errors else ''}"
             )
+            self.breaker.record_failure()
+            return False
+        self.breaker.record_success()
+        return True
 
+    def call(self, task_data: Dict[str, Any], timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        # RPC: задача уходит с reply_to и correlation_id, воркер присылает результат в очередь
+        # ответов этого процесса. None — ответа не дождались, задача остаётся в очереди
+        if not self.breaker.allow():
+            raise CircuitOpenError("Circuit broker is open")
+        if timeout is None:
+            timeout = settings.PREDICTION_RPC_TIMEOUT_MS / 1000.0
+
+        reply: Future = Future()
+        self._io.start()
+        published = self._io.submit(task_data, reply=reply)
         try:
-            _do_publish()
-            return True
+            published.result(timeout=settings.BROKER_CALL_BUDGET_MS / 1000.0)
         except Exception as e:
-            print(f"Error publishing task: {e}")
-            if self.connection and not self.connection.is_closed:
-                self.connection.close()
+            published.cancel()
+            self._io.forget_reply(task_data['task_id'])
+            self.breaker.record_failure()
+            raise RuntimeError(f"Failed to publish task: {e or type(e).__name__}") from e
+        self.breaker.record_success()
 
-            # попытка переподключиться и отправить задачу ещё раз
-            try:
-                _do_publish()
-                return True
-            except Exception as e2:
-                print(f"Error publishing task after reconnect: {e2}")
-                if self.connection and not self.connection.is_closed:
-                    self.connection.close()
-                return False
+        try:
+            return reply.result(timeout=timeout)
+        except Exception as e:
+            print(f"No reply for task {task_data['task_id']}: {e or type(e).__name__}")
+            reply.cancel()
+            self._io.forget_reply(task_data['task_id'])
+            return None
+
+    def _ensure_connected(self):
+        if not self.connection or self.connection.is_closed:
+            self._connect()
+
+    def _guarded(self, call):
+        # синхронные вызовы тоже идут через breaker: медленнее бюджета — такая же неудача
+        self.breaker.check()
+        start = time.monotonic()
+        try:
+            result = call()
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        if time.monotonic() - start > settings.BROKER_CALL_BUDGET_MS / 1000.0:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+    def queue_depth(self, queue: str) -> int:
+        def declare():
+            with self._lock:
+                self._ensure_connected()
+                # passive: только спрашиваем, сколько сообщений ждёт, очередь не создаём
+                return self.channel.queue_declare(queue=queue, passive=True).method.message_count
+
+        return self._guarded(declare)
+
+    def _dead_letter_info(self, properties, body: bytes) -> Dict[str, Any]:
+        headers = properties.headers or {}
+        try:
+            task_data = json.loads(body)
+        except ValueError:
+            task_data = {'raw': body.decode('utf-8', errors='replace')}
+
+        error = headers.get(ERROR_HEADER)
+        deaths = headers.get('x-death') or []
+        if error is None and deaths:
+            error = f"dead-lettered by broker: {deaths[0].get('reason')}"
+
+        return {
+            'task_id': task_data.get('task_id'),
+            'prediction_id': task_data.get('prediction_id'),
+            'user_id': task_data.get('user_id'),
+            'task_type': task_data.get('task_type'),
+            'attempts': int(headers.get(ATTEMPT_HEADER, 0)),
+            'origin_queue': headers.get(ORIGIN_HEADER) or origin_queue(task_data),
+            'error': error,
+            'body': task_data,
+        }
+
+    def get_dead_letters(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_connected()
+            letters = []
+            last_tag = None
+            for _ in range(limit):
+                method, properties, body = self.channel.basic_get(queue=dead_letter_queue_name())
+                if method is None:
+                    break
+                last_tag = method.delivery_tag
+                letters.append(self._dead_letter_info(properties, body))
+
+            # только смотрим: возвращаем всё прочитанное обратно в очередь
+            if last_tag is not None:
+                self.channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+            return letters
+
+    def replay_dead_letters(self, limit: int) -> int:
+        with self._lock:
+            self._ensure_connected()
+            replayed = 0
+            for _ in range(limit):
+                method, properties, body = self.channel.basic_get(queue=dead_letter_queue_name())
+                if method is None:
+                    break
+                info = self._dead_letter_info(properties, body)
+                headers = dict(properties.headers or {})
+                for header in (ATTEMPT_HEADER, ERROR_HEADER, DEADLINE_HEADER, 'x-death'):
+                    headers.pop(header, None)
+                # дедлайн задачи из dead letter давно прошёл: с ним воркер сразу вернул бы деньги,
+                # не запуская модель, а админ возвращает задачу именно затем, чтобы её досчитать
+                task_data = info['body']
+                if 'deadline' in task_data:
+                    body = json.dumps({key: value for key, value in task_data.items() if key != 'deadline'})
+
+                self.channel.basic_publish(
+                    exchange="",
+                    routing_key=info['origin_queue'],
+                    body=body,
+                    properties=pika.BasicProperties(
+                        delivery_mode=2,
+                        priority=properties.priority,
+                        headers=headers,
+                    ),
+                )
+                self.channel.basic_ack(delivery_tag=method.delivery_tag)
+                replayed += 1
+            return replayed
 
     def close(self):
-        if self.connection and not self.connection.is_closed:
-            self.connection.close()
+        self._io.stop()
+        with self._lock:
+            if self.connection and not self.connection.is_closed:
+                self.connection.close()
 
 
 publisher = RabbitMQPublisher()
@@ -0,0 +1,281 @@
+import collections
+import json
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Dict, Optional, Tuple
+
+import pika
+from pika.exceptions import AMQPConnectionError, NackError
+
+from app.core.config import settings
+from app.rabbitmq.topology import (
+    DEADLINE_HEADER,
+    DEFAULT_PRIORITY,
+    declare_topology,
+    priority_value,
+    routing_key,
+)
+
+
+def connection_parameters() -> pika.ConnectionParameters:
+    budget = settings.BROKER_CALL_BUDGET_MS / 1000.0
+    return pika.ConnectionParameters(
+        host=settings.RABBITMQ_HOST,
+        port=settings.RABBITMQ_PORT,
+        credentials=pika.PlainCredentials(settings.RABBITMQ_USER, settings.RABBITMQ_PASSWORD),
+        heartbeat=settings.RABBITMQ_HEARTBEAT,
+        blocked_connection_timeout=300,
+        # недоступный брокер не должен держать вызов дольше бюджета на TCP и AMQP handshake
+        connection_attempts=1,
+        socket_timeout=budget,
+        stack_timeout=budget,
+    )
+
+
+def message_properties(task_data: Dict[str, Any]) -> pika.BasicProperties:
+    headers = None
+    expiration = None
+    deadline = task_data.get('deadline')
+    if deadline is not None:
+        # TTL сообщения: если задача дождалась дедлайна в очереди, брокер сам её выкинет
+        headers = {DEADLINE_HEADER: deadline}
+        expiration = str(max(0, int((deadline - time.time()) * 1000)))
+    return pika.BasicProperties(
+        delivery_mode=2,
+        priority=priority_value(task_data.get('priority')),
+        headers=headers,
+        expiration=expiration,
+    )
+
+
+def _settle_reply(reply: Future, result: Any = None, error: Optional[Exception] = None) -> None:
+    # вызывающий мог как раз отменить ожидание по таймауту
+    try:
+        if error is not None:
+            reply.set_exception(error)
+        else:
+            reply.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+# BlockingConnection нельзя делить между потоками: соединением владеет отдельный поток
+# с SelectConnection. Потоки запросов кладут задачу в очередь и получают Future; поток
+# ввода-вывода за один проход ioloop публикует всё накопившееся и разрешает Future
+# по publisher confirms (брокер подтверждает пачку одним multiple=True).
+# RPC: у процесса своя эксклюзивная очередь ответов, ответ воркера находится по correlation_id
+class PublisherThread:
+    def __init__(self):
+        # Future -> (задача, Future RPC-ответа); порядок вставки — порядок публикации
+        self._pending: "collections.OrderedDict[Future, Tuple[Dict[str, Any], Optional[Future]]]" = (
+            collections.OrderedDict()
+        )
+        self._unconfirmed: Dict[int, Future] = {}
+        self._replies: Dict[str, Future] = {}
+        self._reply_queue: Optional[str] = None
+        self._lock = threading.Lock()
+        self._flush_scheduled = False
+        self._delivery_tag = 0
+        self._connection = None
+        self._channel = None
+        self._ioloop = None
+        self._ready = False
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def submit(self, task_data: Dict[str, Any], reply: Optional[Future] = None) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if len(self._pending) >= settings.PUBLISHER_MAX_PENDING:
+                future.set_exception(RuntimeError("Publisher queue is full"))
+                return future
+            self._pending[future] = (task_data, reply)
+            schedule = self._ready and not self._flush_scheduled
+            if schedule:
+                self._flush_scheduled = True
+        # вызывающий отменяет Future, когда перестаёт ждать (таймаут, брокер недоступен):
+        # брошенная задача не должна занимать место в PUBLISHER_MAX_PENDING до переподключения
+        future.add_done_callback(self._discard_cancelled)
+        if schedule:
+            # все задачи, пришедшие до следующего прохода ioloop, уйдут одним _flush
+            self._ioloop.add_callback_threadsafe(self._flush)
+        return future
+
+    def _discard_cancelled(self, future: Future) -> None:
+        if future.cancelled():
+            with self._lock:
+                self._pending.pop(future, None)
+
+    def _flush(self):
+        with self._lock:
+            self._flush_scheduled = False
+            if not self._ready:
+                return
+            batch = []
+            while self._pending and len(batch) < settings.PUBLISHER_BATCH_SIZE:
+                future, (task_data, reply) = self._pending.popitem(last=False)
+                batch.append((task_data, future, reply))
+            more = bool(self._pending)
+            if more:
+                self._flush_scheduled = True
+
+        for task_data, future, reply in batch:
+            # вызывающий уже перестал ждать и отменил Future — не публикуем
+            if not future.set_running_or_notify_cancel():
+                continue
+            properties = message_properties(task_data)
+            if reply is not None:
+                properties.reply_to = self._reply_queue
+                properties.correlation_id = task_data['task_id']
+                with self._lock:
+                    self._replies[properties.correlation_id] = reply
+            try:
+                self._channel.basic_publish(
+                    exchange=settings.RABBITMQ_EXCHANGE,
+                    routing_key=routing_key(
+                        task_data['task_type'], task_data.get('priority') or DEFAULT_PRIORITY
+                    ),
+                    body=json.dumps(task_data),
+                    properties=properties,
+                )
+            except Exception as e:
+                if reply is not None:
+                    self.forget_reply(properties.correlation_id)
+                future.set_exception(e)
+                continue
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = future
+
+        if more:
+            self._ioloop.add_callback_threadsafe(self._flush)
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        ack = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            future = self._unconfirmed.pop(tag, None)
+            if future is None:
+                continue
+            if ack:
+                future.set_result(True)
+            else:
+                future.set_exception(NackError([]))
+
+    def _fail_unconfirmed(self, error: Exception):
+        unconfirmed, self._unconfirmed = self._unconfirmed, {}
+        for future in unconfirmed.values():
+            future.set_exception(error)
+        # очередь ответов эксклюзивная и умерла вместе с соединением: ответов уже не будет
+        with self._lock:
+            replies, self._replies = self._replies, {}
+        for reply in replies.values():
+            _settle_reply(reply, error=error)
+
+    def forget_reply(self, correlation_id: str) -> None:
+        with self._lock:
+            self._replies.pop(correlation_id, None)
+
+    def _on_reply(self, channel, method, properties, body):
+        with self._lock:
+            reply = self._replies.pop(properties.correlation_id, None)
+        if reply is None:
+            # ответ на вызов, который уже не ждут
+            return
+        try:
+            _settle_reply(reply, result=json.loads(body))
+        except ValueError as e:
+            _settle_reply(reply, error=e)
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        self._delivery_tag = 0
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(
+            self._on_confirm,
+            callback=lambda _: declare_topology(channel, callback=self._on_topology),
+        )
+
+    def _on_topology(self, _frame):
+        self._channel.queue_declare(
+            queue="", exclusive=True, auto_delete=True, callback=self._on_reply_queue
+        )
+
+    def _on_reply_queue(self, frame):
+        self._reply_queue = frame.method.queue
+        self._channel.basic_consume(
+            queue=self._reply_queue, on_message_callback=self._on_reply, auto_ack=True
+        )
+        self._on_ready()
+
+    def _on_ready(self, _frame=None):
+        with self._lock:
+            self._ready = True
+            self._flush_scheduled = True
+        print("Publisher connected to RabbitMQ")
+        self._flush()
+
+    def _on_channel_closed(self, channel, reason):
+        print(f"Publisher channel closed: {reason}")
+        self._ready = False
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_connection_closed(self, connection, reason):
+        self._ready = False
+        self._ioloop.stop()
+
+    def _on_connection_error(self, connection, error):
+        print(f"Error connecting to RabbitMQ: {error}")
+        self._ioloop.stop()
+
+    def _run(self):
+        while not self._stopping:
+            self._connection = pika.SelectConnection(
+                parameters=connection_parameters(),
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            self._ioloop = self._connection.ioloop
+            self._ioloop.start()
+
+            with self._lock:
+                self._ready = False
+                self._flush_scheduled = False
+            # неподтверждённые сообщения могли не дойти: пусть вызывающие решат, повторять ли
+            self._fail_unconfirmed(AMQPConnectionError("Connection to RabbitMQ lost"))
+            if not self._stopping:
+                time.sleep(settings.PUBLISHER_RECONNECT_DELAY_MS / 1000.0)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="rabbitmq-publisher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping = True
+        if self._ioloop is not None:
+            self._ioloop.add_callback_threadsafe(self._close)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _close(self):
+        if self._connection is not None and not (self._connection.is_closing or self._connection.is_closed):
+            self._connection.close()
+        else:
+            self._ioloop.stop()
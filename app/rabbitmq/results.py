@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pika
+
+from app.core.config import settings
+from app.core.events import user_events
+from app.rabbitmq.publisher_thread import connection_parameters
+
+
+def result_message(task_data: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'prediction_id': result.get('prediction_id'),
+        'task_id': result.get('task_id'),
+        'user_id': task_data.get('user_id'),
+        'status': result.get('status'),
+    }
+
+
+# ожидающие запросы API ждут результат на asyncio.Future в своём event loop-е:
+# ни поток, ни соединение с БД на время ожидания не заняты
+class ResultNotifier:
+    def __init__(self):
+        self._waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, prediction_id: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._waiters.setdefault(prediction_id, []).append((loop, future))
+        return future
+
+    def unsubscribe(self, prediction_id: str, future: asyncio.Future) -> None:
+        with self._lock:
+            waiters = [w for w in self._waiters.get(prediction_id, []) if w[1] is not future]
+            if waiters:
+                self._waiters[prediction_id] = waiters
+            else:
+                self._waiters.pop(prediction_id, None)
+
+    def waiting(self) -> int:
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+    def notify(self, message: Dict[str, Any]) -> None:
+        # вызывается из любого потока: слушателя брокера или, в тестах и бенчмарках, напрямую
+        with self._lock:
+            waiters = self._waiters.pop(message.get('prediction_id'), [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future, message)
+        if message.get('user_id'):
+            user_events.publish(message['user_id'], {
+                'type': 'prediction',
+                'prediction_ids': [message.get('prediction_id')],
+                'status': message.get('status'),
+            })
+
+
+def _resolve(future: asyncio.Future, message: Dict[str, Any]) -> None:
+    if not future.done():
+        future.set_result(message)
+
+
+# слушатель результатов: своя эксклюзивная очередь процесса API на fanout-обменнике результатов
+class ResultListener:
+    def __init__(self, notifier: ResultNotifier):
+        self.notifier = notifier
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _on_message(self, ch, method, properties, body):
+        try:
+            message = json.loads(body)
+        except ValueError as e:
+            print(f"Error decoding result: {e}")
+            return
+        self.notifier.notify(message)
+
+    def _consume(self):
+        connection = pika.BlockingConnection(connection_parameters())
+        try:
+            channel = connection.channel()
+            channel.exchange_declare(
+                exchange=settings.RABBITMQ_RESULTS_EXCHANGE,
+                exchange_type="fanout",
+                durable=True,
+            )
+            queue = channel.queue_declare(queue="", exclusive=True, auto_delete=True).method.queue
+            channel.queue_bind(queue=queue, exchange=settings.RABBITMQ_RESULTS_EXCHANGE)
+            channel.basic_consume(queue=queue, on_message_callback=self._on_message, auto_ack=True)
+            print(f"Listening for results in queue: {queue}")
+            channel.start_consuming()
+        finally:
+            if not connection.is_closed:
+                connection.close()
+
+    def _run(self):
+        while True:
+            try:
+                self._consume()
+            except Exception as e:
+                print(f"Result listener error: {e}")
+            # пока слушателя нет, ожидающие запросы просто дождутся таймаута
+            time.sleep(settings.PUBLISHER_RECONNECT_DELAY_MS / 1000.0)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="result-listener", daemon=True)
+            self._thread.start()
+
+
+result_notifier = ResultNotifier()
+result_listener = ResultListener(result_notifier)
@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+ATTEMPT_HEADER = "x-attempt"
+ORIGIN_HEADER = "x-origin-queue"
+ERROR_HEADER = "x-last-error"
+DEADLINE_HEADER = "x-deadline"
+
+TASK_TYPES = ["text_to_command", "speech_to_text"]
+
+# приоритет сообщения в очереди с x-max-priority: интерактивные запросы обгоняют фоновые
+PRIORITIES = {
+    "bulk": 1,
+    "normal": 5,
+    "interactive": 9,
+}
+DEFAULT_PRIORITY = "interactive"
+
+
+def task_queue_name(task_type: str) -> str:
+    return f"{settings.RABBITMQ_QUEUE}.{task_type}"
+
+
+def routing_key(task_type: str, priority: str) -> str:
+    return f"task.{task_type}.{priority}"
+
+
+def priority_value(priority: Optional[str]) -> int:
+    return PRIORITIES.get(priority or DEFAULT_PRIORITY, PRIORITIES[DEFAULT_PRIORITY])
+
+
+def retry_queue_name(queue: str, tier: int) -> str:
+    return f"{queue}.retry.{tier}"
+
+
+def shed_queue_name(queue: str) -> str:
+    return f"{queue}.shed"
+
+
+def dead_letter_queue_name() -> str:
+    return f"{settings.RABBITMQ_QUEUE}.dead"
+
+
+def origin_queue(task_data: Dict[str, Any]) -> str:
+    task_type = task_data.get("task_type")
+    return task_queue_name(task_type if task_type in TASK_TYPES else TASK_TYPES[0])
+
+
+def task_queue_specs(queue: str) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    specs: List[Tuple[str, Optional[Dict[str, Any]]]] = [
+        (queue, {
+            "x-max-priority": settings.RABBITMQ_MAX_PRIORITY,
+            "x-max-length": settings.RABBITMQ_QUEUE_MAX_LENGTH,
+            "x-overflow": settings.RABBITMQ_QUEUE_OVERFLOW,
+            # всё, что брокер выкинул из очереди (просрочено, переполнение, отказ без requeue),
+            # попадает в shed очередь: воркер возвращает деньги или переправляет в dead letter
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": shed_queue_name(queue),
+        }),
+        (shed_queue_name(queue), None),
+    ]
+    for tier, delay_ms in enumerate(settings.ML_TASK_RETRY_DELAYS_MS):
+        # сообщение лежит в очереди ретрая delay_ms, потом возвращается в рабочую очередь
+        specs.append((retry_queue_name(queue, tier), {
+            "x-message-ttl": delay_ms,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": queue,
+        }))
+    return specs
+
+
+def queue_specs() -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    specs: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+    for task_type in TASK_TYPES:
+        specs.extend(task_queue_specs(task_queue_name(task_type)))
+    specs.append((dead_letter_queue_name(), None))
+    return specs
+
+
+def binding_specs() -> List[Tuple[str, str]]:
+    return [(task_queue_name(task_type), f"task.{task_type}.*") for task_type in TASK_TYPES]
+
+
+def declare_topology(channel, callback=None) -> None:
+    # callback нужен только асинхронному каналу (SelectConnection): команды канала
+    # выполняются по порядку, так что ответ на последнюю значит, что готово всё
+    channel.exchange_declare(
+        exchange=settings.RABBITMQ_EXCHANGE,
+        exchange_type="topic",
+        durable=True,
+    )
+    # воркеры сообщают о готовых результатах всем процессам API сразу
+    channel.exchange_declare(
+        exchange=settings.RABBITMQ_RESULTS_EXCHANGE,
+        exchange_type="fanout",
+        durable=True,
+    )
+    for name, arguments in queue_specs():
+        channel.queue_declare(queue=name, durable=True, arguments=arguments)
+    *bindings, (last_queue, last_pattern) = binding_specs()
+    for queue, pattern in bindings:
+        channel.queue_bind(queue=queue, exchange=settings.RABBITMQ_EXCHANGE, routing_key=pattern)
+    extra = {} if callback is None else {"callback": callback}
+    channel.queue_bind(
+        queue=last_queue, exchange=settings.RABBITMQ_EXCHANGE, routing_key=last_pattern, **extra
+    )
+
+
+def death_reason(headers: Optional[Dict[str, Any]]) -> Optional[str]:
+    deaths = (headers or {}).get("x-death") or []
+    return deaths[0].get("reason") if deaths else None
+
+
+def retry_route(headers: Optional[Dict[str, Any]], queue: str) -> Tuple[str, int]:
+    attempt = int((headers or {}).get(ATTEMPT_HEADER, 0)) + 1
+    if attempt >= settings.ML_TASK_MAX_ATTEMPTS or not settings.ML_TASK_RETRY_DELAYS_MS:
+        return dead_letter_queue_name(), attempt
+    tier = min(attempt, len(settings.ML_TASK_RETRY_DELAYS_MS)) - 1
+    return retry_queue_name(queue, tier), attempt
+
+
+# причина, по которой брокер выкинул задачу (x-death reason) -> причина отказа в обработке
+SHED_REASONS = {
+    "expired": "deadline",
+    "maxlen": "overflow",
+}
+
+
+def shed_reason(headers: Optional[Dict[str, Any]]) -> Optional[str]:
+    # None — отказ воркера (reject/nack без requeue): это не перегрузка, задаче место в dead letter
+    return SHED_REASONS.get(death_reason(headers))
+
+
+# свойства сообщений одинаковы для обоих воркеров: на входе pika.BasicProperties или
+# aio_pika.IncomingMessage, на выходе kwargs и для pika.BasicProperties, и для aio_pika.Message
+
+def forwarded_properties(message: Any, headers: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # переотправленная задача (ретрай, dead letter) сохраняет приоритет, заголовки
+    # и адрес RPC-ответа: вызывающий получит ответ и после ретрая, если ещё ждёт
+    if headers is None:
+        headers = dict(getattr(message, "headers", None) or {})
+    return {
+        "delivery_mode": 2,
+        "priority": getattr(message, "priority", None),
+        "headers": headers,
+        "reply_to": getattr(message, "reply_to", None),
+        "correlation_id": getattr(message, "correlation_id", None),
+    }
+
+
+def retry_properties(message: Any, task_data: Dict[str, Any], error: str) -> Tuple[str, int, Dict[str, Any]]:
+    # очередь ретрая с задержкой или, если попытки кончились, dead letter очередь
+    headers = dict(getattr(message, "headers", None) or {})
+    origin = headers.get(ORIGIN_HEADER) or origin_queue(task_data)
+    queue, attempt = retry_route(headers, origin)
+    headers.update({ATTEMPT_HEADER: attempt, ORIGIN_HEADER: origin, ERROR_HEADER: error[:500]})
+    return queue, attempt, forwarded_properties(message, headers)
+
+
+def result_properties() -> Dict[str, Any]:
+    return {"content_type": "application/json"}
+
+
+def reply_properties(message: Any) -> Optional[Tuple[str, Dict[str, Any]]]:
+    # RPC: полный результат уходит прямо в очередь ответов вызывающего процесса
+    reply_to = getattr(message, "reply_to", None)
+    if not reply_to:
+        return None
+    return reply_to, {**result_properties(), "correlation_id": getattr(message, "correlation_id", None)}
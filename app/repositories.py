@@ -1,12 +1,22 @@
-from typing import List
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+import json
 import uuid
 
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from classes import User, Balance, Transaction, TransactionType
+from classes import User
 from app.models.user import UserDB
 from app.models.transaction import TransactionDB, TransactionTypeDB
 from app.models.prediction import PredictionDB
+from app.models.calendar_event import CalendarEventDB
+from app.models.outbox import OutboxDB
+from app.models.idempotency_key import IdempotencyKeyDB
+from app.models.prediction_cache import PredictionCacheDB
+from app.core.config import settings
+from app.core.events import user_events
 from app.core.security import get_password_hash
 
 
@@ -50,34 +60,6 @@ def get_user_by_id(db: Session, user_id: str) -> UserDB | None:
     return db.query(UserDB).filter(UserDB.id == user_id).first()
 
 
-def _add_transaction(
-    db: Session,
-    user: UserDB,
-    tx_type: TransactionTypeDB,
-    amount: float,
-    description: str | None = None,
-) -> TransactionDB:
-    domain_tx = Transaction(
-        user_id=user.id,
-        transaction_type=TransactionType.DEPOSIT
-        if tx_type == TransactionTypeDB.DEPOSIT
-        else TransactionType.WITHDRAWAL,
-        amount=amount,
-        description=description,
-    )
-
-    tx = TransactionDB(
-        id=domain_tx.get_transaction_id(),
-        user_id=user.id,
-        type=tx_type,
-        amount=amount,
-        description=description,
-        balance_after=user.balance,
-    )
-    db.add(tx)
-    return tx
-
-
 def deposit(
     db: Session,
     user_id: str,
@@ -87,25 +69,31 @@ def deposit(
     if amount <= 0:
         raise ValueError("Amount must be positive")
 
-    user = db.query(UserDB).filter(UserDB.id == user_id).first()
-    if not user:
+    users = UserDB.__table__
+    # пополнение — таким же атомарным UPDATE, как списание в submit_predictions:
+    # баланс, прочитанный до параллельной оплаты, не затрёт её
+    balance = db.execute(
+        update(users)
+        .where(users.c.id == user_id)
+        .values(balance=users.c.balance + amount)
+        .returning(users.c.balance)
+    ).scalar_one_or_none()
+    if balance is None:
+        db.rollback()
         raise ValueError("User not found")
 
-    balance = Balance(user_id=user.id, initial_balance=user.balance)
-    balance.add_funds(amount)
-    user.balance = balance.get_amount()
-
-    tx = _add_transaction(
-        db,
-        user=user,
-        tx_type=TransactionTypeDB.DEPOSIT,
+    tx = TransactionDB(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        type=TransactionTypeDB.DEPOSIT,
         amount=amount,
         description=description or "Пополнение баланса",
+        balance_after=balance,
     )
-
+    db.add(tx)
     db.commit()
-    db.refresh(user)
     db.refresh(tx)
+    user_events.publish(user_id, {'type': 'transaction', 'transaction_id': tx.id, 'balance': balance})
     return tx
 
 
@@ -118,25 +106,32 @@ def withdraw(
     if amount <= 0:
         raise ValueError("Amount must be positive")
 
-    user = db.query(UserDB).filter(UserDB.id == user_id).first()
-    if not user:
-        raise ValueError("User not found")
-
-    balance = Balance(user_id=user.id, initial_balance=user.balance)
-    balance.subtract_funds(amount)
-    user.balance = balance.get_amount()
+    users = UserDB.__table__
+    # условный UPDATE, как в submit_predictions: баланс не уходит в минус и при параллельных списаниях
+    balance = db.execute(
+        update(users)
+        .where(users.c.id == user_id, users.c.balance >= amount)
+        .values(balance=users.c.balance - amount)
+        .returning(users.c.balance)
+    ).scalar_one_or_none()
+    if balance is None:
+        db.rollback()
+        if get_user_by_id(db, user_id) is None:
+            raise ValueError("User not found")
+        raise ValueError("Insufficient funds")
 
-    tx = _add_transaction(
-        db,
-        user=user,
-        tx_type=TransactionTypeDB.WITHDRAWAL,
+    tx = TransactionDB(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        type=TransactionTypeDB.WITHDRAWAL,
         amount=amount,
         description=description or "Списание с баланса",
+        balance_after=balance,
     )
-
+    db.add(tx)
     db.commit()
-    db.refresh(user)
     db.refresh(tx)
+    user_events.publish(user_id, {'type': 'transaction', 'transaction_id': tx.id, 'balance': balance})
     return tx
 
 
@@ -183,6 +178,210 @@ def add_prediction(
     return prediction
 
 
+class IdempotencyKeyTaken(Exception):
+    # тот же Idempotency-Key уже записал параллельный запрос
+    pass
+
+
+def _idempotency_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def get_idempotent_prediction(db: Session, user_id: str, key: str) -> PredictionDB | None:
+    return (
+        db.query(PredictionDB)
+        .join(IdempotencyKeyDB, IdempotencyKeyDB.prediction_id == PredictionDB.id)
+        .filter(
+            IdempotencyKeyDB.user_id == user_id,
+            IdempotencyKeyDB.key == key,
+            IdempotencyKeyDB.created_at >= _idempotency_cutoff(),
+        )
+        .first()
+    )
+
+
+def submit_predictions(
+    db: Session,
+    user_id: str,
+    inputs: List[str],
+    model_type: str,
+    cost: float,
+    task_fields: Dict[str, Any] | None = None,
+    outbox: bool = False,
+    idempotency_key: str | None = None,
+) -> Tuple[List[Dict[str, Any]], float, List[Dict[str, Any]]]:
+    users = UserDB.__table__
+    total = cost * len(inputs)
+
+    # списание одним условным UPDATE: без чтения баланса и без гонки между запросами
+    balance = db.execute(
+        update(users)
+        .where(users.c.id == user_id, users.c.balance >= total)
+        .values(balance=users.c.balance - total)
+        .returning(users.c.balance)
+    ).scalar_one_or_none()
+    if balance is None:
+        db.rollback()
+        raise ValueError("Insufficient funds")
+
+    now = datetime.utcnow()
+    predictions = []
+    ledger = []
+    tasks = []
+    for i, input_data in enumerate(inputs, 1):
+        prediction_id = str(uuid.uuid4())
+        task_id = str(uuid.uuid4())
+        predictions.append({
+            'id': prediction_id,
+            'user_id': user_id,
+            'task_id': task_id,
+            'input_data': input_data,
+            'model_type': model_type,
+            'status': 'pending',
+            'created_at': now,
+        })
+        tasks.append({
+            'task_id': task_id,
+            'user_id': user_id,
+            'task_type': model_type,
+            'input_data': input_data,
+            'prediction_id': prediction_id,
+            **(task_fields or {}),
+        })
+        ledger.append({
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'type': TransactionTypeDB.WITHDRAWAL,
+            'amount': cost,
+            'description': f"Оплата предсказания #{prediction_id}",
+            'created_at': now,
+            'balance_after': balance + total - cost * i,
+        })
+
+    db.execute(insert(PredictionDB), predictions)
+    db.execute(insert(TransactionDB), ledger)
+    if idempotency_key is not None:
+        # ключ пишется в той же транзакции, что и списание: из двух одновременных повторов
+        # уникальный индекс пропустит один, второй откатится целиком, не списав денег
+        db.execute(
+            delete(IdempotencyKeyDB)
+            .where(IdempotencyKeyDB.user_id == user_id, IdempotencyKeyDB.created_at < _idempotency_cutoff())
+        )
+        try:
+            db.execute(insert(IdempotencyKeyDB), [{
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'key': idempotency_key,
+                'prediction_id': predictions[0]['id'],
+                'created_at': now,
+            }])
+        except IntegrityError:
+            db.rollback()
+            raise IdempotencyKeyTaken(idempotency_key)
+    if outbox:
+        # задачи попадают в outbox в той же транзакции: оплаченная задача не потеряется,
+        # даже если брокер сейчас недоступен
+        _add_outbox_rows(db, tasks, now)
+    db.commit()
+    user_events.publish(user_id, {'type': 'transaction', 'balance': balance})
+    user_events.publish(user_id, {
+        'type': 'prediction',
+        'prediction_ids': [p['id'] for p in predictions],
+        'status': 'pending',
+    })
+    return predictions, balance, tasks
+
+
+def _add_outbox_rows(db: Session, tasks: List[Dict[str, Any]], now: datetime) -> None:
+    db.execute(insert(OutboxDB), [
+        {
+            'id': task['task_id'],
+            'payload': json.dumps(task),
+            'created_at': now,
+            'attempts': 0,
+        }
+        for task in tasks
+    ])
+
+
+def enqueue_outbox(db: Session, tasks: List[Dict[str, Any]]) -> None:
+    _add_outbox_rows(db, tasks, datetime.utcnow())
+    db.commit()
+
+
+def claim_outbox(db: Session, limit: int) -> List[OutboxDB]:
+    # SKIP LOCKED: несколько процессов API разбирают outbox, не публикуя одну строку дважды
+    return (
+        db.query(OutboxDB)
+        .filter(OutboxDB.sent_at.is_(None))
+        .order_by(OutboxDB.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def mark_outbox_sent(db: Session, ids: List[str]) -> None:
+    db.execute(
+        update(OutboxDB)
+        .where(OutboxDB.id.in_(ids))
+        .values(sent_at=datetime.utcnow(), last_error=None)
+    )
+    db.commit()
+
+
+def mark_outbox_failed(db: Session, ids: List[str], error: str) -> None:
+    db.execute(
+        update(OutboxDB)
+        .where(OutboxDB.id.in_(ids))
+        .values(attempts=OutboxDB.attempts + 1, last_error=error[:500])
+    )
+    db.commit()
+
+
+def purge_outbox(db: Session, sent_before: datetime) -> int:
+    deleted = db.execute(
+        delete(OutboxDB).where(OutboxDB.sent_at < sent_before)
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+def get_cached_predictions(db: Session, keys: List[str]) -> Dict[str, Any]:
+    rows = db.execute(
+        select(PredictionCacheDB.key, PredictionCacheDB.output_data)
+        .where(PredictionCacheDB.key.in_(keys), PredictionCacheDB.expires_at > datetime.utcnow())
+    ).all()
+    return {key: json.loads(output_data) for key, output_data in rows}
+
+
+def save_cached_predictions(db: Session, values: Dict[str, Any], ttl_seconds: float) -> None:
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    # перезаписываем ключи целиком и заодно убираем устаревшие строки
+    try:
+        db.execute(
+            delete(PredictionCacheDB)
+            .where((PredictionCacheDB.key.in_(list(values))) | (PredictionCacheDB.expires_at <= now))
+        )
+        db.execute(insert(PredictionCacheDB), [
+            {'key': key, 'output_data': json.dumps(value), 'expires_at': expires_at}
+            for key, value in values.items()
+        ])
+        db.commit()
+    except IntegrityError:
+        # тот же ключ одновременно записал другой процесс — его ответ ничем не хуже
+        db.rollback()
+
+
+def get_prediction(db: Session, prediction_id: str, user_id: str) -> PredictionDB | None:
+    return (
+        db.query(PredictionDB)
+        .filter(PredictionDB.id == prediction_id, PredictionDB.user_id == user_id)
+        .first()
+    )
+
+
 def get_predictions(
     db: Session,
     user_id: str,
@@ -197,3 +396,183 @@ def get_predictions(
         q = q.limit(limit)
     return q.all()
 
+
+
+def _parse_datetime(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _refund_shed_predictions(
+    db: Session,
+    shed: List[Dict[str, Any]],
+    amount: float,
+    result_status: str = 'expired',
+    description: str = "Возврат за просроченное предсказание",
+) -> int:
+    predictions = PredictionDB.__table__
+    users = UserDB.__table__
+
+    by_error: Dict[str, List[str]] = {}
+    for r in shed:
+        by_error.setdefault(r.get('error') or 'Deadline exceeded', []).append(r['prediction_id'])
+
+    # условный UPDATE: повторная доставка той же задачи не вернёт деньги второй раз
+    refunded_by_user: Dict[str, List[str]] = {}
+    for error, ids in by_error.items():
+        rows = db.execute(
+            update(predictions)
+            .where(predictions.c.id.in_(ids), predictions.c.status == 'pending')
+            .values(status=result_status, error=error)
+            .returning(predictions.c.id, predictions.c.user_id)
+        ).all()
+        for row in rows:
+            refunded_by_user.setdefault(row.user_id, []).append(row.id)
+
+    ledger = []
+    for user_id, ids in refunded_by_user.items():
+        balance = db.execute(
+            update(users)
+            .where(users.c.id == user_id)
+            .values(balance=users.c.balance + amount * len(ids))
+            .returning(users.c.balance)
+        ).scalar_one()
+        start = balance - amount * len(ids)
+        for i, prediction_id in enumerate(ids, 1):
+            ledger.append({
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'type': TransactionTypeDB.DEPOSIT,
+                'amount': amount,
+                'description': f"{description} #{prediction_id}",
+                'created_at': datetime.utcnow(),
+                'balance_after': start + amount * i,
+            })
+    if ledger:
+        db.execute(insert(TransactionDB), ledger)
+    return len(ledger)
+
+
+def fail_unpublished_predictions(db: Session, prediction_ids: List[str], error: str, amount: float) -> int:
+    # задача не ушла в очередь и её никто не посчитает: предсказание failed, деньги назад.
+    # Условный UPDATE: если воркер всё же успел сохранить результат, ничего не меняется
+    refunded = _refund_shed_predictions(
+        db,
+        [{'prediction_id': prediction_id, 'error': error} for prediction_id in prediction_ids],
+        amount,
+        result_status='failed',
+        description="Возврат за неотправленное предсказание",
+    )
+    db.commit()
+    return refunded
+
+
+def save_prediction_results(
+    db: Session,
+    results: List[Dict[str, Any]],
+    refund_amount: float | None = None,
+    settle_outbox: bool = False,
+) -> int:
+    # просроченные задачи (status expired) не считаются: за них возвращается refund_amount
+    # (по умолчанию PREDICTION_COST); возвращает число сделанных возвратов
+    finished = [r for r in results if r.get('prediction_id')]
+    if not finished:
+        return 0
+
+    if settle_outbox:
+        # результат посчитан на месте: строку outbox закрываем в той же транзакции, что и результат.
+        # Если relay уже успел её опубликовать, ответ воркера ничего не изменит (см. ниже)
+        db.execute(
+            update(OutboxDB)
+            .where(OutboxDB.id.in_([r['task_id'] for r in finished]), OutboxDB.sent_at.is_(None))
+            .values(sent_at=datetime.utcnow())
+        )
+
+    shed = [r for r in finished if r['status'] == 'expired']
+    if refund_amount is None:
+        refund_amount = settings.PREDICTION_COST
+    refunded = _refund_shed_predictions(db, shed, refund_amount) if shed else 0
+    finished = [r for r in finished if r['status'] != 'expired']
+    if not finished:
+        db.commit()
+        return refunded
+
+    predictions = PredictionDB.__table__
+    # доставка at-least-once: результат применяем только к ещё ожидающим предсказаниям.
+    # Условный UPDATE статуса с RETURNING говорит, какие строки изменил именно этот вызов
+    # (executemany с RETURNING драйверы не поддерживают, поэтому статус — отдельным запросом)
+    by_status: Dict[str, List[str]] = {}
+    for r in finished:
+        by_status.setdefault(r['status'], []).append(r['prediction_id'])
+    applied = set()
+    for result_status, ids in by_status.items():
+        applied.update(db.execute(
+            update(predictions)
+            .where(predictions.c.id.in_(ids), predictions.c.status == 'pending')
+            .values(status=result_status)
+            .returning(predictions.c.id)
+        ).scalars())
+    # повтор уже сохранённой или просроченной и возвращённой задачи ничего не меняет
+    finished = [r for r in finished if r['prediction_id'] in applied]
+    if not finished:
+        db.commit()
+        return refunded
+
+    db.execute(
+        update(predictions)
+        .where(predictions.c.id == bindparam('b_id'))
+        .values(
+            output_data=bindparam('b_output_data'),
+            confidence=bindparam('b_confidence'),
+            error=bindparam('b_error'),
+        ),
+        [
+            {
+                'b_id': r['prediction_id'],
+                'b_output_data': r.get('output_data'),
+                'b_confidence': r.get('confidence'),
+                'b_error': r.get('error'),
+            }
+            for r in finished
+        ],
+    )
+
+    completed = [r for r in finished if r['status'] == 'completed']
+    create_results = [
+        r for r in completed
+        if (r.get('payload') or {}).get('command_type') == 'create_event'
+    ]
+    if create_results:
+        rows = db.execute(
+            select(
+                PredictionDB.id,
+                PredictionDB.user_id,
+                PredictionDB.input_data,
+                PredictionDB.created_at,
+            ).where(PredictionDB.id.in_([r['prediction_id'] for r in create_results]))
+        ).all()
+        by_id = {row.id: row for row in rows}
+
+        events = []
+        for r in create_results:
+            prediction = by_id.get(r['prediction_id'])
+            if prediction is None:
+                continue
+            params = r['payload'].get('parameters') or {}
+            events.append({
+                'user_id': prediction.user_id,
+                'title': params.get('title') or prediction.input_data,
+                'description': None,
+                'start_time': _parse_datetime(params.get('start_time')) or prediction.created_at,
+                'end_time': _parse_datetime(params.get('end_time')),
+                'location': None,
+            })
+        if events:
+            db.execute(insert(CalendarEventDB), events)
+
+    db.commit()
+    return refunded
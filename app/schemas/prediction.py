@@ -1,9 +1,15 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Annotated, List, Literal, Optional
+
+from app.core.config import settings
 
 
 class PredictionRequest(BaseModel):
     text: str = Field(..., min_length=1, description="Текст для обработки ML-моделью")
+    priority: Literal["interactive", "bulk"] = Field(
+        "interactive",
+        description="interactive — пользователь ждёт ответа, bulk — фоновая обработка",
+    )
 
     class Config:
         json_schema_extra = {
@@ -13,6 +19,32 @@ class PredictionRequest(BaseModel):
         }
 
 
+class PredictionBatchRequest(BaseModel):
+    texts: List[Annotated[str, Field(min_length=1)]] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.PREDICTION_BATCH_MAX_SIZE,
+        description="Тексты для обработки ML-моделью",
+    )
+    priority: Literal["interactive", "bulk"] = Field(
+        "bulk",
+        description="interactive — пользователь ждёт ответа, bulk — фоновая обработка",
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "texts": ["Покажи список событий", "Создай событие на завтра в 15:00"]
+            }
+        }
+
+
+class PredictionBatchResponse(BaseModel):
+    prediction_ids: List[str]
+    charged: float
+    balance: float
+
+
 class PredictionResponse(BaseModel):
     id: str
     user_id: str
@@ -20,6 +52,8 @@ class PredictionResponse(BaseModel):
     output_data: Optional[str]
     model_type: str
     confidence: Optional[float]
+    status: str = "pending"
+    error: Optional[str] = None
     created_at: str
 
     class Config:
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, Optional
 
 
 class MLTaskRequest(BaseModel):
@@ -8,6 +8,7 @@ class MLTaskRequest(BaseModel):
     task_type: str = Field(..., description="Тип задачи (text_to_command)")
     input_data: str = Field(..., description="Входные данные для обработки")
     prediction_id: str = Field(..., description="ID предсказания в БД")
+    priority: str = Field("interactive", description="Приоритет: interactive, normal или bulk")
 
     class Config:
         json_schema_extra = {
@@ -16,7 +17,8 @@ class MLTaskRequest(BaseModel):
                 "user_id": "123e4567-e89b-12d3-a456-426614174000",
                 "task_type": "text_to_command",
                 "input_data": "Создай событие на завтра в 15:00",
-                "prediction_id": "123e4567-e89b-12d3-a456-426614174000"
+                "prediction_id": "123e4567-e89b-12d3-a456-426614174000",
+                "priority": "interactive"
             }
         }
 
@@ -29,3 +31,18 @@ class MLTaskResult(BaseModel):
     status: str = Field(..., description="Статус: completed или failed")
     error: Optional[str] = None
 
+
+
+class DeadLetterResponse(BaseModel):
+    task_id: Optional[str] = None
+    prediction_id: Optional[str] = None
+    user_id: Optional[str] = None
+    task_type: Optional[str] = None
+    attempts: int = Field(0, description="Сколько раз задача уже падала")
+    origin_queue: str = Field(..., description="Очередь, в которую задача вернётся при повторе")
+    error: Optional[str] = None
+    body: Dict[str, Any]
+
+
+class DeadLetterReplayResponse(BaseModel):
+    replayed: int
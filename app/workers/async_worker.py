@@ -0,0 +1,211 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import aio_pika
+
+from app.core.config import settings
+from app.core.metrics import counters
+from app.rabbitmq.results import result_message
+from app.rabbitmq.topology import (
+    binding_specs,
+    dead_letter_queue_name,
+    forwarded_properties,
+    queue_specs,
+    reply_properties,
+    result_properties,
+    retry_properties,
+    shed_queue_name,
+    shed_reason,
+    task_queue_name,
+)
+from app.workers.ml_worker import HEARTBEAT_INTERVAL, MLWorker, dedupe_key
+
+
+class AsyncMLWorker(MLWorker):
+    def __init__(self, task_types: Optional[List[str]] = None):
+        super().__init__(task_types)
+        self._db_pool = ThreadPoolExecutor(
+            max_workers=settings.ML_WORKER_CONCURRENCY,
+            thread_name_prefix="db",
+        )
+        self._channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self._results_exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        # single-flight: задачи, которые сейчас считаются, по dedupe_key
+        self._in_flight: Dict[Any, asyncio.Future] = {}
+
+    def _inference_executor(self) -> ThreadPoolExecutor:
+        # порядок подтверждений здесь не важен: несколько predict идут параллельно
+        return ThreadPoolExecutor(
+            max_workers=settings.ML_WORKER_INFERENCE_THREADS,
+            thread_name_prefix="inference",
+        )
+
+    async def _infer(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        key = None
+        if settings.ML_WORKER_DEDUPE and not self._is_expired(task_data) and self._validate_task(task_data):
+            key = dedupe_key(task_data)
+        if key is None:
+            return await loop.run_in_executor(self._executor, self._process_task, task_data)
+
+        counters.inc("tasks_dedupe_lookups")
+        leader = self._in_flight.get(key)
+        if leader is not None:
+            # та же задача уже считается — ждём её результат вместо второго predict
+            counters.inc("tasks_dedupe_hits")
+            result = await asyncio.shield(leader)
+            if result['status'] != 'expired':
+                return self._shared_result(task_data, result)
+            # у совпавшей задачи вышел свой дедлайн, у этой — нет
+            return await loop.run_in_executor(self._executor, self._process_task, task_data)
+
+        future = loop.run_in_executor(self._executor, self._process_task, task_data)
+        self._in_flight[key] = future
+        try:
+            return await future
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _handle(self, task_data: Dict[str, Any], shed: Optional[str] = None) -> Dict[str, Any]:
+        # как MLWorker._handle_batch для одной задачи: выкинутую брокером не считаем, а возвращаем деньги
+        loop = asyncio.get_running_loop()
+        result = self._expired_result(task_data, shed) if shed is not None else await self._infer(task_data)
+        await loop.run_in_executor(self._db_pool, self._save_results, [result])
+        return result
+
+    async def _publish_result(self, task_data: Dict[str, Any], result: Dict[str, Any]):
+        if self._results_exchange is None:
+            return
+        try:
+            await self._results_exchange.publish(
+                aio_pika.Message(json.dumps(result_message(task_data, result)).encode(), **result_properties()),
+                routing_key="",
+            )
+        except Exception as e:
+            print(f"Error publishing result: {e}")
+
+    async def _reply(self, message: aio_pika.abc.AbstractIncomingMessage, result: Dict[str, Any]):
+        reply = reply_properties(message)
+        if reply is None:
+            return
+        reply_to, properties = reply
+        try:
+            await self._channel.default_exchange.publish(
+                aio_pika.Message(json.dumps(result).encode(), **properties),
+                routing_key=reply_to,
+            )
+        except Exception as e:
+            print(f"Error publishing reply: {e}")
+
+    async def _retry(
+        self,
+        message: aio_pika.abc.AbstractIncomingMessage,
+        task_data: Dict[str, Any],
+        error: str,
+    ):
+        queue, attempt, properties = retry_properties(message, task_data, error)
+        await self._channel.default_exchange.publish(
+            aio_pika.Message(message.body, **properties),
+            routing_key=queue,
+        )
+        await message.ack()
+        print(f"Task sent to {queue} (attempt {attempt})")
+
+    async def _decode(self, message: aio_pika.abc.AbstractIncomingMessage) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(message.body)
+        except ValueError as e:
+            print(f"Error decoding task: {e}")
+            await message.reject(requeue=False)
+            return None
+
+    async def _process(
+        self,
+        message: aio_pika.abc.AbstractIncomingMessage,
+        task_data: Dict[str, Any],
+        shed: Optional[str] = None,
+    ):
+        try:
+            result = await self._handle(task_data, shed)
+        except Exception as e:
+            print(f"Error saving result: {e}")
+            await self._retry(message, task_data, str(e))
+            return
+
+        await self._publish_result(task_data, result)
+        await self._reply(message, result)
+        await message.ack()
+        print(f"Task {result['task_id']} processed with status: {result['status']}")
+
+    async def _on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        task_data = await self._decode(message)
+        if task_data is not None:
+            print(f"Received task: {task_data.get('task_id')}")
+            await self._process(message, task_data)
+
+    async def _on_shed(self, message: aio_pika.abc.AbstractIncomingMessage):
+        reason = shed_reason(message.headers)
+        if reason is None:
+            await self._channel.default_exchange.publish(
+                aio_pika.Message(message.body, **forwarded_properties(message)),
+                routing_key=dead_letter_queue_name(),
+            )
+            await message.ack()
+            return
+
+        task_data = await self._decode(message)
+        if task_data is not None:
+            print(f"Task {task_data.get('task_id')} shed by broker: {reason}")
+            await self._process(message, task_data, shed=reason)
+
+    async def _heartbeat_loop(self):
+        while True:
+            if self.on_heartbeat is not None:
+                self.on_heartbeat()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def run(self):
+        connection = await aio_pika.connect_robust(
+            host=settings.RABBITMQ_HOST,
+            port=settings.RABBITMQ_PORT,
+            login=settings.RABBITMQ_USER,
+            password=settings.RABBITMQ_PASSWORD,
+            heartbeat=settings.RABBITMQ_HEARTBEAT,
+        )
+        async with connection:
+            channel = await connection.channel()
+            self._channel = channel
+            await channel.set_qos(prefetch_count=settings.ML_WORKER_CONCURRENCY)
+            exchange = await channel.declare_exchange(
+                settings.RABBITMQ_EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True
+            )
+            self._results_exchange = await channel.declare_exchange(
+                settings.RABBITMQ_RESULTS_EXCHANGE, aio_pika.ExchangeType.FANOUT, durable=True
+            )
+            queues = {}
+            for name, arguments in queue_specs():
+                queues[name] = await channel.declare_queue(name, durable=True, arguments=arguments)
+            for name, pattern in binding_specs():
+                await queues[name].bind(exchange, routing_key=pattern)
+
+            for task_type in self.models:
+                queue = task_queue_name(task_type)
+                await queues[queue].consume(self._on_message)
+                await queues[shed_queue_name(queue)].consume(self._on_shed)
+                print(
+                    f"Waiting for messages in queue: {queue} "
+                    f"({settings.ML_WORKER_CONCURRENCY} in flight)"
+                )
+            await self._heartbeat_loop()
+
+    def start(self):
+        print("Starting async ML Worker...")
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            print("Stopping worker...")
+        finally:
+            self._executor.shutdown(wait=False)
+            self._db_pool.shutdown(wait=False)
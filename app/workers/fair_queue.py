@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, List
+
+
+class FairQueue:
+    """Round-robin между ключами (user_id): за один проход каждый ключ отдаёт не больше одной задачи"""
+
+    def __init__(self):
+        self._queues: "OrderedDict[str, Deque[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def put(self, key: str, item: Any) -> None:
+        with self._lock:
+            self._queues.setdefault(key, deque()).append(item)
+            self._size += 1
+
+    def get_many(self, limit: int) -> List[Any]:
+        items: List[Any] = []
+        with self._lock:
+            while self._queues and len(items) < limit:
+                key, queue = next(iter(self._queues.items()))
+                items.append(queue.popleft())
+                if queue:
+                    self._queues.move_to_end(key)
+                else:
+                    del self._queues[key]
+            self._size -= len(items)
+        return items
+
+    def take_matching(self, key: str, predicate: Callable[[Any], bool]) -> List[Any]:
+        # забирает из очереди ключа все подходящие задачи, не сдвигая его в round-robin
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                return []
+            taken: List[Any] = []
+            rest: Deque[Any] = deque()
+            for item in queue:
+                (taken if predicate(item) else rest).append(item)
+            if rest:
+                self._queues[key] = rest
+            else:
+                del self._queues[key]
+            self._size -= len(taken)
+            return taken
+
+    def __len__(self) -> int:
+        return self._size
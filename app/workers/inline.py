@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import counters
+from app.rabbitmq.publisher import RabbitMQPublisher, publisher
+from app.rabbitmq.topology import task_queue_name
+from app.workers.ml_worker import MLWorker
+
+EXECUTION_MODES = ["queue", "inline", "hybrid"]
+
+# модели, которые дешевле посчитать прямо в API, чем гонять через очередь
+CHEAP_TASK_TYPES = ["text_to_command"]
+
+
+class InlineExecutor:
+    def __init__(self, publisher: RabbitMQPublisher):
+        self._publisher = publisher
+        self._runner: Optional[MLWorker] = None
+        self._runner_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=settings.PREDICTION_INLINE_THREADS,
+            thread_name_prefix="inline",
+        )
+        # ограничиваем число задач в пуле: лишние запросы уходят в очередь, а не копятся в API
+        self._slots = threading.BoundedSemaphore(settings.PREDICTION_INLINE_MAX_IN_FLIGHT)
+        self._depth_cache: Dict[str, Any] = {}
+
+    def _get_runner(self) -> MLWorker:
+        if self._runner is None:
+            with self._runner_lock:
+                if self._runner is None:
+                    # модели грузятся один раз на процесс API, при первом запросе
+                    self._runner = MLWorker(task_types=CHEAP_TASK_TYPES)
+        return self._runner
+
+    def _cached_depth(self, task_type: str) -> Optional[int]:
+        # глубину очереди берём пассивным queue_declare не чаще раза в PREDICTION_INLINE_DEPTH_TTL_MS
+        now = time.monotonic()
+        cached = self._depth_cache.get(task_type)
+        if cached is not None and now - cached[1] < settings.PREDICTION_INLINE_DEPTH_TTL_MS / 1000.0:
+            return cached[0]
+        try:
+            depth = self._publisher.queue_depth(task_queue_name(task_type))
+        except Exception as e:
+            print(f"Error checking queue depth: {e}")
+            depth = None
+        self._depth_cache[task_type] = (depth, now)
+        return depth
+
+    def should_run_inline(self, task_type: str) -> bool:
+        mode = settings.PREDICTION_EXECUTION_MODE
+        if mode == "queue" or task_type not in CHEAP_TASK_TYPES:
+            return False
+        if mode == "inline":
+            return True
+        # hybrid: пока воркеры справляются, ответ считаем сразу; если брокер недоступен,
+        # посчитать на месте тоже лучше, чем ждать его
+        depth = self._cached_depth(task_type)
+        return depth is None or depth <= settings.PREDICTION_INLINE_MAX_QUEUE_DEPTH
+
+    def run(self, task_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not self._slots.acquire(blocking=False):
+            counters.inc("predictions_inline_saturated")
+            return None
+        try:
+            future = self._pool.submit(self._get_runner()._process_task, task_data)
+        except Exception:
+            self._slots.release()
+            raise
+        # слот освобождается, когда вызов действительно закончился, а не когда мы перестали ждать
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result = future.result(timeout=settings.PREDICTION_INLINE_TIMEOUT_MS / 1000.0)
+        except TimeoutError:
+            # результат опоздавшего вызова не сохраняем: задачу досчитает воркер
+            counters.inc("predictions_inline_timeout")
+            return None
+
+        counters.inc("predictions_inline")
+        return result
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+inline_executor = InlineExecutor(publisher)
@@ -1,24 +1,115 @@
+import functools
 import json
+import time
 import pika
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core.metrics import counters
 from app.db.base import SessionLocal
-from app.models.prediction import PredictionDB
-from app.models.calendar_event import CalendarEventDB
-from classes import TextToCommandModel
+from app.rabbitmq.topology import (
+    dead_letter_queue_name,
+    declare_topology,
+    forwarded_properties,
+    reply_properties,
+    result_properties,
+    retry_properties,
+    shed_queue_name,
+    shed_reason,
+    task_queue_name,
+)
+from app.rabbitmq.results import result_message
+from app.repositories import save_prediction_results
+from app.workers.fair_queue import FairQueue
+from app.workers.prediction_cache import DatabaseCacheTier
+from classes import CachedModel, CascadeModel, MLModel, TextToCommandModel
+
+
+def _speech_to_text_model() -> MLModel:
+    from classes import SpeechToTextModel
+    # батч воркера уходит в pipeline одним проходом
+    return SpeechToTextModel(batch_size=max(1, settings.ML_WORKER_BATCH_SIZE))
+
+
+def _intent_classifier_model() -> MLModel:
+    from classes import IntentClassifierModel
+    # веса отображаются в память в load_model и общие для форкнутых воркеров
+    return IntentClassifierModel(settings.INTENT_CLASSIFIER_PATH)
+
+
+# более тяжёлые модели, которым каскад text_to_command отдаёт неуверенные ответы правил
+ESCALATION_FACTORIES: Dict[str, Callable[[], MLModel]] = {
+    "intent_classifier": _intent_classifier_model,
+}
+
+
+def _text_to_command_model() -> MLModel:
+    model: MLModel = TextToCommandModel(model_path="dummy_path")
+    if settings.ML_WORKER_ESCALATION_MODEL:
+        model.set_confidence_threshold(settings.ML_CASCADE_CONFIDENCE_THRESHOLD)
+        model = CascadeModel(
+            [model, ESCALATION_FACTORIES[settings.ML_WORKER_ESCALATION_MODEL]()],
+            metrics=counters,
+        )
+    if settings.PREDICTION_CACHE_SIZE <= 0:
+        return model
+    # кэш стоит перед каскадом: повторная фраза не доходит ни до правил, ни до эскалации
+    return CachedModel(
+        model,
+        max_size=settings.PREDICTION_CACHE_SIZE,
+        ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS,
+        shared=DatabaseCacheTier() if settings.PREDICTION_CACHE_SHARED else None,
+        metrics=counters,
+    )
+
+
+MODEL_FACTORIES: Dict[str, Callable[[], MLModel]] = {
+    "text_to_command": _text_to_command_model,
+    "speech_to_text": _speech_to_text_model,
+}
+
+HEARTBEAT_INTERVAL = 5.0
+
+SHED_ERRORS = {
+    "deadline": "Deadline exceeded",
+    "overflow": "Dropped: task queue overflow",
+}
+
+
+def dedupe_key(task_data: Dict[str, Any]) -> Optional[Tuple[str, str, Any]]:
+    # одинаковые задачи одного пользователя: текст сравниваем без учёта лишних пробелов
+    input_data = task_data.get('input_data')
+    if isinstance(input_data, str):
+        input_data = " ".join(input_data.split())
+    elif not isinstance(input_data, (int, float, bytes)):
+        return None
+    return (str(task_data.get('user_id')), task_data.get('task_type'), input_data)
 
 
 class MLWorker:
-    def __init__(self):
+    def __init__(self, task_types: Optional[List[str]] = None):
         self.connection = None
         self.channel = None
-        self.model = None
+        self.models: Dict[str, MLModel] = {}
+        self.on_heartbeat: Optional[Callable[[], None]] = None
+        self._task_types = task_types or settings.ML_WORKER_TASK_TYPES
+        self._batch: List[Tuple[int, Any, Dict[str, Any]]] = []
+        self._flush_timer = None
+        self._fair_queue = FairQueue()
+        self._executor = self._inference_executor()
         self._initialize_model()
 
+    def _inference_executor(self) -> ThreadPoolExecutor:
+        # один поток: инференс не блокирует heartbeat-ы, а подтверждения уходят по порядку,
+        # что важно для basic_ack(multiple=True)
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
     def _initialize_model(self):
-        self.model = TextToCommandModel(model_path="dummy_path")
-        self.model.load_model()
+        for task_type in self._task_types:
+            model = MODEL_FACTORIES[task_type]()
+            model.load_model()
+            self.models[task_type] = model
 
     def _connect(self):
         credentials = pika.PlainCredentials(
@@ -29,20 +120,27 @@ class MLWorker:
             host=settings.RABBITMQ_HOST,
             port=settings.RABBITMQ_PORT,
             credentials=credentials,
-            heartbeat=600,
+            heartbeat=settings.RABBITMQ_HEARTBEAT,
             blocked_connection_timeout=300
         )
         self.connection = pika.BlockingConnection(parameters)
         self.channel = self.connection.channel()
-        self.channel.queue_declare(queue=settings.RABBITMQ_QUEUE, durable=True)
-        self.channel.basic_qos(prefetch_count=1)
+        self.channel.confirm_delivery()
+        declare_topology(self.channel)
+        self.channel.basic_qos(prefetch_count=self._prefetch_count())
+
+    def _prefetch_count(self) -> int:
+        if settings.ML_WORKER_FAIR_SCHEDULING:
+            # планировщику нужно видеть задачи разных пользователей, а не только голову очереди
+            return max(settings.ML_WORKER_FAIR_WINDOW, settings.ML_WORKER_BATCH_SIZE)
+        return max(1, settings.ML_WORKER_BATCH_SIZE)
 
     def _validate_task(self, task_data: Dict[str, Any]) -> bool:
         required_fields = ['task_id', 'user_id', 'task_type', 'input_data', 'prediction_id']
         if not all(field in task_data for field in required_fields):
             return False
         
-        if task_data.get('task_type') not in ['text_to_command']:
+        if task_data.get('task_type') not in self.models:
             return False
         
         if not task_data.get('input_data') or len(task_data.get('input_data', '')) == 0:
@@ -50,123 +148,348 @@ class MLWorker:
         
         return True
 
+    def _completed_result(self, task_data: Dict[str, Any], result: Any) -> Dict[str, Any]:
+        if not isinstance(result, dict):
+            result = {'text': result}
+        return {
+            'task_id': task_data['task_id'],
+            'prediction_id': task_data['prediction_id'],
+            'output_data': json.dumps(result),
+            'confidence': result.get('confidence', 0.0),
+            'status': 'completed',
+            'payload': result
+        }
+
+    def _failed_result(self, task_data: Dict[str, Any], error: str) -> Dict[str, Any]:
+        return {
+            'task_id': task_data.get('task_id'),
+            'prediction_id': task_data.get('prediction_id'),
+            'status': 'failed',
+            'error': error
+        }
+
+    def _shared_result(self, task_data: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        # результат совпавшей задачи для дубликата: то же содержимое, свои task_id и prediction_id
+        return {**result, 'task_id': task_data.get('task_id'), 'prediction_id': task_data.get('prediction_id')}
+
+    def _is_expired(self, task_data: Dict[str, Any]) -> bool:
+        deadline = task_data.get('deadline')
+        return deadline is not None and time.time() > deadline
+
+    def _expired_result(self, task_data: Dict[str, Any], reason: str = "deadline") -> Dict[str, Any]:
+        return {
+            'task_id': task_data.get('task_id'),
+            'prediction_id': task_data.get('prediction_id'),
+            'status': 'expired',
+            'error': SHED_ERRORS[reason],
+            'shed': reason,
+        }
+
     def _process_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        if self._is_expired(task_data):
+            return self._expired_result(task_data)
         try:
             if not self._validate_task(task_data):
-                return {
-                    'task_id': task_data.get('task_id'),
-                    'prediction_id': task_data.get('prediction_id'),
-                    'status': 'failed',
-                    'error': 'Invalid task data'
-                }
-
-            input_text = task_data['input_data']
-            result = self.model.predict(input_text)
-            
-            output_data = json.dumps(result)
-            confidence = result.get('confidence', 0.0)
-
-            return {
-                'task_id': task_data['task_id'],
-                'prediction_id': task_data['prediction_id'],
-                'output_data': output_data,
-                'confidence': confidence,
-                'status': 'completed'
-            }
+                return self._failed_result(task_data, 'Invalid task data')
+
+            model = self.models[task_data['task_type']]
+            result = model.predict(task_data['input_data'])
+            return self._completed_result(task_data, result)
         except Exception as e:
-            return {
-                'task_id': task_data.get('task_id'),
-                'prediction_id': task_data.get('prediction_id'),
-                'status': 'failed',
-                'error': str(e)
-            }
-
-    def _save_result(self, result: Dict[str, Any]):
+            return self._failed_result(task_data, str(e))
+
+    def _predict_batch(self, task_type: str, inputs: List[Any]) -> List[Any]:
+        predictions = self.models[task_type].predict_batch(inputs)
+        if len(predictions) != len(inputs):
+            raise ValueError(f"predict_batch returned {len(predictions)} results for {len(inputs)} inputs")
+        return predictions
+
+    def _process_batch(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results: List[Any] = [None] * len(tasks)
+        by_type: Dict[str, List[int]] = {}
+        for i, task_data in enumerate(tasks):
+            if self._is_expired(task_data):
+                # пользователь уже не ждёт ответа — не тратим на задачу инференс
+                results[i] = self._expired_result(task_data)
+            elif self._validate_task(task_data):
+                by_type.setdefault(task_data['task_type'], []).append(i)
+            else:
+                results[i] = self._failed_result(task_data, 'Invalid task data')
+
+        for task_type, indexes in by_type.items():
+            # одинаковые задачи в батче считаем один раз, результат раздаём всем prediction_id
+            leaders, duplicates = self._dedupe(tasks, indexes)
+            try:
+                predictions = self._predict_batch(
+                    task_type, [tasks[i]['input_data'] for i in leaders]
+                )
+            except Exception:
+                # одна битая задача не должна валить весь батч — досчитываем по одной
+                for i in leaders:
+                    results[i] = self._process_task(tasks[i])
+            else:
+                for i, prediction in zip(leaders, predictions):
+                    results[i] = self._completed_result(tasks[i], prediction)
+
+            for i, leader in duplicates:
+                results[i] = self._shared_result(tasks[i], results[leader])
+        return results
+
+    def _dedupe(self, tasks: List[Dict[str, Any]], indexes: List[int]) -> Tuple[List[int], List[Tuple[int, int]]]:
+        if not settings.ML_WORKER_DEDUPE:
+            return indexes, []
+        leaders: List[int] = []
+        duplicates: List[Tuple[int, int]] = []
+        seen: Dict[Any, int] = {}
+        for i in indexes:
+            key = dedupe_key(tasks[i])
+            if key is not None and key in seen:
+                duplicates.append((i, seen[key]))
+                continue
+            if key is not None:
+                seen[key] = i
+            leaders.append(i)
+        counters.inc("tasks_dedupe_lookups", len(indexes))
+        counters.inc("tasks_dedupe_hits", len(duplicates))
+        return leaders, duplicates
+
+    def _save_results(self, results: List[Dict[str, Any]]):
         db: Session = SessionLocal()
         try:
-            prediction = db.query(PredictionDB).filter(
-                PredictionDB.id == result['prediction_id']
-            ).first()
-            
-            if prediction:
-                prediction.output_data = result.get('output_data')
-                prediction.confidence = result.get('confidence')
-
-                try:
-                    payload = json.loads(result.get('output_data') or "{}")
-                except json.JSONDecodeError:
-                    payload = {}
-
-                if payload.get("command_type") == "create_event":
-                    params = payload.get("parameters") or {}
-                    title = params.get("title") or prediction.input_data
-                    start_time_str = params.get("start_time")
-                    end_time_str = params.get("end_time")
-
-                    from datetime import datetime
-
-                    if start_time_str:
-                        try:
-                            start_time = datetime.fromisoformat(start_time_str)
-                        except ValueError:
-                            start_time = prediction.created_at
-                    else:
-                        start_time = prediction.created_at
-
-                    end_time = None
-                    if end_time_str:
-                        try:
-                            end_time = datetime.fromisoformat(end_time_str)
-                        except ValueError:
-                            end_time = None
-
-                    event = CalendarEventDB(
-                        user_id=prediction.user_id,
-                        title=title,
-                        description=None,
-                        start_time=start_time,
-                        end_time=end_time,
-                        location=None,
-                    )
-                    db.add(event)
-
-                db.commit()
-        except Exception as e:
-            print(f"Error saving result: {e}")
+            save_prediction_results(db, results)
+        except Exception:
             db.rollback()
+            raise
         finally:
             db.close()
 
-    def _callback(self, ch, method, properties, body):
+        for result in results:
+            if result.get('shed'):
+                counters.inc(f"tasks_shed_{result['shed']}")
+
+    def _threadsafe(self, func, **kwargs):
+        self.connection.add_callback_threadsafe(functools.partial(func, **kwargs))
+
+    def _retry_batch(
+        self,
+        ch,
+        batch: List[Tuple[int, Any, Dict[str, Any]]],
+        ordered: bool,
+        error: str,
+    ):
+        # выполняется в потоке соединения: задачи уходят в очередь ретрая с задержкой
+        # или, если попытки кончились, в dead letter очередь
+        for delivery_tag, properties, task_data in batch:
+            queue, attempt, retried = retry_properties(properties, task_data, error)
+            ch.basic_publish(
+                exchange="",
+                routing_key=queue,
+                body=json.dumps(task_data),
+                properties=pika.BasicProperties(**retried),
+            )
+            print(f"Task {task_data.get('task_id')} sent to {queue} (attempt {attempt})")
+
+        self._settle(ch, batch, ordered, ch.basic_ack)
+
+    def _publish_results(self, ch, messages: List[Dict[str, Any]], replies=()):
+        # выполняется в потоке соединения: ждущие результата запросы API узнают о нём сразу,
+        # без опроса БД; потеря уведомления не страшна — результат уже в БД
         try:
-            task_data = json.loads(body)
-            print(f"Received task: {task_data.get('task_id')}")
-            
-            result = self._process_task(task_data)
-            self._save_result(result)
-            
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            print(f"Task {result['task_id']} processed with status: {result['status']}")
+            for message in messages:
+                ch.basic_publish(
+                    exchange=settings.RABBITMQ_RESULTS_EXCHANGE,
+                    routing_key="",
+                    body=json.dumps(message),
+                    properties=pika.BasicProperties(**result_properties()),
+                )
+            for (reply_to, properties), result in replies:
+                ch.basic_publish(
+                    exchange="",
+                    routing_key=reply_to,
+                    body=json.dumps(result),
+                    properties=pika.BasicProperties(**properties),
+                )
         except Exception as e:
-            print(f"Error processing task: {e}")
+            print(f"Error publishing results: {e}")
+
+    def _settle(self, ch, batch, ordered: bool, callback, **kwargs):
+        # батч в порядке поступления подтверждается одним multiple=True,
+        # задачи, выбранные честным планировщиком, — по одной
+        if ordered:
+            callback(delivery_tag=batch[-1][0], multiple=len(batch) > 1, **kwargs)
+        else:
+            for delivery_tag, _, _ in batch:
+                callback(delivery_tag=delivery_tag, **kwargs)
+
+    def _handle_batch(
+        self,
+        ch,
+        batch: List[Tuple[int, Any, Dict[str, Any]]],
+        ordered: bool = True,
+        shed: Optional[str] = None,
+    ):
+        # выполняется в потоке инференса: канал трогаем только через add_callback_threadsafe
+        try:
+            if shed is not None:
+                results = [self._expired_result(task_data, shed) for _, _, task_data in batch]
+            else:
+                results = self._process_batch([task_data for _, _, task_data in batch])
+        except Exception as e:
+            print(f"Error processing tasks: {e}")
+            self._threadsafe(
+                self._settle, ch=ch, batch=batch, ordered=ordered,
+                callback=ch.basic_nack, requeue=False,
+            )
+            return
+
+        try:
+            self._save_results(results)
+        except Exception as e:
+            # результат не сохранён — отложенный ретрай вместо потери задачи
+            print(f"Error saving results: {e}")
+            self._threadsafe(self._retry_batch, ch=ch, batch=batch, ordered=ordered, error=str(e))
+            return
+
+        self._threadsafe(
+            self._publish_results, ch=ch,
+            messages=[result_message(task_data, result) for (_, _, task_data), result in zip(batch, results)],
+            replies=[
+                (reply_properties(properties), result)
+                for (_, properties, _), result in zip(batch, results)
+                if reply_properties(properties) is not None
+            ],
+        )
+        self._threadsafe(self._settle, ch=ch, batch=batch, ordered=ordered, callback=ch.basic_ack)
+        for result in results:
+            print(f"Task {result['task_id']} processed with status: {result['status']}")
+
+    def _decode(self, ch, method, body) -> Optional[Dict[str, Any]]:
+        try:
+            task_data = json.loads(body)
+        except ValueError as e:
+            print(f"Error decoding task: {e}")
             ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return None
+        print(f"Received task: {task_data.get('task_id')}")
+        return task_data
+
+    def _callback(self, ch, method, properties, body):
+        task_data = self._decode(ch, method, body)
+        if task_data is not None:
+            self._executor.submit(
+                self._handle_batch, ch, [(method.delivery_tag, properties, task_data)]
+            )
+
+    def _fair_callback(self, ch, method, properties, body):
+        task_data = self._decode(ch, method, body)
+        if task_data is None:
+            return
+
+        self._fair_queue.put(str(task_data.get('user_id')), (method.delivery_tag, properties, task_data))
+        self._executor.submit(self._handle_fair, ch)
+
+    def _handle_fair(self, ch):
+        # пока поток инференса занят, задачи копятся в FairQueue;
+        # освободившись, он берёт следующий батч по кругу между пользователями
+        batch = self._fair_queue.get_many(max(1, settings.ML_WORKER_BATCH_SIZE))
+        if batch:
+            self._handle_batch(ch, batch + self._queued_duplicates(batch), ordered=False)
+
+    def _queued_duplicates(self, batch: List[Tuple[int, Any, Dict[str, Any]]]) -> List[Tuple[int, Any, Dict[str, Any]]]:
+        # повторы задач батча, которые ещё ждут в окне честной очереди, едут с ним же:
+        # predict для них не нужен, поэтому очередь пользователя они не занимают
+        if not settings.ML_WORKER_DEDUPE:
+            return []
+        keys = {dedupe_key(task_data) for _, _, task_data in batch} - {None}
+        duplicates: List[Tuple[int, Any, Dict[str, Any]]] = []
+        for user_id in {str(task_data.get('user_id')) for _, _, task_data in batch}:
+            duplicates.extend(self._fair_queue.take_matching(user_id, lambda item: dedupe_key(item[2]) in keys))
+        return duplicates
+
+    def _shed_callback(self, ch, method, properties, body):
+        reason = shed_reason(getattr(properties, 'headers', None))
+        if reason is None:
+            ch.basic_publish(
+                exchange="",
+                routing_key=dead_letter_queue_name(),
+                body=body,
+                properties=pika.BasicProperties(**forwarded_properties(properties)),
+            )
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        task_data = self._decode(ch, method, body)
+        if task_data is not None:
+            print(f"Task {task_data.get('task_id')} shed by broker: {reason}")
+            self._executor.submit(
+                self._handle_batch, ch, [(method.delivery_tag, properties, task_data)], True, reason
+            )
+
+    def _batch_callback(self, ch, method, properties, body):
+        task_data = self._decode(ch, method, body)
+        if task_data is None:
+            return
+
+        self._batch.append((method.delivery_tag, properties, task_data))
+        if len(self._batch) >= settings.ML_WORKER_BATCH_SIZE:
+            self._flush_batch()
+        elif self._flush_timer is None:
+            self._flush_timer = self.connection.call_later(
+                settings.ML_WORKER_BATCH_TIMEOUT_MS / 1000.0,
+                self._on_flush_timeout
+            )
+
+    def _on_flush_timeout(self):
+        self._flush_timer = None
+        self._flush_batch()
+
+    def _flush_batch(self):
+        if self._flush_timer is not None:
+            self.connection.remove_timeout(self._flush_timer)
+            self._flush_timer = None
+        if not self._batch:
+            return
+
+        batch, self._batch = self._batch, []
+        self._executor.submit(self._handle_batch, self.channel, batch)
+
+    def _beat(self):
+        if self.on_heartbeat is not None:
+            self.on_heartbeat()
+        self.connection.call_later(HEARTBEAT_INTERVAL, self._beat)
 
     def start(self):
         print("Starting ML Worker...")
         try:
             self._connect()
-            print(f"Waiting for messages in queue: {settings.RABBITMQ_QUEUE}")
-            
-            self.channel.basic_consume(
-                queue=settings.RABBITMQ_QUEUE,
-                on_message_callback=self._callback
-            )
+            self._beat()
+
+            if settings.ML_WORKER_FAIR_SCHEDULING:
+                print(f"Fair scheduling between users, window {self._prefetch_count()} tasks")
+                on_message = self._fair_callback
+            elif settings.ML_WORKER_BATCH_SIZE > 1:
+                print(
+                    f"Batching up to {settings.ML_WORKER_BATCH_SIZE} tasks "
+                    f"or {settings.ML_WORKER_BATCH_TIMEOUT_MS} ms"
+                )
+                on_message = self._batch_callback
+            else:
+                on_message = self._callback
+
+            for task_type in self.models:
+                queue = task_queue_name(task_type)
+                self.channel.basic_consume(queue=queue, on_message_callback=on_message)
+                self.channel.basic_consume(
+                    queue=shed_queue_name(queue), on_message_callback=self._shed_callback
+                )
+                print(f"Waiting for messages in queue: {queue}")
             
             try:
                 self.channel.start_consuming()
             except KeyboardInterrupt:
                 print("Stopping worker...")
                 self.channel.stop_consuming()
+                self._executor.shutdown(wait=False, cancel_futures=True)
                 if self.connection and not self.connection.is_closed:
                     self.connection.close()
         except Exception as e:
@@ -0,0 +1,32 @@
+import hashlib
+from typing import Any, Dict, List
+
+from app.db.base import SessionLocal
+from app.repositories import get_cached_predictions, save_cached_predictions
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class DatabaseCacheTier:
+    """Общий уровень кэша CachedModel в таблице prediction_cache: его видят все воркеры и процессы API"""
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        digests = {_digest(key): key for key in keys}
+        db = SessionLocal()
+        try:
+            found = get_cached_predictions(db, list(digests))
+        finally:
+            db.close()
+        return {digests[digest]: value for digest, value in found.items()}
+
+    def set_many(self, values: Dict[str, Any], ttl_seconds: float) -> None:
+        db = SessionLocal()
+        try:
+            save_cached_predictions(db, {_digest(key): value for key, value in values.items()}, ttl_seconds)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
@@ -0,0 +1,207 @@
+import gc
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import WORKER_COUNTERS, cache_hit_rate, cascade_summary, counters, dedupe_hit_rate
+from app.db.base import engine
+from app.workers.ml_worker import HEARTBEAT_INTERVAL
+from app.workers.worker import create_worker, build_parser
+
+RESTART_DELAY = 1.0
+HEARTBEAT_TIMEOUT = HEARTBEAT_INTERVAL * 3
+
+
+@dataclass
+class ChildState:
+    slot: int
+    pid: Optional[int] = None
+    started_at: Optional[float] = None
+    restarts: int = 0
+    last_exit_code: Optional[int] = None
+
+
+class WorkerSupervisor:
+    def __init__(self, processes: int, health_port: Optional[int] = None, worker_engine: str = "blocking"):
+        self.processes = processes
+        self.health_port = health_port
+        self.children: List[ChildState] = [ChildState(slot=i) for i in range(processes)]
+        # разделяемая между процессами память: время последнего heartbeat каждого ребёнка
+        self._heartbeats = multiprocessing.Array('d', processes, lock=False)
+        # и счётчики каждого ребёнка: слот на процесс, внутри — по значению на WORKER_COUNTERS
+        self._counters = multiprocessing.Array('d', processes * len(WORKER_COUNTERS), lock=False)
+        self._stopping = False
+        self._health_server: Optional[ThreadingHTTPServer] = None
+
+        print(f"Loading models once for {processes} worker processes...")
+        self.worker = create_worker(worker_engine)
+
+    def _spawn(self, child: ChildState):
+        # пул соединений и объекты моделей не должны копироваться при каждом форке
+        engine.dispose()
+        gc.collect()
+        gc.freeze()
+
+        pid = os.fork()
+        if pid == 0:
+            self._run_child(child.slot)
+        child.pid = pid
+        child.started_at = time.time()
+        self._heartbeats[child.slot] = child.started_at
+        print(f"Started worker #{child.slot} (pid {pid})")
+
+    def _run_child(self, slot: int):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if self._health_server is not None:
+            self._health_server.socket.close()
+
+        offset = slot * len(WORKER_COUNTERS)
+        # после перезапуска продолжаем счёт с того места, где остановился упавший процесс
+        base = self._counters[offset:offset + len(WORKER_COUNTERS)]
+
+        def heartbeat():
+            self._heartbeats[slot] = time.time()
+            for i, name in enumerate(WORKER_COUNTERS):
+                self._counters[offset + i] = base[i] + counters.get(name)
+
+        self.worker.on_heartbeat = heartbeat
+        code = 0
+        try:
+            self.worker.start()
+        except BaseException as e:
+            print(f"Worker #{slot} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _find_child(self, pid: int) -> Optional[ChildState]:
+        for child in self.children:
+            if child.pid == pid:
+                return child
+        return None
+
+    def _on_child_exit(self, pid: int, status: int):
+        child = self._find_child(pid)
+        if child is None:
+            return
+        child.pid = None
+        child.last_exit_code = os.waitstatus_to_exitcode(status)
+        print(f"Worker #{child.slot} (pid {pid}) exited with code {child.last_exit_code}")
+
+        if not self._stopping:
+            time.sleep(RESTART_DELAY)
+            child.restarts += 1
+            self._spawn(child)
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for child in self.children:
+            if child.pid is not None:
+                try:
+                    os.kill(child.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def _child_metrics(self, slot: int) -> Dict[str, float]:
+        offset = slot * len(WORKER_COUNTERS)
+        return {name: self._counters[offset + i] for i, name in enumerate(WORKER_COUNTERS)}
+
+    def health(self) -> Dict[str, Any]:
+        now = time.time()
+        children = []
+        totals = dict.fromkeys(WORKER_COUNTERS, 0.0)
+        healthy = True
+        for child in self.children:
+            metrics = self._child_metrics(child.slot)
+            for name, value in metrics.items():
+                totals[name] += value
+            last_heartbeat = self._heartbeats[child.slot]
+            alive = child.pid is not None and now - last_heartbeat < HEARTBEAT_TIMEOUT
+            healthy = healthy and alive
+            children.append({
+                'slot': child.slot,
+                'pid': child.pid,
+                'alive': alive,
+                'started_at': datetime.fromtimestamp(child.started_at).isoformat()
+                if child.started_at else None,
+                'last_heartbeat': datetime.fromtimestamp(last_heartbeat).isoformat()
+                if last_heartbeat else None,
+                'restarts': child.restarts,
+                'last_exit_code': child.last_exit_code,
+                'metrics': metrics,
+            })
+        totals['tasks_dedupe_hit_rate'] = dedupe_hit_rate(totals)
+        totals['prediction_cache_hit_rate'] = cache_hit_rate(totals)
+        totals.update(cascade_summary(totals))
+        return {
+            'status': 'healthy' if healthy else 'degraded',
+            'children': children,
+            'metrics': totals,
+        }
+
+    def _start_health_server(self):
+        supervisor = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/health':
+                    self.send_error(404)
+                    return
+                report = supervisor.health()
+                body = json.dumps(report).encode()
+                self.send_response(200 if report['status'] == 'healthy' else 503)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._health_server = ThreadingHTTPServer(('0.0.0.0', self.health_port), HealthHandler)
+        thread = threading.Thread(target=self._health_server.serve_forever, daemon=True)
+        thread.start()
+        print(f"Worker health endpoint: http://0.0.0.0:{self.health_port}/health")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for child in self.children:
+            self._spawn(child)
+
+        if self.health_port:
+            self._start_health_server()
+
+        while any(child.pid is not None for child in self.children):
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            self._on_child_exit(pid, status)
+
+        if self._health_server is not None:
+            self._health_server.shutdown()
+        print("Supervisor stopped")
+
+
+def main():
+    parser = build_parser("Pre-fork ML worker supervisor")
+    parser.add_argument("--processes", type=int, default=settings.ML_WORKER_PROCESSES)
+    parser.add_argument("--health-port", type=int, default=settings.ML_WORKER_HEALTH_PORT)
+    args = parser.parse_args()
+
+    WorkerSupervisor(args.processes, args.health_port, args.engine).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,30 @@
+import argparse
+
+from app.core.config import settings
 from app.workers.ml_worker import MLWorker
 
+ENGINES = ["blocking", "async"]
+
+
+def create_worker(engine: str) -> MLWorker:
+    if engine == "async":
+        from app.workers.async_worker import AsyncMLWorker
+        return AsyncMLWorker()
+    return MLWorker()
+
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default=settings.ML_WORKER_ENGINE,
+        help="blocking: pika.BlockingConnection, async: aio-pika с несколькими задачами в работе",
+    )
+    return parser
+
 
 if __name__ == "__main__":
-    worker = MLWorker()
+    args = build_parser("ML worker").parse_args()
+    worker = create_worker(args.engine)
     worker.start()
-
@@ -0,0 +1,91 @@
+"""
+Обращения к БД на одно предсказание: N вызовов POST /predict/text против одного POST /predict/text/batch
+
+Запуск: python -m benchmarks.bench_batch_submission [размер пачки]
+"""
+import sys
+import time
+import uuid
+
+from sqlalchemy import event
+
+from benchmarks.common import COMMANDS, quiet, reset_db
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.base import SessionLocal, engine
+from app.main import app
+from app.models.user import UserDB
+from app.rabbitmq.publisher import publisher
+
+
+class DBCounter:
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def create_user():
+    user_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        db.add(UserDB(
+            id=user_id,
+            name="Bench User",
+            email=f"{user_id}@bench.local",
+            hashed_password="dummy",
+            balance=1_000_000.0,
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    settings.PREDICTION_EXECUTION_MODE = "queue"
+    reset_db()
+    publisher.publish_tasks = lambda tasks: True
+
+    client = TestClient(app)
+    headers = create_user()
+    texts = [COMMANDS[i % len(COMMANDS)] for i in range(size)]
+    counter = DBCounter()
+
+    with quiet():
+        counter.reset()
+        start = time.perf_counter()
+        for text in texts:
+            assert client.post("/predict/text", headers=headers, json={"text": text}).status_code == 200
+        single = (counter.statements, counter.commits, time.perf_counter() - start)
+
+        counter.reset()
+        start = time.perf_counter()
+        r = client.post("/predict/text/batch", headers=headers, json={"texts": texts})
+        assert r.status_code == 200
+        batch = (counter.statements, counter.commits, time.perf_counter() - start)
+
+    print(f"{size} predictions")
+    for name, (statements, commits, elapsed) in (("single", single), ("batch", batch)):
+        print(
+            f"{name:6}: {statements / size:6.2f} statements/item, {commits / size:5.2f} commits/item, "
+            f"{elapsed * 1000 / size:6.2f} ms/item"
+        )
+    print(f"round trips per item: {single[0] / batch[0]:.1f}x fewer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Разбор команд TextToCommandModel: прежний _parse_command против скомпилированного в load_model
+
+Прежняя реализация скопирована сюда как эталон: бенчмарк сначала проверяет, что ответы
+на корпусе совпадают, потом меряет предсказания в секунду.
+
+Запуск: python -m benchmarks.bench_command_parser [повторов корпуса]
+"""
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from classes import TextToCommandModel
+
+CORPUS = [
+    "Создай событие на завтра в 15:00",
+    "Добавь \"Созвон с командой\" послезавтра в 10:30",
+    "Запланируй “Обед с клиентом” на 13.15",
+    "Создай встречу с Анной завтра",
+    "добавь напоминание купить молоко",
+    "Запланируй ретро в пятницу в 17:30, позвать всю команду",
+    "Покажи список событий",
+    "Покажи мои события на неделю",
+    "Какие у меня события сегодня? Покажи",
+    "Удали событие",
+    "Убери встречу в 12:00",
+    "Отмени созвон с подрядчиком",
+    "Обнови встречу",
+    "Измени время планёрки на 11:00",
+    "Просто текст без команды",
+    "Привет! Как дела?",
+    "Напомни мне, пожалуйста, что-нибудь хорошее",
+    "create meeting tomorrow 10:00",
+    "Add \"Sprint review\" at 16:45",
+    "Create an event called “Dentist” 8.30",
+    "show my events",
+    "List everything for today",
+    "delete the 3pm meeting",
+    "Remove standup",
+    "update the planning session",
+    "Change lunch to 14:00",
+    "What's the weather like?",
+    "Thanks, that's all for now",
+]
+
+
+def legacy_parse_command(text: str) -> Dict[str, Any]:
+    text_lower = text.lower()
+
+    if any(word in text_lower for word in ["создай", "добавь", "запланируй", "create", "add"]):
+        params: Dict[str, Any] = {}
+
+        title_match = re.search(r"[\"“](.+?)[\"”]", text)
+        if title_match:
+            params["title"] = title_match.group(1).strip()
+        else:
+            params["title"] = text
+
+        now = datetime.now()
+        date = now.date()
+
+        if "завтра" in text_lower:
+            date = now.date() + timedelta(days=1)
+        elif "послезавтра" in text_lower:
+            date = now.date() + timedelta(days=2)
+
+        time_match = re.search(r"(\d{1,2})[:.](\d{2})", text_lower)
+        hour = 9
+        minute = 0
+        if time_match:
+            hour = int(time_match.group(1))
+            minute = int(time_match.group(2))
+
+        start_dt = datetime.combine(date, datetime.min.time()).replace(
+            hour=hour, minute=minute, second=0, microsecond=0
+        )
+        end_dt = start_dt + timedelta(hours=1)
+
+        params["start_time"] = start_dt.isoformat()
+        params["end_time"] = end_dt.isoformat()
+
+        return {"command_type": "create_event", "parameters": params, "confidence": 0.9}
+    elif any(word in text_lower for word in ["удали", "убери", "отмени", "delete", "remove"]):
+        return {"command_type": "delete_event", "parameters": {}, "confidence": 0.85}
+    elif any(word in text_lower for word in ["измени", "обнови", "update", "change"]):
+        return {"command_type": "update_event", "parameters": {}, "confidence": 0.8}
+    elif any(word in text_lower for word in ["покажи", "список", "события", "show", "list"]):
+        return {"command_type": "list_events", "parameters": {}, "confidence": 0.9}
+
+    return {"command_type": "unknown", "parameters": {}, "confidence": 0.0}
+
+
+def measure(parse, texts):
+    start = time.perf_counter()
+    for text in texts:
+        parse(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    model = TextToCommandModel(model_path="dummy_path")
+    model.load_model()
+
+    mismatches = [text for text in CORPUS if legacy_parse_command(text) != model._parse_command(text)]
+    if mismatches:
+        raise SystemExit(f"outputs differ for: {mismatches}")
+
+    texts = CORPUS * repeats
+    # лучший из трёх прогонов, чтобы не мерить шум планировщика
+    legacy = max(measure(legacy_parse_command, texts) for _ in range(3))
+    compiled = max(measure(model._parse_command, texts) for _ in range(3))
+
+    print(f"{len(CORPUS)} commands x {repeats}, outputs identical")
+    print(f"legacy _parse_command  : {legacy:12.0f} predictions/s")
+    print(f"compiled in load_model : {compiled:12.0f} predictions/s ({compiled / legacy:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
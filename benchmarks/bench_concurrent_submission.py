@@ -0,0 +1,121 @@
+"""
+Параллельные отправки предсказаний одним пользователем:
+старый путь (add_prediction + withdraw, три commit-а и чтение баланса) против submit_predictions
+
+Запуск: python -m benchmarks.bench_concurrent_submission [потоков] [отправок на поток]
+"""
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import reset_db
+from app.db.base import SessionLocal
+from app.models.transaction import TransactionDB, TransactionTypeDB
+from app.models.user import UserDB
+from app.repositories import add_prediction, submit_predictions
+
+COST = 10.0
+TEXT = "Покажи список событий"
+
+
+def create_user(balance):
+    user_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        db.add(UserDB(
+            id=user_id,
+            name="Bench User",
+            email=f"{user_id}@bench.local",
+            hashed_password="dummy",
+            balance=balance,
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return user_id
+
+
+def legacy_withdraw(db, user_id, amount, description):
+    # прежний repositories.withdraw: прочитать баланс, посчитать новый, записать обратно
+    user = db.query(UserDB).filter(UserDB.id == user_id).first()
+    if user.balance < amount:
+        raise ValueError("Insufficient funds")
+    user.balance = user.balance - amount
+    db.add(TransactionDB(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        type=TransactionTypeDB.WITHDRAWAL,
+        amount=amount,
+        description=description,
+        balance_after=user.balance,
+    ))
+    db.commit()
+
+
+def old_submit(db, user_id):
+    prediction = add_prediction(
+        db=db,
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        input_data=TEXT,
+        output_data=None,
+        model_type="text_to_command",
+        task_id=str(uuid.uuid4()),
+    )
+    try:
+        legacy_withdraw(db, user_id, COST, f"Оплата предсказания #{prediction.id}")
+    except ValueError:
+        db.delete(prediction)
+        db.commit()
+        raise
+
+
+def new_submit(db, user_id):
+    submit_predictions(db, user_id, [TEXT], "text_to_command", COST)
+
+
+def run(submit, threads, per_thread):
+    initial = 1_000_000.0
+    user_id = create_user(initial)
+
+    def worker(_):
+        done = 0
+        for _ in range(per_thread):
+            db = SessionLocal()
+            try:
+                submit(db, user_id)
+                done += 1
+            except Exception:
+                db.rollback()
+            finally:
+                db.close()
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        succeeded = sum(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+
+    db = SessionLocal()
+    try:
+        balance = db.query(UserDB).filter(UserDB.id == user_id).first().balance
+    finally:
+        db.close()
+    lost = round((balance - (initial - succeeded * COST)) / COST)
+    return succeeded / elapsed, succeeded, lost
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    reset_db()
+
+    print(f"{threads} threads x {per_thread} submissions, one user")
+    for name, submit in (("add_prediction + withdraw", old_submit), ("submit_predictions", new_submit)):
+        throughput, succeeded, lost = run(submit, threads, per_thread)
+        print(f"{name:26}: {throughput:8.1f} submissions/s, {succeeded} charged, {lost} lost updates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Задержка лёгких пользователей, когда один пользователь залил очередь бэклогом:
+FIFO (prefetch 1) против честного планировщика FairQueue в окне prefetch
+
+Планировщик видит только окно из prefetch сообщений: если бэклог длиннее окна,
+брокер всё равно отдаёт его голову по порядку, и выигрыш уменьшается (проверьте с 600 задачами).
+
+Запуск: python -m benchmarks.bench_fair_scheduling [задач тяжёлого пользователя]
+"""
+import statistics
+import sys
+
+from app.workers.fair_queue import FairQueue
+
+SERVICE_MS = 20.0
+LIGHT_USERS = 20
+LIGHT_INTERVAL_MS = 2000.0
+WINDOW = 256
+
+
+def arrivals(heavy_tasks):
+    tasks = [(0.0, "heavy") for _ in range(heavy_tasks)]
+    horizon = heavy_tasks * SERVICE_MS
+    t = 0.0
+    i = 0
+    while t < horizon:
+        t += LIGHT_INTERVAL_MS / LIGHT_USERS
+        tasks.append((t, f"light-{i % LIGHT_USERS}"))
+        i += 1
+    tasks.sort(key=lambda task: task[0])
+    return tasks
+
+
+def simulate(tasks, window):
+    # брокер отдаёт консьюмеру не больше window неподтверждённых сообщений;
+    # window=1 — обычный FIFO с prefetch_count=1
+    queue = FairQueue()
+    pending = list(tasks)
+    in_window = 0
+    now = 0.0
+    latencies = {"heavy": [], "light": []}
+
+    while pending or len(queue):
+        while pending and in_window < window and pending[0][0] <= now:
+            arrived, user = pending.pop(0)
+            queue.put(user, (arrived, user))
+            in_window += 1
+        if not len(queue):
+            now = pending[0][0]
+            continue
+
+        arrived, user = queue.get_many(1)[0]
+        now += SERVICE_MS
+        in_window -= 1
+        latencies["heavy" if user == "heavy" else "light"].append(now - arrived)
+    return latencies
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    heavy_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    tasks = arrivals(heavy_tasks)
+    print(f"heavy user: {heavy_tasks} tasks at t=0, {LIGHT_USERS} light users, {SERVICE_MS:.0f} ms per task")
+
+    for name, window in (("FIFO", 1), (f"fair, window {WINDOW}", WINDOW)):
+        latencies = simulate(tasks, window)
+        light = latencies["light"]
+        print(
+            f"{name:18}: light p50 {percentile(light, 50):8.0f} ms, p99 {percentile(light, 99):8.0f} ms, "
+            f"heavy done at {max(latencies['heavy']) / 1000:6.1f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
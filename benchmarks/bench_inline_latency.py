@@ -0,0 +1,116 @@
+"""
+Время от POST /predict/text до готового output_data: очередь + воркер против inline-пути
+
+Брокер заменён in-memory очередью, поэтому задержка очереди здесь — нижняя граница;
+в UI к ней добавляется ещё в среднем половина интервала опроса dashboard.js (10 с).
+
+Запуск: python -m benchmarks.bench_inline_latency [запросов]
+"""
+import queue
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+from benchmarks.common import COMMANDS, FakeChannel, FakeConnection, quiet, reset_db
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.base import SessionLocal
+from app.main import app
+from app.models.user import UserDB
+from app.rabbitmq.publisher import publisher
+from app.workers.ml_worker import MLWorker
+
+POLL_INTERVAL = 0.005
+
+
+def create_user():
+    user_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        db.add(UserDB(
+            id=user_id,
+            name="Bench User",
+            email=f"{user_id}@bench.local",
+            hashed_password="dummy",
+            balance=1_000_000.0,
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+
+def start_worker(tasks):
+    worker = MLWorker(task_types=["text_to_command"])
+    worker.connection = FakeConnection()
+    channel = FakeChannel()
+
+    def consume():
+        tag = 0
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            tag += 1
+            worker._handle_batch(channel, [(tag, None, task)])
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_result(client, headers, prediction_id):
+    while True:
+        predictions = client.get("/users/me/predictions?limit=5", headers=headers).json()
+        for prediction in predictions:
+            if prediction["id"] == prediction_id and prediction["status"] != "pending":
+                return
+        time.sleep(POLL_INTERVAL)
+
+
+def run(client, headers, mode, requests):
+    settings.PREDICTION_EXECUTION_MODE = mode
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        r = client.post("/predict/text", headers=headers, json={"text": COMMANDS[i % len(COMMANDS)]})
+        body = r.json()
+        if body["status"] == "pending":
+            wait_result(client, headers, body["id"])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    reset_db()
+    tasks = queue.Queue()
+    settings.TASK_PUBLISH_MODE = "direct"
+    publisher.publish_task = lambda task: tasks.put(task) or True
+    publisher.queue_depth = lambda name: tasks.qsize()
+
+    client = TestClient(app)
+    headers = create_user()
+    with quiet():
+        worker = start_worker(tasks)
+        run(client, headers, "inline", 10)
+        queued = run(client, headers, "queue", requests)
+        inline = run(client, headers, "hybrid", requests)
+        tasks.put(None)
+        worker.join()
+
+    print(f"{requests} requests, poll every {POLL_INTERVAL * 1000:.0f} ms")
+    for name, latencies in (("queue + worker", queued), ("hybrid (inline)", inline)):
+        latencies.sort()
+        print(
+            f"{name:16}: p50 {statistics.median(latencies):7.2f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms"
+        )
+    print("dashboard.js polls every 10 s: the queue path adds ~5000 ms on average in the UI")
+
+
+if __name__ == "__main__":
+    main()
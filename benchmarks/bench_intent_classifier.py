@@ -0,0 +1,92 @@
+"""
+Правила TextToCommandModel против IntentClassifierModel и каскада из них
+
+Классификатор учится на 80% data/intent_commands.jsonl; точность считается на оставшихся 20%
+и на фразах, которых нет ни в данных, ни в шаблонах генерации (HELD_OUT). Дальше —
+предсказания в секунду (поштучно и батчем), размер .npz и время load_model.
+
+Запуск: python -m benchmarks.bench_intent_classifier [повторов корпуса]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from classes import CascadeModel, TextToCommandModel
+from classes.intent_classifier_model import IntentClassifierModel, read_jsonl
+
+HELD_OUT = [
+    ("Назначь встречу с Петей на завтра", "create_event"),
+    ("Запиши меня к стоматологу в среду в 9:30", "create_event"),
+    ("Поставь созвон с подрядчиком на 16:00", "create_event"),
+    ("schedule a call with Anna tomorrow", "create_event"),
+    ("Сотри тренировку", "delete_event"),
+    ("Отмени планёрку в понедельник", "delete_event"),
+    ("cancel the dentist appointment", "delete_event"),
+    ("Перенеси созвон на пятницу", "update_event"),
+    ("Сдвинь обед на час позже", "update_event"),
+    ("move the review to 17:00", "update_event"),
+    ("Что у меня на неделе?", "list_events"),
+    ("Какие планы на завтра?", "list_events"),
+    ("what's on my calendar today", "list_events"),
+    ("Сколько тебе лет?", "unknown"),
+    ("Расскажи анекдот", "unknown"),
+    ("how do I reset my password", "unknown"),
+]
+
+
+def accuracy(model, texts, labels):
+    results = model.predict_batch(texts)
+    return sum(r["command_type"] == label for r, label in zip(results, labels)) / len(labels)
+
+
+def throughput(predict, texts):
+    start = time.perf_counter()
+    predict(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    texts, labels = read_jsonl("data/intent_commands.jsonl")
+    order = list(range(len(texts)))
+    random.Random(0).shuffle(order)
+    cut = int(len(order) * 0.8)
+    train, test = order[:cut], order[cut:]
+
+    path = os.path.join(tempfile.mkdtemp(), "intent_classifier.npz")
+    trainer = IntentClassifierModel(path)
+    trainer.train([texts[i] for i in train], [labels[i] for i in train])
+    trainer.save_model(path)
+
+    start = time.perf_counter()
+    classifier = IntentClassifierModel(path)
+    classifier.load_model()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    rules = TextToCommandModel(model_path="dummy_path")
+    rules.load_model()
+    cascade = CascadeModel([rules, classifier], confidence_threshold=0.7)
+    cascade.load_model()
+
+    test_texts, test_labels = [texts[i] for i in test], [labels[i] for i in test]
+    held_texts, held_labels = [t for t, _ in HELD_OUT], [label for _, label in HELD_OUT]
+    print(f"trained on {len(train)} commands, {os.path.getsize(path) / 1024:.0f} KB .npz, load_model {load_ms:.1f} ms")
+    print(f"{'model':<12} {'split acc':>10} {'held-out acc':>13}")
+    for name, model in (("rules", rules), ("classifier", classifier), ("cascade", cascade)):
+        print(f"{name:<12} {accuracy(model, test_texts, test_labels):10.2%} "
+              f"{accuracy(model, held_texts, held_labels):13.2%}")
+    print(f"cascade escalation rate: {cascade.stats()['escalation_rate']:.2%}")
+
+    corpus = texts * repeats
+    one_by_one = lambda batch: [classifier.predict(text) for text in batch]  # noqa: E731
+    # лучший из трёх прогонов, чтобы не мерить шум планировщика
+    print(f"{len(corpus)} predictions")
+    print(f"rules               : {max(throughput(rules.predict_batch, corpus) for _ in range(3)):10.0f} predictions/s")
+    print(f"classifier, per text: {max(throughput(one_by_one, corpus) for _ in range(3)):10.0f} predictions/s")
+    print(f"classifier, batched : {max(throughput(classifier.predict_batch, corpus) for _ in range(3)):10.0f} predictions/s")
+
+
+if __name__ == "__main__":
+    main()
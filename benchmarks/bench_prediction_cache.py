@@ -0,0 +1,58 @@
+"""
+Кэш предсказаний CachedModel перед каскадом text_to_command (правила + IntentClassifierModel)
+
+Поток фраз с повторами по закону Ципфа из data/intent_commands.jsonl: несколько частых
+команд дают большую часть трафика. Меряются предсказания в секунду без кэша и с кэшем
+и доля попаданий.
+
+Запуск: python -m benchmarks.bench_prediction_cache [фраз в потоке] [размер батча]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.metrics import Counters, cache_hit_rate
+from classes import CachedModel, CascadeModel, TextToCommandModel
+from classes.intent_classifier_model import IntentClassifierModel, read_jsonl
+
+
+def run(model, stream, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(stream), batch_size):
+        model.predict_batch(stream[i:i + batch_size])
+    return len(stream) / (time.perf_counter() - start)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    texts, labels = read_jsonl("data/intent_commands.jsonl")
+
+    path = os.path.join(tempfile.mkdtemp(), "intent_classifier.npz")
+    trainer = IntentClassifierModel(path)
+    trainer.train(texts, labels)
+    trainer.save_model(path)
+
+    cascade = CascadeModel([TextToCommandModel(model_path="dummy_path"), IntentClassifierModel(path)])
+    cascade.load_model()
+
+    ranks = np.random.default_rng(0).zipf(1.2, total) % len(texts)
+    stream = [texts[rank] for rank in ranks]
+
+    uncached = run(cascade, stream, batch_size)
+    metrics = Counters()
+    cached = CachedModel(cascade, metrics=metrics)
+    cached.load_model()
+    with_cache = run(cached, stream, batch_size)
+
+    print(f"{total} phrases ({len(set(stream))} distinct), batches of {batch_size}")
+    print(f"cascade without cache: {uncached:10.0f} predictions/s")
+    print(f"cascade with cache   : {with_cache:10.0f} predictions/s ({with_cache / uncached:4.1f}x), "
+          f"hit rate {cache_hit_rate(metrics.snapshot()):.1%}")
+
+
+if __name__ == "__main__":
+    main()
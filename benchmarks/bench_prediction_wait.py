@@ -0,0 +1,158 @@
+"""
+Время до результата и запросы к БД: опрос /users/me/predictions (как dashboard.js)
+против GET /predictions/{id}?wait=...
+
+Брокер заменён in-memory очередью, уведомления воркера из обменника результатов
+доставляются в result_notifier напрямую — так же, как это делает ResultListener.
+Интервал опроса сжат до POLL_INTERVAL; в UI он 10 с, и в среднем опрос добавляет его половину.
+
+Запуск: python -m benchmarks.bench_prediction_wait [запросов]
+"""
+import json
+import queue
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+
+from benchmarks.common import COMMANDS, FakeChannel, FakeConnection, quiet, reset_db
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.base import SessionLocal, engine
+from app.main import app
+from app.models.user import UserDB
+from app.rabbitmq.publisher import publisher
+from app.rabbitmq.results import result_listener, result_notifier
+from app.workers.ml_worker import MLWorker
+
+POLL_INTERVAL = 0.5
+INFERENCE_TIME = 1.2
+
+
+class ResultsChannel(FakeChannel):
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if exchange == settings.RABBITMQ_RESULTS_EXCHANGE:
+            result_notifier.notify(json.loads(body))
+        else:
+            super().basic_publish(exchange, routing_key, body, properties, mandatory)
+
+
+class SlowModel:
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, input_data):
+        time.sleep(INFERENCE_TIME)
+        return self.model.predict(input_data)
+
+
+def create_user():
+    user_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        db.add(UserDB(
+            id=user_id,
+            name="Bench User",
+            email=f"{user_id}@bench.local",
+            hashed_password="dummy",
+            balance=1_000_000.0,
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+
+def start_worker(tasks):
+    worker = MLWorker(task_types=["text_to_command"])
+    worker.models["text_to_command"] = SlowModel(worker.models["text_to_command"])
+    worker.connection = FakeConnection()
+    channel = ResultsChannel()
+
+    def consume():
+        tag = 0
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            tag += 1
+            worker._handle_batch(channel, [(tag, None, task)])
+
+    thread = threading.Thread(target=consume, name="bench-worker", daemon=True)
+    thread.start()
+    return thread
+
+
+def poll(client, headers, prediction_id):
+    calls = 0
+    while True:
+        time.sleep(POLL_INTERVAL)
+        calls += 1
+        for prediction in client.get("/users/me/predictions?limit=5", headers=headers).json():
+            if prediction["id"] == prediction_id and prediction["status"] != "pending":
+                return calls
+
+
+def long_poll(client, headers, prediction_id):
+    calls = 1
+    while client.get(f"/predictions/{prediction_id}?wait=10s", headers=headers).json()["status"] == "pending":
+        calls += 1
+    return calls
+
+
+def run(client, headers, wait, requests, statements):
+    latencies = []
+    calls = 0
+    before = statements[0]
+    for i in range(requests):
+        prediction_id = client.post(
+            "/predict/text", headers=headers, json={"text": COMMANDS[i % len(COMMANDS)]}
+        ).json()["id"]
+        start = time.perf_counter()
+        calls += wait(client, headers, prediction_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, calls / requests, (statements[0] - before) / requests
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    reset_db()
+    tasks = queue.Queue()
+    settings.TASK_PUBLISH_MODE = "direct"
+    settings.PREDICTION_EXECUTION_MODE = "queue"
+    publisher.publish_task = lambda task: tasks.put(task) or True
+    # слушатель брокера не нужен: уведомления приходят из ResultsChannel
+    result_listener.start = lambda: None
+
+    statements = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        # считаем только запросы API, записи воркера одинаковы в обоих режимах
+        if threading.current_thread().name != "bench-worker":
+            statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+
+    client = TestClient(app)
+    headers = create_user()
+    with quiet():
+        worker = start_worker(tasks)
+        polled = run(client, headers, poll, requests, statements)
+        waited = run(client, headers, long_poll, requests, statements)
+        tasks.put(None)
+        worker.join()
+
+    print(f"{requests} predictions, inference {INFERENCE_TIME * 1000:.0f} ms, poll every {POLL_INTERVAL:.1f} s")
+    for name, (latencies, calls, api_statements) in (("poll list", polled), ("wait=10s", waited)):
+        print(
+            f"{name:9}: median time to result {statistics.median(latencies):8.1f} ms, "
+            f"{calls:4.1f} requests and {api_statements:4.1f} API DB statements per prediction"
+        )
+
+
+if __name__ == "__main__":
+    main()
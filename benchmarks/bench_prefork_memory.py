@@ -0,0 +1,86 @@
+"""
+Память N воркеров: каждый процесс грузит модель сам против pre-fork с общей моделью
+
+Запуск: python -m benchmarks.bench_prefork_memory [процессов] [размер модели, МБ]
+"""
+import os
+import signal
+import sys
+import time
+
+from benchmarks.common import quiet
+from app.workers.ml_worker import MODEL_FACTORIES, MLWorker
+from classes import MLModel
+
+
+class HeavyModel(MLModel):
+    """Заглушка тяжёлой модели: веса — один большой буфер, как тензоры Whisper"""
+
+    size_mb = 128
+
+    def __init__(self):
+        super().__init__("bench_heavy", "bench_heavy")
+
+    def load_model(self) -> None:
+        self._model = bytes(range(256)) * (self.size_mb * 1024 * 1024 // 256)
+        self._is_loaded = True
+
+    def predict(self, input_data):
+        return {"size": len(self._model)}
+
+    def save_model(self, path: str) -> None:
+        pass
+
+
+def read_memory_kb(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def measure(processes, prefork):
+    worker = MLWorker(task_types=["bench_heavy"]) if prefork else None
+
+    pids = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            # держим ссылку на модель, иначе её веса сразу освободятся
+            worker = worker or MLWorker(task_types=["bench_heavy"])
+            time.sleep(3600)
+            os._exit(0)
+        pids.append(pid)
+
+    time.sleep(2)
+    rss = pss = 0
+    for pid in pids:
+        memory = read_memory_kb(pid)
+        rss += memory["Rss"]
+        pss += memory["Pss"]
+
+    for pid in pids:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    return rss / 1024, pss / 1024
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    HeavyModel.size_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    MODEL_FACTORIES["bench_heavy"] = HeavyModel
+
+    print(f"{processes} workers, model {HeavyModel.size_mb} MB")
+    with quiet():
+        separate = measure(processes, prefork=False)
+        shared = measure(processes, prefork=True)
+    print(f"separate load: RSS {separate[0]:8.1f} MB, PSS {separate[1]:8.1f} MB")
+    print(f"pre-fork     : RSS {shared[0]:8.1f} MB, PSS {shared[1]:8.1f} MB")
+    print("RSS counts shared pages in every process, PSS splits them between sharers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Публикация задач из многих потоков запросов: одно BlockingConnection под общим lock-ом
+с подтверждением каждого сообщения против PublisherThread (пачки + multiple=True confirms)
+
+Брокер симулирован: сообщение подтверждается через RTT после публикации, подтверждения
+всего, что пришло к этому моменту, брокер отправляет одним фреймом — как RabbitMQ.
+Цифры показывают форму зависимости от RTT, а не пропускную способность реального брокера.
+
+Запуск: python -m benchmarks.bench_publisher_load [потоков] [задач на поток] [RTT, мс]
+"""
+import queue
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pika
+
+import benchmarks.common  # noqa: F401  (окружение для app.core.config)
+from app.rabbitmq.publisher_thread import PublisherThread
+
+
+class LockedBlockingPublisher:
+    # как было: общий канал под lock-ом, basic_publish ждёт confirm на каждое сообщение
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.lock = threading.Lock()
+
+    def publish_task(self, task):
+        with self.lock:
+            time.sleep(self.rtt)
+        return True
+
+
+class FakeIOLoop:
+    def __init__(self):
+        self.callbacks = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.put(callback)
+
+    def _run(self):
+        while True:
+            callback = self.callbacks.get()
+            if callback is None:
+                return
+            callback()
+
+    def stop(self):
+        self.callbacks.put(None)
+        self.thread.join()
+
+
+class FakeConfirmingChannel:
+    def __init__(self, ioloop, on_confirm, rtt):
+        self.ioloop = ioloop
+        self.on_confirm = on_confirm
+        self.rtt = rtt
+        self.tag = 0
+        self.inflight = queue.Queue()
+        threading.Thread(target=self._broker, daemon=True).start()
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.tag += 1
+        self.inflight.put((time.perf_counter() + self.rtt, self.tag))
+
+    def _broker(self):
+        while True:
+            due, tag = self.inflight.get()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # всё, что успело дойти, подтверждается одним фреймом
+            while True:
+                try:
+                    due, next_tag = self.inflight.get_nowait()
+                except queue.Empty:
+                    break
+                tag = next_tag
+            frame = SimpleNamespace(method=pika.spec.Basic.Ack(delivery_tag=tag, multiple=True))
+            self.ioloop.add_callback_threadsafe(lambda frame=frame: self.on_confirm(frame))
+
+
+class ThreadedPublisher:
+    def __init__(self, rtt):
+        self.io = PublisherThread()
+        self.io._ioloop = FakeIOLoop()
+        self.io._channel = FakeConfirmingChannel(self.io._ioloop, self.io._on_confirm, rtt)
+        self.io._ready = True
+
+    def publish_task(self, task):
+        return self.io.submit(task).result(timeout=30)
+
+    def close(self):
+        self.io._ioloop.stop()
+
+
+def run(publisher, threads, per_thread):
+    task = {"task_id": "bench", "task_type": "text_to_command", "input_data": "Покажи список событий"}
+
+    def worker(_):
+        latencies = []
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            publisher.publish_task(task)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = sorted(latency for chunk in pool.map(worker, range(threads)) for latency in chunk)
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rtt = (float(sys.argv[3]) if len(sys.argv) > 3 else 2.0) / 1000
+
+    print(f"{threads} threads x {per_thread} publishes, simulated broker RTT {rtt * 1000:.1f} ms")
+    threaded = ThreadedPublisher(rtt)
+    for name, publisher in (("lock + confirm each", LockedBlockingPublisher(rtt)), ("PublisherThread", threaded)):
+        throughput, latencies = run(publisher, threads, per_thread)
+        print(
+            f"{name:19}: {throughput:9.1f} msg/s, p50 {statistics.median(latencies):7.2f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms"
+        )
+    threaded.close()
+
+
+if __name__ == "__main__":
+    main()
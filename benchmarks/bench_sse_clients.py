@@ -0,0 +1,198 @@
+"""
+Сотни открытых вкладок dashboard на одном процессе uvicorn: опрос раз в 10 с
+(баланс + список предсказаний) против потока /users/me/events/stream
+
+Сервер запускается отдельным процессом; память (VmRSS) и процессорное время (utime + stime)
+берутся из /proc, поэтому бенчмарк работает только на Linux. Брокер не нужен: событие
+вызывает пополнение баланса, которое публикует репозиторий того же процесса.
+
+Запуск: python -m benchmarks.bench_sse_clients [клиентов] [окно, с]
+"""
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import reset_db
+from app.core.security import create_access_token
+from app.db.base import SessionLocal
+from app.models.user import UserDB
+
+POLL_INTERVAL = 10.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def create_users(count):
+    db = SessionLocal()
+    try:
+        user_ids = [str(uuid.uuid4()) for _ in range(count)]
+        for user_id in user_ids:
+            db.add(UserDB(
+                id=user_id,
+                name="Bench User",
+                email=f"{user_id}@bench.local",
+                hashed_password="dummy",
+                role="admin",
+                balance=1_000_000.0,
+            ))
+        db.commit()
+    finally:
+        db.close()
+    return [create_access_token({"sub": user_id}) for user_id in user_ids]
+
+
+def proc_stats(pid):
+    with open(f"/proc/{pid}/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return rss_kb / 1024, cpu
+
+
+def start_server(port):
+    env = dict(
+        os.environ,
+        TASK_PUBLISH_MODE="direct",
+        RABBITMQ_HOST="127.0.0.1",
+        RABBITMQ_PORT="1",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/openapi.json").status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+async def poll_window(base, tokens, window):
+    # каждая вкладка раз в POLL_INTERVAL перечитывает баланс и предсказания, как setInterval в dashboard.js
+    async with httpx.AsyncClient(base_url=base, limits=httpx.Limits(max_connections=len(tokens))) as client:
+        async def tab(token):
+            headers = {"Authorization": f"Bearer {token}"}
+            await asyncio.sleep(random.uniform(0, POLL_INTERVAL))
+            end = time.monotonic() + window
+            requests = 0
+            while time.monotonic() < end:
+                await client.get("/users/me/balance", headers=headers)
+                await client.get("/users/me/predictions?limit=20", headers=headers)
+                requests += 2
+                await asyncio.sleep(POLL_INTERVAL)
+            return requests
+
+        return sum(await asyncio.gather(*(tab(token) for token in tokens)))
+
+
+async def sse_window(base, tokens, window, server_pid):
+    limits = httpx.Limits(max_connections=len(tokens) + 10)
+    timeout = httpx.Timeout(None)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=timeout) as client:
+        connected = asyncio.Event()
+        ready = 0
+        received = {}
+
+        async def tab(token):
+            nonlocal ready
+            async with client.stream("GET", f"/users/me/events/stream?token={token}") as response:
+                async for line in response.aiter_lines():
+                    if line.startswith("retry:"):
+                        ready += 1
+                        if ready == len(tokens):
+                            connected.set()
+                    elif line.startswith("event: transaction"):
+                        received[token] = time.perf_counter()
+
+        tabs = [asyncio.create_task(tab(token)) for token in tokens]
+        await asyncio.wait_for(connected.wait(), 60)
+        rss_connected, cpu_before = proc_stats(server_pid)
+
+        # вкладки просто висят на потоке: считаем, сколько стоит держать их открытыми
+        await asyncio.sleep(window)
+        rss_idle, cpu_idle = proc_stats(server_pid)
+
+        # каждая вкладка по очереди пополняет баланс и ждёт события о транзакции в своём потоке
+        # (по очереди — чтобы мерить доставку события, а не блокировки SQLite)
+        sent = {}
+        async with httpx.AsyncClient(base_url=base, timeout=timeout) as api:
+            for token in tokens:
+                sent[token] = time.perf_counter()
+                await api.post(
+                    "/users/me/balance/deposit",
+                    headers={"Authorization": f"Bearer {token}"},
+                    json={"amount": 10.0},
+                )
+        deadline = time.perf_counter() + 10
+        while len(received) < len(tokens) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+        for task in tabs:
+            task.cancel()
+        await asyncio.gather(*tabs, return_exceptions=True)
+
+    delays = sorted((received[token] - sent[token]) * 1000 for token in received)
+    return rss_connected, rss_idle, cpu_idle - cpu_before, delays
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    window = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    reset_db()
+    tokens = create_users(clients)
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+
+    server = start_server(port)
+    try:
+        rss_start, cpu_start = proc_stats(server.pid)
+        requests = asyncio.run(poll_window(base, tokens, window))
+        rss_poll, cpu_poll = proc_stats(server.pid)
+
+        rss_connected, rss_idle, cpu_sse, delays = asyncio.run(sse_window(base, tokens, window, server.pid))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    print(f"{clients} dashboard tabs, one uvicorn process, {window:.0f} s window")
+    print(f"server RSS at start: {rss_start:7.1f} MB")
+    print(
+        f"polling every {POLL_INTERVAL:.0f} s: {requests} authenticated requests, "
+        f"CPU {cpu_poll - cpu_start:5.2f} s, RSS {rss_poll:7.1f} MB"
+    )
+    print(
+        f"SSE streams open   : 0 requests, CPU {cpu_sse:5.2f} s, "
+        f"RSS {rss_idle:7.1f} MB ({(rss_connected - rss_poll) * 1024 / clients:5.1f} KB per stream)"
+    )
+    if delays:
+        print(
+            f"deposit pushed to its tab: {len(delays)}/{clients}, p50 {statistics.median(delays):7.1f} ms, "
+            f"p99 {delays[int(len(delays) * 0.99) - 1]:7.1f} ms (polling: up to {POLL_INTERVAL * 1000:.0f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
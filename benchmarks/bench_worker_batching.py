@@ -0,0 +1,63 @@
+"""
+Пропускная способность MLWorker: поштучный _callback против батчевого режима
+
+Запуск: python -m benchmarks.bench_worker_batching [количество сообщений]
+"""
+import json
+import sys
+import time
+
+from benchmarks.common import FakeChannel, FakeConnection, delivery, quiet, reset_db, seed_tasks
+from app.core.config import settings
+from app.workers.ml_worker import MLWorker
+
+
+def wait_idle(worker):
+    worker._executor.submit(lambda: None).result()
+
+
+def run_single(worker, tasks):
+    channel = FakeChannel()
+    worker.connection = FakeConnection()
+    start = time.perf_counter()
+    with quiet():
+        for tag, task in enumerate(tasks, 1):
+            worker._callback(channel, delivery(tag), None, json.dumps(task).encode())
+        wait_idle(worker)
+    elapsed = time.perf_counter() - start
+    assert len(channel.acked) == len(tasks)
+    return elapsed
+
+
+def run_batched(worker, tasks, batch_size):
+    settings.ML_WORKER_BATCH_SIZE = batch_size
+    channel = FakeChannel()
+    worker.channel = channel
+    worker.connection = FakeConnection()
+    start = time.perf_counter()
+    with quiet():
+        for tag, task in enumerate(tasks, 1):
+            worker._batch_callback(channel, delivery(tag), None, json.dumps(task).encode())
+        worker._flush_batch()
+        wait_idle(worker)
+    elapsed = time.perf_counter() - start
+    assert channel.acked[-1] == (len(tasks), True)
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    worker = MLWorker()
+
+    reset_db()
+    elapsed = run_single(worker, seed_tasks(count))
+    print(f"single   : {count / elapsed:10.1f} msg/s")
+
+    for batch_size in (8, 32, 128):
+        reset_db()
+        elapsed = run_batched(worker, seed_tasks(count), batch_size)
+        print(f"batch={batch_size:<4}: {count / elapsed:10.1f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
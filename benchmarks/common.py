@@ -0,0 +1,119 @@
+"""
+Общие заготовки для бенчмарков: окружение, in-memory заглушки RabbitMQ и тестовые данные
+"""
+import contextlib
+import io
+import os
+import tempfile
+import uuid
+from types import SimpleNamespace
+
+_BENCH_DIR = tempfile.mkdtemp(prefix="ai-secretary-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_BENCH_DIR}/bench.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+
+from app.db.base import Base, engine, SessionLocal  # noqa: E402
+from app.models.user import UserDB  # noqa: E402
+from app.models.prediction import PredictionDB  # noqa: E402
+
+
+COMMANDS = [
+    "Создай событие на завтра в 15:00",
+    "Покажи список событий",
+    "Удали событие",
+    "Добавь \"Созвон с командой\" послезавтра в 10:30",
+    "create meeting tomorrow 10:00",
+    "Обнови встречу",
+    "show my events",
+    "Просто текст без команды",
+]
+
+
+class FakeChannel:
+    def __init__(self):
+        self.acked = []
+        self.nacked = []
+        self.published = []
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.acked.append((delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.nacked.append((delivery_tag, multiple, requeue))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.published.append((exchange, routing_key, body, properties))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.timers = []
+        self.is_closed = False
+
+    def call_later(self, delay, callback):
+        self.timers.append(callback)
+        return len(self.timers)
+
+    def remove_timeout(self, timer_id):
+        pass
+
+    def add_callback_threadsafe(self, callback):
+        callback()
+
+    def close(self):
+        self.is_closed = True
+
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def delivery(tag):
+    return SimpleNamespace(delivery_tag=tag, redelivered=False)
+
+
+def reset_db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def seed_tasks(count, users=1, balance=1_000_000.0):
+    db = SessionLocal()
+    try:
+        user_ids = []
+        for _ in range(users):
+            user_id = str(uuid.uuid4())
+            db.add(UserDB(
+                id=user_id,
+                name="Bench User",
+                email=f"{user_id}@bench.local",
+                hashed_password="dummy",
+                balance=balance,
+            ))
+            user_ids.append(user_id)
+        db.commit()
+
+        tasks = []
+        for i in range(count):
+            user_id = user_ids[i % users]
+            prediction_id = str(uuid.uuid4())
+            task_id = str(uuid.uuid4())
+            text = COMMANDS[i % len(COMMANDS)]
+            db.add(PredictionDB(
+                id=prediction_id,
+                user_id=user_id,
+                task_id=task_id,
+                input_data=text,
+                model_type="text_to_command",
+            ))
+            tasks.append({
+                "task_id": task_id,
+                "user_id": user_id,
+                "task_type": "text_to_command",
+                "input_data": text,
+                "prediction_id": prediction_id,
+            })
+        db.commit()
+        return tasks
+    finally:
+        db.close()
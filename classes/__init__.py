@@ -1,6 +1,8 @@
 from .user import User
 from .ml_model import MLModel
 from .text_to_command_model import TextToCommandModel
+from .cascade_model import CascadeModel
+from .cached_model import CachedModel
 from .ml_task import MLTask
 from .prediction_history import PredictionHistory
 from .calendar_event import CalendarEvent
@@ -20,6 +22,8 @@ __all__ = [
     "User",
     "MLModel",
     "TextToCommandModel",
+    "CascadeModel",
+    "CachedModel",
     "MLTask",
     "PredictionHistory",
     "CalendarEvent",
@@ -39,6 +43,9 @@ def __getattr__(name):
     if name == "SpeechToTextModel":
         from .speech_to_text_model import SpeechToTextModel
         return SpeechToTextModel
+    if name == "IntentClassifierModel":
+        from .intent_classifier_model import IntentClassifierModel
+        return IntentClassifierModel
     if name == "MLService":
         from .ml_service import MLService
         return MLService
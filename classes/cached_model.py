@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+import threading
+import time
+
+from .ml_model import MLModel
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class CachedModel(MLModel):
+    """LRU-кэш с TTL перед моделью: повторная фраза за тот же день не доходит до predict"""
+
+    def __init__(
+        self,
+        model: MLModel,
+        max_size: int = 10000,
+        ttl_seconds: float = 300.0,
+        shared: Any = None,
+        metrics: Any = None,
+        metrics_prefix: str = "prediction_cache",
+    ):
+        super().__init__("cache", model.get_model_type())
+        self._model = model
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        # общий уровень для нескольких процессов: объект с get_many(keys) и set_many(values, ttl_seconds)
+        self._shared = shared
+        # объект с inc(name, value), например app.core.metrics.counters
+        self._metrics = metrics
+        self._metrics_prefix = metrics_prefix
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load_model(self) -> None:
+        if not self._model.is_loaded():
+            self._model.load_model()
+        self._is_loaded = True
+
+    def predict(self, input_data: Any) -> Any:
+        return self.predict_batch([input_data])[0]
+
+    def predict_batch(self, inputs: List[Any]) -> List[Any]:
+        if not self._is_loaded:
+            raise RuntimeError("Model is not loaded. Call load_model() first.")
+
+        # «завтра» и время по умолчанию зависят от текущей даты, поэтому она входит в ключ
+        bucket = self._date_bucket()
+        texts = [normalize_text(text) if isinstance(text, str) else text for text in inputs]
+        keys = [self._key(bucket, text) if isinstance(text, str) else None for text in texts]
+        results: List[Any] = [None] * len(inputs)
+        missing: Dict[str, List[int]] = {}
+        uncacheable: List[int] = []
+
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key is None:
+                    uncacheable.append(i)
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    results[i] = entry[1]
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    missing.setdefault(key, []).append(i)
+        hits = len(inputs) - len(uncacheable) - sum(len(indexes) for indexes in missing.values())
+
+        shared_hits = 0
+        if missing and self._shared is not None:
+            found = self._shared_get(list(missing))
+            found = {key: value for key, value in found.items() if key in missing}
+            for key, value in found.items():
+                for i in missing.pop(key):
+                    results[i] = value
+                    shared_hits += 1
+            self._store(found)
+
+        computed: Dict[str, Any] = {}
+        # одинаковые фразы внутри батча считаем один раз
+        pending = [indexes[0] for indexes in missing.values()] + uncacheable
+        if pending:
+            outputs = self._model.predict_batch([texts[i] for i in pending])
+            for i, output in zip(pending, outputs):
+                results[i] = output
+                if keys[i] is not None:
+                    computed[keys[i]] = output
+            for key, indexes in missing.items():
+                for i in indexes[1:]:
+                    results[i] = computed[key]
+
+        # дата сменилась во время predict — ответы могли посчитаться уже для нового дня
+        if computed and self._date_bucket() == bucket:
+            self._store(computed)
+            if self._shared is not None:
+                self._shared_set(computed)
+
+        self._count("hits", hits)
+        self._count("shared_hits", shared_hits)
+        self._count("misses", len(inputs) - hits - shared_hits)
+        return results
+
+    def save_model(self, path: str) -> None:
+        self._model.save_model(path)
+
+    def get_confidence_threshold(self) -> float:
+        return self._model.get_confidence_threshold()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _date_bucket(self) -> str:
+        return datetime.now().date().isoformat()
+
+    def _key(self, bucket: str, text: str) -> str:
+        return f"{self.get_model_type()}:{bucket}:{text}"
+
+    def _store(self, values: Dict[str, Any]) -> None:
+        if not values or self._max_size <= 0:
+            return
+        expires_at = time.monotonic() + self._ttl_seconds
+        evicted = 0
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                evicted += 1
+        self._count("evictions", evicted)
+
+    def _shared_get(self, keys: List[str]) -> Dict[str, Any]:
+        # общий уровень — только ускорение: его ошибка превращается в промах, а не в ошибку задачи
+        try:
+            return self._shared.get_many(keys)
+        except Exception as e:
+            print(f"Error reading shared prediction cache: {e}")
+            return {}
+
+    def _shared_set(self, values: Dict[str, Any]) -> None:
+        try:
+            self._shared.set_many(values, self._ttl_seconds)
+        except Exception as e:
+            print(f"Error writing shared prediction cache: {e}")
+
+    def _count(self, name: str, value: float) -> None:
+        if self._metrics is not None and value:
+            self._metrics.inc(f"{self._metrics_prefix}_{name}", value)
+
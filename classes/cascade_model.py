@@ -0,0 +1,135 @@
+from typing import Any, Dict, List, Optional
+import threading
+import time
+
+from .ml_model import MLModel
+
+
+class CascadeModel(MLModel):
+    """Дешёвая стадия отвечает первой, результаты с уверенностью ниже порога уходят следующей"""
+
+    def __init__(
+        self,
+        stages: List[MLModel],
+        confidence_threshold: Optional[float] = None,
+        metrics: Any = None,
+        metrics_prefix: str = "cascade",
+    ):
+        if not stages:
+            raise ValueError("Cascade needs at least one stage")
+        super().__init__("cascade", stages[0].get_model_type())
+        self._stages: List[MLModel] = stages
+        # по умолчанию — порог первой стадии (TextToCommandModel.set_confidence_threshold)
+        if confidence_threshold is None:
+            confidence_threshold = stages[0].get_confidence_threshold()
+        self._confidence_threshold: float = confidence_threshold
+        # объект с inc(name, value), например app.core.metrics.counters
+        self._metrics = metrics
+        self._metrics_prefix = metrics_prefix
+        self._lock = threading.Lock()
+        self._predictions = 0
+        self._escalations = 0
+        self._stage_calls = [0] * len(stages)
+        self._stage_seconds = [0.0] * len(stages)
+
+    def load_model(self) -> None:
+        for stage in self._stages:
+            if not stage.is_loaded():
+                stage.load_model()
+        self._is_loaded = True
+
+    def predict(self, input_data: Any) -> Any:
+        return self.predict_batch([input_data])[0]
+
+    def predict_batch(self, inputs: List[Any]) -> List[Any]:
+        if not self._is_loaded:
+            raise RuntimeError("Model is not loaded. Call load_model() first.")
+
+        results: List[Any] = [None] * len(inputs)
+        # самый уверенный ответ по всем стадиям — на случай, если порог не прошла ни одна
+        best: List[Any] = [None] * len(inputs)
+        pending = list(range(len(inputs)))
+        for level, stage in enumerate(self._stages):
+            started = time.perf_counter()
+            outputs = stage.predict_batch([inputs[i] for i in pending])
+            self._record_stage(level, len(pending), time.perf_counter() - started)
+
+            last = level == len(self._stages) - 1
+            escalate = []
+            for i, output in zip(pending, outputs):
+                if best[i] is None or self._confidence(output) > self._confidence(best[i]):
+                    best[i] = output
+                if self._confidence(output) >= self._confidence_threshold:
+                    results[i] = output
+                elif not last:
+                    escalate.append(i)
+                else:
+                    results[i] = self._unconfident(best[i])
+            if level == 0:
+                self._record_escalations(len(inputs), len(escalate))
+            if not escalate:
+                break
+            pending = escalate
+        return results
+
+    def save_model(self, path: str) -> None:
+        for stage in self._stages:
+            stage.save_model(path)
+
+    def get_confidence_threshold(self) -> float:
+        return self._confidence_threshold
+
+    def set_confidence_threshold(self, threshold: float) -> None:
+        if 0.0 <= threshold <= 1.0:
+            self._confidence_threshold = threshold
+        else:
+            raise ValueError("Confidence threshold must be between 0.0 and 1.0")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "predictions": self._predictions,
+                "escalations": self._escalations,
+                "escalation_rate": self._escalations / self._predictions if self._predictions else 0.0,
+                "stages": [
+                    {
+                        "model_type": stage.get_model_type(),
+                        "calls": calls,
+                        "avg_latency_ms": seconds / calls * 1000 if calls else 0.0,
+                    }
+                    for stage, calls, seconds in zip(self._stages, self._stage_calls, self._stage_seconds)
+                ],
+            }
+
+    def _unconfident(self, output: Any) -> Any:
+        # неуверенный ответ последней стадии не должен становиться командой (например,
+        # событием в календаре): отдаём unknown, а лучшую догадку — отдельным полем
+        if not isinstance(output, dict) or "command_type" not in output:
+            return output
+        return {
+            "command_type": "unknown",
+            "parameters": {},
+            "confidence": self._confidence(output),
+            "best_guess": output["command_type"],
+        }
+
+    def _confidence(self, output: Any) -> float:
+        if isinstance(output, dict):
+            return output.get("confidence") or 0.0
+        return 0.0
+
+    def _record_stage(self, level: int, calls: int, seconds: float) -> None:
+        with self._lock:
+            self._stage_calls[level] += calls
+            self._stage_seconds[level] += seconds
+        if self._metrics is not None:
+            self._metrics.inc(f"{self._metrics_prefix}_stage{level}_calls", calls)
+            self._metrics.inc(f"{self._metrics_prefix}_stage{level}_seconds", seconds)
+
+    def _record_escalations(self, predictions: int, escalations: int) -> None:
+        with self._lock:
+            self._predictions += predictions
+            self._escalations += escalations
+        if self._metrics is not None:
+            self._metrics.inc(f"{self._metrics_prefix}_predictions", predictions)
+            self._metrics.inc(f"{self._metrics_prefix}_escalations", escalations)
@@ -0,0 +1,197 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import re
+import zipfile
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from .ml_model import MLModel
+from .text_to_command_model import TextToCommandModel
+
+WORD_PATTERN = re.compile(r"\w+")
+CHAR_NGRAMS = (3, 4)
+
+
+def read_jsonl(path: str) -> Tuple[List[str], List[str]]:
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                texts.append(record["text"])
+                labels.append(record["label"])
+    return texts, labels
+
+
+def _mmap_npz_member(path: str, name: str) -> np.ndarray:
+    # np.load не отображает члены .npz в память, поэтому ищем смещение .npy внутри
+    # несжатого архива и отдаём np.memmap: страницы весов общие для всех процессов воркера
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{path}: {name} is compressed and cannot be memory-mapped")
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_length = int.from_bytes(local_header[26:28], "little")
+        extra_length = int.from_bytes(local_header[28:30], "little")
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        if np.lib.format.read_magic(f) == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape,
+                     order="F" if fortran_order else "C")
+
+
+class IntentClassifierModel(MLModel):
+    """Хэшированные признаки слов и символьных n-грамм плюс линейный softmax-классификатор на NumPy"""
+
+    def __init__(self, model_path: str, n_features: int = 2 ** 16):
+        super().__init__(model_path, "text_to_command")
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self._n_features = n_features
+        self._labels: List[str] = []
+        self._weights: Optional[np.ndarray] = None
+        self._bias: Optional[np.ndarray] = None
+        # параметры события (название, дата, время) достаём теми же правилами, что и раньше
+        self._rules = TextToCommandModel(model_path="rules")
+
+    def load_model(self) -> None:
+        with np.load(self._model_path, allow_pickle=False) as archive:
+            self._labels = [str(label) for label in archive["labels"]]
+            self._bias = np.array(archive["bias"], dtype=np.float32)
+            self._n_features = int(archive["n_features"])
+        self._weights = _mmap_npz_member(self._model_path, "weights")
+        self._rules.load_model()
+        self._is_loaded = True
+
+    def save_model(self, path: str) -> None:
+        if self._weights is None:
+            raise RuntimeError("Model is not trained")
+        # savez без сжатия: только так веса можно отобразить в память при загрузке
+        np.savez(
+            path,
+            weights=np.asarray(self._weights, dtype=np.float16),
+            bias=self._bias,
+            labels=np.array(self._labels),
+            n_features=np.array(self._n_features),
+        )
+
+    def train(
+        self,
+        texts: List[str],
+        labels: List[str],
+        epochs: int = 30,
+        learning_rate: float = 10.0,
+        l2: float = 1e-5,
+        batch_size: int = 32,
+        seed: int = 0,
+    ) -> None:
+        self._labels = sorted(set(labels))
+        targets = np.array([self._labels.index(label) for label in labels])
+        n_classes = len(self._labels)
+        weights = np.zeros((self._n_features, n_classes), dtype=np.float32)
+        bias = np.zeros(n_classes, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(texts))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                rows, indices, values = self._features([texts[i] for i in batch])
+                probs = self._softmax(self._scores(weights, bias, rows, indices, values, len(batch)))
+                probs[np.arange(len(batch)), targets[batch]] -= 1.0
+                probs /= len(batch)
+                # градиент только по признакам, встретившимся в пачке
+                gradient = values[:, None] * probs[rows]
+                np.add.at(weights, indices, -learning_rate * gradient)
+                weights[indices] *= 1.0 - learning_rate * l2
+                bias -= learning_rate * probs.sum(axis=0)
+
+        self._weights = weights
+        self._bias = bias
+        # обученную модель можно сразу использовать и сохранять
+        self._rules.load_model()
+        self._is_loaded = True
+
+    def predict(self, text: str) -> Dict[str, Any]:
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, inputs: List[str]) -> List[Dict[str, Any]]:
+        if not self._is_loaded:
+            raise RuntimeError("Model is not loaded. Call load_model() first.")
+        if not inputs:
+            return []
+
+        rows, indices, values = self._features(inputs)
+        probs = self._softmax(self._scores(self._weights, self._bias, rows, indices, values, len(inputs)))
+        best = probs.argmax(axis=1)
+        confidence = probs[np.arange(len(inputs)), best]
+
+        today = datetime.now().date()
+        results = []
+        for text, label, score in zip(inputs, best, confidence):
+            command_type = self._labels[label]
+            parameters: Dict[str, Any] = {}
+            if command_type == "create_event":
+                parameters = self._rules.extract_event_parameters(text, today)
+            results.append({
+                "command_type": command_type,
+                "parameters": parameters,
+                "confidence": round(float(score), 4),
+            })
+        return results
+
+    def get_labels(self) -> List[str]:
+        return list(self._labels)
+
+    def _tokens(self, text: str) -> List[str]:
+        tokens = []
+        for word in WORD_PATTERN.findall(text.lower()):
+            tokens.append(word)
+            padded = f"<{word}>"
+            for n in CHAR_NGRAMS:
+                tokens.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return tokens
+
+    def _features(self, texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # разреженная матрица в координатном виде: строка, хэш признака, знак / sqrt(числа признаков)
+        rows: List[int] = []
+        hashes: List[int] = []
+        scales: List[float] = []
+        for row, text in enumerate(texts):
+            tokens = self._tokens(text)
+            if not tokens:
+                continue
+            hashes.extend(zlib.crc32(token.encode("utf-8")) for token in tokens)
+            rows.extend([row] * len(tokens))
+            scales.extend([1.0 / len(tokens) ** 0.5] * len(tokens))
+
+        hashed = np.array(hashes, dtype=np.uint32)
+        # старший бит хэша — знак признака: коллизии скорее гасят друг друга, чем складываются
+        signs = np.where(hashed >> 31, -1.0, 1.0).astype(np.float32)
+        indices = (hashed & np.uint32(self._n_features - 1)).astype(np.intp)
+        return np.array(rows, dtype=np.intp), indices, signs * np.array(scales, dtype=np.float32)
+
+    @staticmethod
+    def _scores(
+        weights: np.ndarray,
+        bias: np.ndarray,
+        rows: np.ndarray,
+        indices: np.ndarray,
+        values: np.ndarray,
+        n_rows: int,
+    ) -> np.ndarray:
+        scores = np.zeros((n_rows, len(bias)), dtype=np.float32)
+        np.add.at(scores, rows, np.asarray(weights[indices], dtype=np.float32) * values[:, None])
+        return scores + bias
+
+    @staticmethod
+    def _softmax(scores: np.ndarray) -> np.ndarray:
+        exp = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, List
 
 
 class MLModel(ABC):
@@ -20,6 +20,10 @@ class MLModel(ABC):
     def predict(self, input_data: Any) -> Any:
         pass
     
+    def predict_batch(self, inputs: List[Any]) -> List[Any]:
+        # наивная реализация; модели, которые умеют считать пачкой, переопределяют её
+        return [self.predict(input_data) for input_data in inputs]
+
     @abstractmethod
     def save_model(self, path: str) -> None:
         pass
@@ -1,4 +1,4 @@
-from typing import List, Any
+from typing import Dict, List, Any
 from datetime import datetime
 from .service import Service
 from .speech_to_text_model import SpeechToTextModel
@@ -88,6 +88,26 @@ class MLService(Service):
             task.set_status("failed")
             raise ValueError(f"Unknown task type: {task.get_task_type()}")
     
+    def process_tasks(self, tasks: List[MLTask]) -> List[Any]:
+        # задачи одного типа считаются одной пачкой через predict_batch модели
+        models = {
+            "speech_to_text": self._speech_to_text_model,
+            "text_to_command": self._text_to_command_model,
+        }
+        by_type: Dict[str, List[MLTask]] = {}
+        for task in tasks:
+            if task.get_task_type() not in models:
+                task.set_status("failed")
+                raise ValueError(f"Unknown task type: {task.get_task_type()}")
+            by_type.setdefault(task.get_task_type(), []).append(task)
+
+        for task_type, typed_tasks in by_type.items():
+            outputs = models[task_type].predict_batch([task._input_data for task in typed_tasks])
+            for task, output in zip(typed_tasks, outputs):
+                task._output_data = output
+                task.set_status("completed")
+        return [task._output_data for task in tasks]
+
     def get_history(self) -> PredictionHistory:
         return self._history
     
@@ -96,13 +116,17 @@ class MLService(Service):
         self._text_to_command_model.load_model()
     
     def _process_task_queue(self) -> None:
-        while self._task_queue:
-            task = self._task_queue.pop(0)
-            try:
-                self.process_task(task)
-            except Exception as e:
-                task.set_status("failed")
-                print(f"Task {task.get_task_id()} failed: {e}")
+        tasks, self._task_queue = self._task_queue, []
+        try:
+            self.process_tasks(tasks)
+        except Exception:
+            # пачка не посчиталась — досчитываем по одной, чтобы найти битую задачу
+            for task in tasks:
+                try:
+                    self.process_task(task)
+                except Exception as e:
+                    task.set_status("failed")
+                    print(f"Task {task.get_task_id()} failed: {e}")
     
     def _create_command_from_data(self, command_data: dict, user_id: str) -> Command:
         command_type = command_data.get("command_type")
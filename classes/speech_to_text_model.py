@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, List, Union
 
 import librosa
 import numpy as np
@@ -17,11 +17,13 @@ class SpeechToTextModel(MLModel):
         model_path: str = "bond005/whisper-podlodka-turbo",
         language: str = "ru",
         target_sampling_rate: int = 16_000,
+        batch_size: int = 8,
     ):
         super().__init__(model_path, "speech_to_text")
         self._language: str = language
         self._accuracy: float = 0.0
         self._target_sr: int = target_sampling_rate
+        self._batch_size: int = batch_size
 
     def load_model(self) -> None:
         self._model = pipeline(
@@ -47,6 +49,25 @@ class SpeechToTextModel(MLModel):
             text = text.strip()
         return text
 
+    def predict_batch(self, inputs: List[Union[str, Path, ArrayLike]]) -> List[str]:
+        if not self._is_loaded:
+            self.load_model()
+
+        # пачка уходит в pipeline целиком: он сам собирает из неё батчи по batch_size
+        results = self._model(
+            [self._to_mono_array(audio) for audio in inputs],
+            batch_size=self._batch_size,
+            generate_kwargs={"task": "transcribe", "language": self._language},
+            return_timestamps=False,
+        )
+        texts = []
+        for result in results:
+            text = result["text"]
+            if isinstance(text, str):
+                text = text.strip()
+            texts.append(text)
+        return texts
+
     def save_model(self, path: str) -> None:
         pass
 
@@ -1,8 +1,20 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from .ml_model import MLModel
 
+# ключевые слова интентов в порядке приоритета: побеждает первое правило с совпадением
+INTENT_RULES = (
+    ("create_event", ("создай", "добавь", "запланируй", "create", "add"), 0.9),
+    ("delete_event", ("удали", "убери", "отмени", "delete", "remove"), 0.85),
+    ("update_event", ("измени", "обнови", "update", "change"), 0.8),
+    ("list_events", ("покажи", "список", "события", "show", "list"), 0.9),
+)
+# слова даты проверяются по порядку; "послезавтра" содержит "завтра" и сейчас тоже даёт +1 день
+DATE_WORDS = (("завтра", 1), ("послезавтра", 2))
+DEFAULT_HOUR = 9
+EVENT_DURATION = timedelta(hours=1)
+
 
 class TextToCommandModel(MLModel):
     def __init__(self, model_path: str):
@@ -17,6 +29,7 @@ class TextToCommandModel(MLModel):
     
     def load_model(self) -> None:
         self._model = "loaded_command_model"
+        self._compile_matcher()
         self._is_loaded = True
         print("TextToCommandModel loaded")
     
@@ -32,79 +45,101 @@ class TextToCommandModel(MLModel):
             "confidence": command_data.get("confidence", 0.9)
         }
     
+    def predict_batch(self, inputs: List[str]) -> List[Dict[str, Any]]:
+        if not self._is_loaded:
+            raise RuntimeError("Model is not loaded. Call load_model() first.")
+
+        # правила и шаблоны уже скомпилированы, а текущая дата одна на всю пачку
+        today = datetime.now().date()
+        results = []
+        for text in inputs:
+            command_data = self._parse_command(text, today)
+            results.append({
+                "command_type": command_data.get("command_type"),
+                "parameters": command_data.get("parameters", {}),
+                "confidence": command_data.get("confidence", 0.9)
+            })
+        return results
+
+    def extract_event_parameters(self, text: str, today: Optional[date] = None) -> Dict[str, Any]:
+        # название, дата и время события — для моделей, которые определяют только интент
+        return self._event_parameters(text, text.lower(), today or datetime.now().date())
+
     def save_model(self, path: str) -> None:
         print(f"TextToCommandModel saved to {path}")
     
     def get_supported_commands(self) -> List[str]:
         return self._command_types.copy()
     
+    def get_confidence_threshold(self) -> float:
+        return self._confidence_threshold
+
     def set_confidence_threshold(self, threshold: float) -> None:
         if 0.0 <= threshold <= 1.0:
             self._confidence_threshold = threshold
         else:
             raise ValueError("Confidence threshold must be between 0.0 and 1.0")
     
-    def _parse_command(self, text: str) -> Dict[str, Any]:
-        text_lower = text.lower()
-
-        if any(word in text_lower for word in ["создай", "добавь", "запланируй", "create", "add"]):
-            params: Dict[str, Any] = {}
+    def _compile_matcher(self) -> None:
+        self._intent_rules = tuple(
+            (command_type, tuple(keywords), confidence)
+            for command_type, keywords, confidence in INTENT_RULES
+        )
+        self._title_pattern = re.compile(r"[\"“](.+?)[\"”]")
+        self._time_pattern = re.compile(r"(\d{1,2})[:.](\d{2})")
 
-            title_match = re.search(r"[\"“](.+?)[\"”]", text)
-            if title_match:
-                params["title"] = title_match.group(1).strip()
-            else:
-                params["title"] = text
-
-            now = datetime.now()
-            date = now.date()
-
-            if "завтра" in text_lower:
-                date = now.date() + timedelta(days=1)
-            elif "послезавтра" in text_lower:
-                date = now.date() + timedelta(days=2)
-
-            time_match = re.search(r"(\d{1,2})[:.](\d{2})", text_lower)
-            hour = 9
-            minute = 0
-            if time_match:
-                hour = int(time_match.group(1))
-                minute = int(time_match.group(2))
-
-            start_dt = datetime.combine(date, datetime.min.time()).replace(
-                hour=hour, minute=minute, second=0, microsecond=0
-            )
-            end_dt = start_dt + timedelta(hours=1)
-
-            params["start_time"] = start_dt.isoformat()
-            params["end_time"] = end_dt.isoformat()
+    def _parse_command(self, text: str, today: Optional[date] = None) -> Dict[str, Any]:
+        text_lower = text.lower()
 
+        for command_type, keywords, confidence in self._intent_rules:
+            if any(word in text_lower for word in keywords):
+                break
+        else:
             return {
-                "command_type": "create_event",
-                "parameters": params,
-                "confidence": 0.9
-            }
-        elif any(word in text_lower for word in ["удали", "убери", "отмени", "delete", "remove"]):
-            return {
-                "command_type": "delete_event",
-                "parameters": {},
-                "confidence": 0.85
-            }
-        elif any(word in text_lower for word in ["измени", "обнови", "update", "change"]):
-            return {
-                "command_type": "update_event",
+                "command_type": "unknown",
                 "parameters": {},
-                "confidence": 0.8
+                "confidence": 0.0
             }
-        elif any(word in text_lower for word in ["покажи", "список", "события", "show", "list"]):
+
+        if command_type != "create_event":
             return {
-                "command_type": "list_events",
+                "command_type": command_type,
                 "parameters": {},
-                "confidence": 0.9
+                "confidence": confidence
             }
-        
+
         return {
-            "command_type": "unknown",
-            "parameters": {},
-            "confidence": 0.0
+            "command_type": command_type,
+            "parameters": self._event_parameters(text, text_lower, today or datetime.now().date()),
+            "confidence": confidence
         }
+
+    def _event_parameters(self, text: str, text_lower: str, today: date) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+
+        # регулярные выражения запускаем, только если в тексте есть кавычки и разделитель времени
+        title_match = None
+        if '"' in text or "“" in text:
+            title_match = self._title_pattern.search(text)
+        if title_match:
+            params["title"] = title_match.group(1).strip()
+        else:
+            params["title"] = text
+
+        event_date = today
+        for word, days in DATE_WORDS:
+            if word in text_lower:
+                event_date += timedelta(days=days)
+                break
+
+        hour, minute = DEFAULT_HOUR, 0
+        if ":" in text_lower or "." in text_lower:
+            time_match = self._time_pattern.search(text_lower)
+            if time_match:
+                hour = int(time_match.group(1))
+                minute = int(time_match.group(2))
+
+        start_dt = datetime(event_date.year, event_date.month, event_date.day, hour, minute)
+        params["start_time"] = start_dt.isoformat()
+        params["end_time"] = (start_dt + EVENT_DURATION).isoformat()
+        return params
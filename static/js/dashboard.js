@@ -24,6 +24,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     await loadBalance();
     await loadPredictions();
     await loadTransactions();
+    connectEvents();
 
     const predictionForm = document.getElementById('predictionForm');
     predictionForm.addEventListener('submit', handlePrediction);
@@ -59,6 +60,61 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 });
 
+let eventSource = null;
+const pendingReloads = new Set();
+let reloadTimer = null;
+
+function scheduleReload(...kinds) {
+    // несколько событий подряд (например, пачка предсказаний) — одна перезагрузка списка
+    kinds.forEach((kind) => pendingReloads.add(kind));
+    if (reloadTimer) {
+        return;
+    }
+    reloadTimer = setTimeout(async () => {
+        reloadTimer = null;
+        const kinds = new Set(pendingReloads);
+        pendingReloads.clear();
+        if (kinds.has('balance')) await loadBalance();
+        if (kinds.has('predictions')) await loadPredictions();
+        if (kinds.has('transactions')) await loadTransactions();
+    }, 100);
+}
+
+function streamConnected() {
+    return eventSource !== null && eventSource.readyState === EventSource.OPEN;
+}
+
+function connectEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    // EventSource не передаёт заголовки, токен идёт в query
+    eventSource = new EventSource(`${API_BASE_URL}/users/me/events/stream?token=${encodeURIComponent(getToken())}`);
+
+    eventSource.addEventListener('open', () => {
+        // после переподключения могли пропустить события — перечитываем всё
+        scheduleReload('balance', 'predictions', 'transactions');
+    });
+    eventSource.addEventListener('transaction', (e) => {
+        const event = JSON.parse(e.data);
+        if (typeof event.balance === 'number') {
+            document.getElementById('balanceAmount').textContent = event.balance.toFixed(2);
+        }
+        scheduleReload('transactions');
+    });
+    eventSource.addEventListener('prediction', (e) => {
+        const event = JSON.parse(e.data);
+        scheduleReload('predictions');
+        if (event.status === 'expired') {
+            // просроченные задачи возвращают деньги
+            scheduleReload('balance', 'transactions');
+        }
+    });
+    eventSource.addEventListener('resync', () => {
+        scheduleReload('balance', 'predictions', 'transactions');
+    });
+}
+
 async function loadBalance() {
     try {
         const response = await apiRequest('/users/me/balance');
@@ -81,8 +137,12 @@ async function loadPredictions() {
         }
 
         predictionsList.innerHTML = predictions.map(prediction => {
-            const status = prediction.output_data ? 'completed' : 'pending';
-            const statusText = prediction.output_data ? 'Завершено' : 'Обработка';
+            const status = prediction.status || (prediction.output_data ? 'completed' : 'pending');
+            const statusText = {
+                completed: 'Завершено',
+                failed: 'Ошибка',
+                expired: 'Просрочено, средства возвращены',
+            }[status] || 'Обработка';
             const confidence = prediction.confidence ? ` (уверенность: ${(prediction.confidence * 100).toFixed(1)}%)` : '';
             
             let outputData = '';
@@ -96,6 +156,8 @@ async function loadPredictions() {
                 } catch (e) {
                     outputData = `<p><strong>Результат:</strong> ${prediction.output_data}</p>`;
                 }
+            } else if (prediction.error) {
+                outputData = `<p><strong>Ошибка:</strong> ${prediction.error}</p>`;
             }
 
             const date = new Date(prediction.created_at).toLocaleString('ru-RU');
@@ -155,6 +217,17 @@ async function loadTransactions() {
     }
 }
 
+async function waitForPrediction(id) {
+    // сервер держит запрос, пока воркер не сообщит о результате, — без опроса каждые 10 с
+    for (let attempt = 0; attempt < 4; attempt++) {
+        const prediction = await apiRequest(`/predictions/${id}?wait=25s`);
+        if (prediction.status !== 'pending') {
+            return prediction;
+        }
+    }
+    return null;
+}
+
 async function handlePrediction(e) {
     e.preventDefault();
     const errorDiv = document.getElementById('predictionError');
@@ -175,11 +248,25 @@ async function handlePrediction(e) {
         });
 
         document.getElementById('predictionText').value = '';
+        if (streamConnected()) {
+            // списание и готовый результат придут событиями из потока
+            return;
+        }
         await loadBalance();
         await loadPredictions();
         await loadTransactions();
-        
-        alert('Запрос отправлен на обработку!');
+
+        if (response.status === 'pending') {
+            const prediction = await waitForPrediction(response.id);
+            if (prediction) {
+                await loadPredictions();
+                if (prediction.status !== 'completed') {
+                    // просроченные задачи возвращают деньги
+                    await loadBalance();
+                    await loadTransactions();
+                }
+            }
+        }
     } catch (error) {
         errorDiv.textContent = error.message || 'Ошибка при отправке запроса';
         errorDiv.style.display = 'block';
@@ -208,8 +295,10 @@ async function handleDeposit(e) {
 
         document.getElementById('depositModal').style.display = 'none';
         document.getElementById('depositForm').reset();
-        await loadBalance();
-        await loadTransactions();
+        if (!streamConnected()) {
+            await loadBalance();
+            await loadTransactions();
+        }
         alert('Баланс успешно пополнен!');
     } catch (error) {
         errorDiv.textContent = error.message || 'Ошибка при пополнении баланса';
@@ -218,6 +307,10 @@ async function handleDeposit(e) {
 }
 
 setInterval(async () => {
+    // запасной вариант для браузеров без EventSource или пока поток переподключается
+    if (streamConnected()) {
+        return;
+    }
     await loadBalance();
     await loadPredictions();
 }, 10000);
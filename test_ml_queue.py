@@ -61,8 +61,14 @@ def test_ml_queue():
         else:
             print(f"   ✗ Ошибка: {predict_response.text}")
     
-    print("\n4. Ожидание обработки задач воркерами (10 секунд)...")
-    time.sleep(10)
+    print("\n4. Ожидание обработки задач воркерами...")
+    for prediction_id in prediction_ids:
+        started = time.time()
+        result = requests.get(
+            f"{BASE_URL}/predictions/{prediction_id}?wait=10s",
+            headers=headers,
+        ).json()
+        print(f"   ✓ {prediction_id}: {result['status']} за {time.time() - started:.2f} с")
     
     print("\n5. Проверка результатов...")
     predictions_response = requests.get(
@@ -1,13 +1,21 @@
 import os
+import uuid
+from types import SimpleNamespace
 
 import pytest
 from fastapi.testclient import TestClient
 
 os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
 os.environ.setdefault("SECRET_KEY", "test-secret-key")
+# тесты API публикуют задачи напрямую и подменяют publisher; outbox проверяется отдельно
+os.environ.setdefault("TASK_PUBLISH_MODE", "direct")
 
 from app.main import app  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
 from app.db.base import Base, engine, SessionLocal, get_db  # noqa: E402
+from app.models.user import UserDB  # noqa: E402
+from app.rabbitmq.circuit_breaker import CircuitBreaker  # noqa: E402
+from app.rabbitmq.publisher import publisher  # noqa: E402
 
 
 Base.metadata.drop_all(bind=engine)
@@ -31,3 +39,30 @@ def client():
         yield c
 
 
+@pytest.fixture
+def make_user():
+    # пользователь с токеном в обход /auth/register: make_user(balance).id / .headers
+    def make(balance=50.0):
+        user_id = str(uuid.uuid4())
+        session = SessionLocal()
+        try:
+            session.add(UserDB(
+                id=user_id,
+                name="Test User",
+                email=f"{user_id}@example.com",
+                hashed_password="dummy",
+                balance=balance,
+            ))
+            session.commit()
+        finally:
+            session.close()
+        token = create_access_token({"sub": user_id})
+        return SimpleNamespace(id=user_id, headers={"Authorization": f"Bearer {token}"})
+
+    return make
+
+
+@pytest.fixture(autouse=True)
+def fresh_broker_breaker(monkeypatch):
+    # брокера в тестах нет: неудачные вызовы одного теста не должны размыкать цепь для следующих
+    monkeypatch.setattr(publisher, "breaker", CircuitBreaker("broker"))
@@ -0,0 +1,94 @@
+import pytest
+
+from app.core.config import settings
+from app.core.metrics import Counters, cascade_summary
+from app.workers import ml_worker
+from classes import CascadeModel, MLModel, TextToCommandModel
+
+
+class LocalClassifier(MLModel):
+    # тяжёлая стадия в тестах: узнаёт то, чего нет в правилах
+    def __init__(self):
+        super().__init__("local", "text_to_command")
+        self.seen = []
+
+    def load_model(self) -> None:
+        self._is_loaded = True
+
+    def predict(self, text):
+        self.seen.append(text)
+        if "встреч" in text.lower():
+            return {"command_type": "create_event", "parameters": {"title": text}, "confidence": 0.75}
+        if "билет" in text.lower():
+            return {"command_type": "create_event", "parameters": {"title": text}, "confidence": 0.43}
+        return {"command_type": "unknown", "parameters": {}, "confidence": 0.1}
+
+    def save_model(self, path: str) -> None:
+        pass
+
+
+def make_cascade(metrics=None):
+    classifier = LocalClassifier()
+    cascade = CascadeModel([TextToCommandModel(model_path="dummy_path"), classifier], metrics=metrics)
+    cascade.load_model()
+    return cascade, classifier
+
+
+def test_only_low_confidence_results_are_escalated():
+    cascade, classifier = make_cascade()
+
+    results = cascade.predict_batch(["Покажи список событий", "Назначь встречу с Анной", "Удали событие"])
+
+    assert [r["command_type"] for r in results] == ["list_events", "create_event", "delete_event"]
+    assert classifier.seen == ["Назначь встречу с Анной"]
+
+
+def test_unconfident_last_stage_becomes_unknown():
+    cascade, _ = make_cascade()
+
+    result = cascade.predict("Купи билеты на завтра")
+
+    # догадку ниже порога не превращаем в событие календаря
+    assert result == {"command_type": "unknown", "parameters": {}, "confidence": 0.43, "best_guess": "create_event"}
+
+
+def test_stats_report_escalation_rate_and_stage_latency():
+    metrics = Counters()
+    cascade, _ = make_cascade(metrics)
+
+    cascade.predict_batch(["Покажи список событий", "Назначь встречу", "Удали событие", "Привет"])
+    cascade.predict("Обнови встречу")
+
+    stats = cascade.stats()
+    assert stats["predictions"] == 5
+    assert stats["escalations"] == 2
+    assert stats["escalation_rate"] == pytest.approx(0.4)
+    assert [stage["calls"] for stage in stats["stages"]] == [5, 2]
+    assert all(stage["avg_latency_ms"] > 0 for stage in stats["stages"])
+
+    summary = cascade_summary(metrics.snapshot())
+    assert summary["cascade_escalation_rate"] == pytest.approx(0.4)
+    assert summary["cascade_stage1_avg_ms"] > 0
+
+
+def test_threshold_comes_from_the_rule_model():
+    rules = TextToCommandModel(model_path="dummy_path")
+    rules.set_confidence_threshold(0.95)
+    cascade = CascadeModel([rules, LocalClassifier()])
+    cascade.load_model()
+
+    # правила уверены в "Удали" на 0.85 — при пороге 0.95 этого мало
+    cascade.predict("Удали событие")
+
+    assert cascade.stats()["escalations"] == 1
+
+
+def test_worker_wraps_rules_in_cascade_when_escalation_model_is_set(monkeypatch):
+    monkeypatch.setitem(ml_worker.ESCALATION_FACTORIES, "local", LocalClassifier)
+    monkeypatch.setattr(settings, "ML_WORKER_ESCALATION_MODEL", "local")
+    monkeypatch.setattr(settings, "PREDICTION_CACHE_SIZE", 0)
+
+    model = ml_worker.MODEL_FACTORIES["text_to_command"]()
+
+    assert isinstance(model, CascadeModel)
+    assert model.get_confidence_threshold() == settings.ML_CASCADE_CONFIDENCE_THRESHOLD
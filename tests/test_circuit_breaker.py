@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.rabbitmq.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from app.rabbitmq.publisher import publisher
+
+
+@pytest.fixture
+def open_breaker(monkeypatch):
+    breaker = CircuitBreaker("broker", failure_threshold=1, reset_timeout_ms=60000)
+    breaker.record_failure()
+    monkeypatch.setattr(publisher, "breaker", breaker)
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout_ms=60000)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_half_open_probe_closes_or_reopens_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout_ms=20)
+    breaker.record_failure()
+    time.sleep(0.03)
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    time.sleep(0.03)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_open_circuit_rejects_prediction_before_charging(client, monkeypatch, open_breaker, make_user):
+    def broker_call(*args):
+        raise AssertionError("open circuit must not touch the broker")
+
+    monkeypatch.setattr(publisher, "publish_task", broker_call)
+    monkeypatch.setattr(publisher, "queue_depth", broker_call)
+    headers = make_user().headers
+
+    r = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"})
+
+    assert r.status_code == 503
+    assert int(r.headers["Retry-After"]) >= 1
+    assert client.get("/users/me/balance", headers=headers).json()["balance"] == 50.0
+    assert client.get("/users/me/predictions", headers=headers).json() == []
+
+
+def test_open_circuit_does_not_block_hybrid_inline_answers(client, monkeypatch, open_breaker, make_user):
+    def broker_call(*args):
+        raise AssertionError("inline answer must not publish")
+
+    monkeypatch.setattr(settings, "PREDICTION_EXECUTION_MODE", "hybrid")
+    monkeypatch.setattr(settings, "PREDICTION_INLINE_DEPTH_TTL_MS", 0)
+    monkeypatch.setattr(publisher, "publish_task", broker_call)
+    headers = make_user().headers
+
+    # проба глубины очереди падает с CircuitOpenError — считаем на месте
+    r = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"})
+
+    assert r.status_code == 200
+    assert r.json()["status"] == "completed"
+    assert client.get("/users/me/balance", headers=headers).json()["balance"] == 40.0
+
+
+def test_open_circuit_refunds_inline_task_that_falls_back_to_queue(client, monkeypatch, open_breaker, make_user):
+    from app.workers.inline import inline_executor
+
+    monkeypatch.setattr(settings, "PREDICTION_EXECUTION_MODE", "hybrid")
+    monkeypatch.setattr(settings, "PREDICTION_INLINE_DEPTH_TTL_MS", 0)
+    # inline не уложился в таймаут: задача уходит в очередь, а цепь разомкнута
+    monkeypatch.setattr(inline_executor, "run", lambda task: None)
+    headers = make_user().headers
+
+    r = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"})
+
+    assert r.status_code == 500
+    assert client.get("/users/me/balance", headers=headers).json()["balance"] == 50.0
+    assert [p["status"] for p in client.get("/users/me/predictions", headers=headers).json()] == ["failed"]
+
+
+def test_open_circuit_fails_publish_without_waiting(monkeypatch, open_breaker):
+    monkeypatch.setattr(settings, "BROKER_CALL_BUDGET_MS", 60000)
+
+    start = time.monotonic()
+    assert publisher.publish_tasks([{"task_id": "t", "task_type": "text_to_command"}]) is False
+    with pytest.raises(CircuitOpenError):
+        publisher.queue_depth("ml_tasks.text_to_command")
+    assert time.monotonic() - start < 0.1
+
+
+def test_health_reports_breaker_state(client, monkeypatch):
+    r = client.get("/health")
+    assert r.status_code == 200
+    assert r.json()["broker"]["state"] == CLOSED
+
+    breaker = CircuitBreaker("broker", failure_threshold=1, reset_timeout_ms=60000)
+    breaker.record_failure()
+    monkeypatch.setattr(publisher, "breaker", breaker)
+
+    r = client.get("/health")
+    assert r.status_code == 503
+    assert r.json()["broker"]["state"] == OPEN
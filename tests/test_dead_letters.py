@@ -0,0 +1,120 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import Settings
+from app.core.security import create_access_token
+from app.db.base import SessionLocal
+from app.models.user import UserDB
+from app.rabbitmq.publisher import publisher
+
+
+def admin_headers(client):
+    r = client.post(
+        "/auth/login",
+        json={"email": "admin@example.com", "password": "admin123"},
+    )
+    assert r.status_code == 200
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_admin_can_inspect_dead_letters(client, monkeypatch):
+    letters = [
+        {
+            "task_id": "task-1",
+            "prediction_id": "pred-1",
+            "user_id": "user-1",
+            "task_type": "text_to_command",
+            "attempts": 4,
+            "origin_queue": "ml_tasks.text_to_command",
+            "error": "database is unavailable",
+            "body": {"task_id": "task-1"},
+        }
+    ]
+    requested = []
+
+    def fake_get_dead_letters(limit):
+        requested.append(limit)
+        return letters
+
+    monkeypatch.setattr(publisher, "get_dead_letters", fake_get_dead_letters)
+
+    r = client.get("/admin/dead-letters?limit=10", headers=admin_headers(client))
+    assert r.status_code == 200
+    assert requested == [10]
+    body = r.json()
+    assert body[0]["task_id"] == "task-1"
+    assert body[0]["attempts"] == 4
+
+
+def test_admin_can_replay_dead_letters(client, monkeypatch):
+    monkeypatch.setattr(publisher, "replay_dead_letters", lambda limit: min(limit, 3))
+
+    r = client.post("/admin/dead-letters/replay?limit=100", headers=admin_headers(client))
+    assert r.status_code == 200
+    assert r.json() == {"replayed": 3}
+
+
+class FakeDeadLetterChannel:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.published = []
+        self.acked = []
+
+    def basic_get(self, queue):
+        if not self.messages:
+            return None, None, None
+        properties, body = self.messages.pop(0)
+        return SimpleNamespace(delivery_tag=len(self.acked) + 1), properties, body
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((routing_key, json.loads(body), properties))
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+
+def test_replayed_task_is_not_shed_by_its_old_deadline(monkeypatch):
+    task = {"task_id": "task-1", "task_type": "text_to_command", "input_data": "Удали событие", "deadline": 1.0}
+    properties = SimpleNamespace(
+        priority=9,
+        headers={"x-attempt": 4, "x-origin-queue": "ml_tasks.text_to_command", "x-deadline": 1.0},
+    )
+    channel = FakeDeadLetterChannel([(properties, json.dumps(task).encode())])
+    monkeypatch.setattr(publisher, "channel", channel)
+    monkeypatch.setattr(publisher, "_ensure_connected", lambda: None)
+
+    assert publisher.replay_dead_letters(10) == 1
+
+    (queue, body, replayed), = channel.published
+    assert queue == "ml_tasks.text_to_command"
+    assert "deadline" not in body and body["task_id"] == "task-1"
+    assert replayed.headers == {"x-origin-queue": "ml_tasks.text_to_command"}
+    assert channel.acked == [1]
+
+
+def test_retry_delays_must_fit_into_deadline():
+    with pytest.raises(ValueError):
+        Settings(ML_TASK_DEADLINE_SECONDS=60, ML_TASK_RETRY_DELAYS_MS=[1000, 10000, 60000])
+    assert Settings(ML_TASK_DEADLINE_SECONDS=60, ML_TASK_RETRY_DELAYS_MS=[1000, 5000, 20000])
+
+
+def test_dead_letters_require_admin(client):
+    session = SessionLocal()
+    try:
+        session.add(UserDB(
+            id="dead-letters-user-id",
+            name="Regular User",
+            email="dead_letters_user@example.com",
+            hashed_password="dummy",
+            role="user",
+            balance=0.0,
+        ))
+        session.commit()
+    finally:
+        session.close()
+
+    token = create_access_token({"sub": "dead-letters-user-id"})
+    r = client.get("/admin/dead-letters", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 403
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.models.prediction import PredictionDB
+from app.models.transaction import TransactionDB
+from app.models.user import UserDB
+from app.rabbitmq.publisher import publisher
+
+
+def user_state(user_id):
+    session = SessionLocal()
+    try:
+        return (
+            session.get(UserDB, user_id).balance,
+            session.query(PredictionDB).filter(PredictionDB.user_id == user_id).count(),
+            session.query(TransactionDB).filter(TransactionDB.user_id == user_id).count(),
+        )
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def published(monkeypatch):
+    monkeypatch.setattr(settings, "PREDICTION_EXECUTION_MODE", "queue")
+    tasks = []
+    lock = threading.Lock()
+
+    def publish_task(task):
+        with lock:
+            tasks.append(task)
+        return True
+
+    monkeypatch.setattr(publisher, "publish_task", publish_task)
+    return tasks
+
+
+def headers_for(user, key):
+    return {**user.headers, "Idempotency-Key": key}
+
+
+def test_retry_with_same_key_returns_original_prediction(client, published, make_user):
+    user = make_user()
+    headers = headers_for(user, "retry-1")
+
+    first = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"})
+    second = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"})
+
+    assert first.status_code == second.status_code == 200
+    assert second.json()["id"] == first.json()["id"]
+    assert len(published) == 1
+    assert user_state(user.id) == (50.0 - settings.PREDICTION_COST, 1, 1)
+
+
+def test_concurrent_requests_with_same_key_charge_once(client, published, make_user):
+    user = make_user()
+    headers = headers_for(user, "retry-concurrent")
+    barrier = threading.Barrier(8)
+    responses = []
+
+    def retry():
+        barrier.wait()
+        responses.append(client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"}))
+
+    threads = [threading.Thread(target=retry) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert [r.status_code for r in responses] == [200] * 8
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert len(published) == 1
+    assert user_state(user.id) == (50.0 - settings.PREDICTION_COST, 1, 1)
+
+
+def test_key_reused_for_another_text_is_rejected(client, published, make_user):
+    headers = headers_for(make_user(), "retry-2")
+
+    assert client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"}).status_code == 200
+    assert client.post("/predict/text", headers=headers, json={"text": "Удали событие"}).status_code == 422
+
+
+def test_keys_are_scoped_to_the_user(client, published, make_user):
+    first = client.post("/predict/text", headers=headers_for(make_user(), "shared"), json={"text": "Покажи список событий"})
+    second = client.post("/predict/text", headers=headers_for(make_user(), "shared"), json={"text": "Покажи список событий"})
+
+    assert first.json()["id"] != second.json()["id"]
+    assert len(published) == 2
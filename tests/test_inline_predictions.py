@@ -0,0 +1,102 @@
+import json
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.models.outbox import OutboxDB
+from app.rabbitmq.outbox import outbox_relay
+from app.rabbitmq.publisher import publisher
+from app.workers.inline import InlineExecutor, inline_executor
+
+
+@pytest.fixture
+def hybrid(monkeypatch):
+    monkeypatch.setattr(settings, "PREDICTION_EXECUTION_MODE", "hybrid")
+    monkeypatch.setattr(settings, "PREDICTION_INLINE_DEPTH_TTL_MS", 0)
+    published = []
+    monkeypatch.setattr(publisher, "publish_task", lambda task: published.append(task) or True)
+    return published
+
+
+def test_hybrid_mode_answers_inline_when_queue_is_shallow(client, monkeypatch, hybrid, make_user):
+    monkeypatch.setattr(publisher, "queue_depth", lambda queue: 0)
+    headers = make_user().headers
+
+    r = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert body["status"] == "completed"
+    assert json.loads(body["output_data"])["command_type"] == "list_events"
+    assert hybrid == []
+    assert client.get("/users/me/balance", headers=headers).json()["balance"] == 40.0
+
+
+def test_hybrid_mode_falls_back_to_queue_under_load(client, monkeypatch, hybrid, make_user):
+    monkeypatch.setattr(
+        publisher, "queue_depth", lambda queue: settings.PREDICTION_INLINE_MAX_QUEUE_DEPTH + 1
+    )
+
+    r = client.post("/predict/text", headers=make_user().headers, json={"text": "Покажи список событий"})
+
+    assert r.status_code == 200
+    assert r.json()["status"] == "pending"
+    assert r.json()["output_data"] is None
+    assert [task["input_data"] for task in hybrid] == ["Покажи список событий"]
+
+
+def outbox_row(prediction_id):
+    session = SessionLocal()
+    try:
+        rows = session.query(OutboxDB).all()
+        return next(row for row in rows if json.loads(row.payload)["prediction_id"] == prediction_id)
+    finally:
+        session.close()
+
+
+def test_inline_answer_settles_outbox_row_written_with_the_charge(client, monkeypatch, hybrid, make_user):
+    monkeypatch.setattr(settings, "TASK_PUBLISH_MODE", "outbox")
+    monkeypatch.setattr(outbox_relay, "notify", lambda: None)
+    monkeypatch.setattr(publisher, "queue_depth", lambda queue: 0)
+
+    r = client.post("/predict/text", headers=make_user().headers, json={"text": "Покажи список событий"})
+
+    assert r.json()["status"] == "completed"
+    assert outbox_row(r.json()["id"]).sent_at is not None
+
+
+def test_inline_fallback_leaves_outbox_row_for_the_relay(client, monkeypatch, hybrid, make_user):
+    monkeypatch.setattr(settings, "TASK_PUBLISH_MODE", "outbox")
+    monkeypatch.setattr(outbox_relay, "notify", lambda: None)
+    monkeypatch.setattr(publisher, "queue_depth", lambda queue: 0)
+    # inline-вызов не уложился в бюджет: задачу досчитает воркер
+    monkeypatch.setattr(inline_executor, "run", lambda task_data: None)
+
+    r = client.post("/predict/text", headers=make_user().headers, json={"text": "Покажи список событий"})
+
+    assert r.json()["status"] == "pending"
+    assert outbox_row(r.json()["id"]).sent_at is None
+    assert hybrid == []
+
+
+def test_inline_executor_gives_up_when_all_slots_are_busy(monkeypatch):
+    monkeypatch.setattr(settings, "PREDICTION_INLINE_MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(settings, "PREDICTION_INLINE_TIMEOUT_MS", 50)
+    executor = InlineExecutor(publisher)
+    release = threading.Event()
+
+    class SlowRunner:
+        def _process_task(self, task_data):
+            release.wait()
+            return {"status": "completed"}
+
+    executor._runner = SlowRunner()
+    try:
+        # первый вызов не уложился в бюджет, но продолжает занимать единственный слот
+        assert executor.run({"task_id": "slow"}) is None
+        assert executor.run({"task_id": "next"}) is None
+    finally:
+        release.set()
+        executor.shutdown()
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.workers import ml_worker
+from classes import CascadeModel
+from classes.intent_classifier_model import IntentClassifierModel, read_jsonl
+
+
+@pytest.fixture(scope="module")
+def trained_path(tmp_path_factory):
+    texts, labels = read_jsonl("data/intent_commands.jsonl")
+    model = IntentClassifierModel("unused")
+    model.train(texts, labels)
+    path = str(tmp_path_factory.mktemp("intent") / "intent_classifier.npz")
+    model.save_model(path)
+    return path
+
+
+@pytest.fixture
+def classifier(trained_path):
+    model = IntentClassifierModel(trained_path)
+    model.load_model()
+    return model
+
+
+def test_weights_are_memory_mapped(classifier):
+    assert isinstance(classifier._weights, np.memmap)
+    assert classifier._weights.dtype == np.float16
+    assert classifier.get_labels() == ["create_event", "delete_event", "list_events", "unknown", "update_event"]
+
+
+def test_recognizes_commands_the_rules_miss(classifier):
+    texts = ["Назначь встречу с Петей", "Сотри тренировку", "Перенеси созвон", "Что у меня запланировано?"]
+
+    results = classifier.predict_batch(texts)
+
+    assert [r["command_type"] for r in results] == ["create_event", "delete_event", "update_event", "list_events"]
+
+
+def test_create_event_gets_rule_parameters(classifier):
+    result = classifier.predict("Назначь \"Обед с Анной\" на завтра в 13:30")
+
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    assert result["command_type"] == "create_event"
+    assert result["parameters"]["title"] == "Обед с Анной"
+    assert result["parameters"]["start_time"] == f"{tomorrow.isoformat()}T13:30:00"
+
+
+def test_predict_batch_matches_predict(classifier):
+    texts = ["Покажи события на неделю", "Удали встречу", "Какая погода?", "", "create a meeting tomorrow"]
+
+    assert classifier.predict_batch(texts) == [classifier.predict(text) for text in texts]
+    assert classifier.predict_batch([]) == []
+
+
+def test_predict_requires_loaded_model():
+    with pytest.raises(RuntimeError):
+        IntentClassifierModel("missing.npz").predict("Удали событие")
+
+
+def test_rejects_feature_count_not_power_of_two():
+    with pytest.raises(ValueError):
+        IntentClassifierModel("unused", n_features=1000)
+
+
+def test_worker_factory_builds_cascade_with_classifier(monkeypatch, trained_path):
+    monkeypatch.setattr(ml_worker.settings, "ML_WORKER_ESCALATION_MODEL", "intent_classifier")
+    monkeypatch.setattr(ml_worker.settings, "INTENT_CLASSIFIER_PATH", trained_path)
+    monkeypatch.setattr(ml_worker.settings, "PREDICTION_CACHE_SIZE", 0)
+
+    model = ml_worker.MODEL_FACTORIES["text_to_command"]()
+    model.load_model()
+
+    assert isinstance(model, CascadeModel)
+    results = model.predict_batch(["Покажи список событий", "Сотри тренировку"])
+    assert [r["command_type"] for r in results] == ["list_events", "delete_event"]
+    assert model.stats()["escalations"] == 1
@@ -0,0 +1,678 @@
+import json
+import time
+import uuid
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.core.metrics import counters, dedupe_hit_rate
+from app.db.base import SessionLocal
+from app.models.prediction import PredictionDB
+from app.models.transaction import TransactionDB
+from app.models.user import UserDB
+from app.workers.ml_worker import MLWorker
+
+
+class FakeChannel:
+    def __init__(self):
+        self.acked = []
+        self.nacked = []
+        self.published = []
+        self.properties = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((routing_key, json.loads(body), properties.headers))
+        self.properties.append(properties)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.acked.append((delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.nacked.append((delivery_tag, multiple, requeue))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.timers = []
+        self.threadsafe_callbacks = []
+
+    def call_later(self, delay, callback):
+        self.timers.append(callback)
+        return len(self.timers)
+
+    def remove_timeout(self, timer_id):
+        pass
+
+    def add_callback_threadsafe(self, callback):
+        self.threadsafe_callbacks.append(callback)
+
+    def process_data_events(self):
+        callbacks, self.threadsafe_callbacks = self.threadsafe_callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class FakeModel:
+    # как MLModel.predict_batch по умолчанию
+    def predict_batch(self, inputs):
+        return [self.predict(input_data) for input_data in inputs]
+
+
+def make_worker():
+    worker = MLWorker()
+    worker.channel = FakeChannel()
+    worker.connection = FakeConnection()
+    return worker
+
+
+def make_tasks(texts):
+    user_id = str(uuid.uuid4())
+    session = SessionLocal()
+    try:
+        session.add(UserDB(
+            id=user_id,
+            name="Worker User",
+            email=f"{user_id}@example.com",
+            hashed_password="dummy",
+            balance=0.0,
+        ))
+        tasks = []
+        for text in texts:
+            task = {
+                "task_id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "task_type": "text_to_command",
+                "input_data": text,
+                "prediction_id": str(uuid.uuid4()),
+            }
+            session.add(PredictionDB(
+                id=task["prediction_id"],
+                user_id=user_id,
+                task_id=task["task_id"],
+                input_data=text,
+                model_type="text_to_command",
+            ))
+            tasks.append(task)
+        session.commit()
+        return tasks
+    finally:
+        session.close()
+
+
+def deliver(worker, tag, body):
+    worker._batch_callback(worker.channel, SimpleNamespace(delivery_tag=tag), None, body)
+
+
+def deliver_rpc(worker, tag, body, reply_to, correlation_id):
+    properties = SimpleNamespace(reply_to=reply_to, correlation_id=correlation_id, headers=None)
+    worker._batch_callback(worker.channel, SimpleNamespace(delivery_tag=tag), properties, body)
+
+
+def settle(worker):
+    # поток инференса один, поэтому пустая задача дождётся всех предыдущих
+    worker._executor.submit(lambda: None).result()
+    worker.connection.process_data_events()
+
+
+def get_prediction(prediction_id):
+    session = SessionLocal()
+    try:
+        return session.query(PredictionDB).filter(PredictionDB.id == prediction_id).first()
+    finally:
+        session.close()
+
+
+def test_batch_is_flushed_when_full_and_acked_once(monkeypatch):
+    monkeypatch.setattr(settings, "ML_WORKER_BATCH_SIZE", 3)
+    worker = make_worker()
+    tasks = make_tasks(["Покажи список событий", "Удали событие", "Обнови встречу"])
+
+    for tag, task in enumerate(tasks, 1):
+        deliver(worker, tag, json.dumps(task))
+    settle(worker)
+
+    assert worker.channel.acked == [(3, True)]
+    assert worker.channel.nacked == []
+    for task in tasks:
+        assert get_prediction(task["prediction_id"]).output_data is not None
+
+
+def test_rpc_task_result_is_sent_to_reply_queue(monkeypatch):
+    monkeypatch.setattr(settings, "ML_WORKER_BATCH_SIZE", 2)
+    worker = make_worker()
+    rpc_task, plain_task = make_tasks(["Покажи список событий", "Удали событие"])
+
+    deliver_rpc(worker, 1, json.dumps(rpc_task), "amq.gen-replies", rpc_task["task_id"])
+    deliver(worker, 2, json.dumps(plain_task))
+    settle(worker)
+
+    replies = [(key, body) for key, body, _ in worker.channel.published if key == "amq.gen-replies"]
+    assert len(replies) == 1
+    assert replies[0][1]["prediction_id"] == rpc_task["prediction_id"]
+    assert replies[0][1]["status"] == "completed"
+    assert worker.channel.acked == [(2, True)]
+
+
+def test_rpc_task_keeps_reply_address_on_retry(monkeypatch):
+    worker = make_worker()
+    task = make_tasks(["Покажи список событий"])[0]
+
+    def failing_save(db, results):
+        raise RuntimeError("database is unavailable")
+
+    monkeypatch.setattr("app.workers.ml_worker.save_prediction_results", failing_save)
+
+    deliver_rpc(worker, 1, json.dumps(task), "amq.gen-replies", task["task_id"])
+    settle(worker)
+
+    assert worker.channel.published[0][0] == "ml_tasks.text_to_command.retry.0"
+    assert worker.channel.properties[0].reply_to == "amq.gen-replies"
+    assert worker.channel.properties[0].correlation_id == task["task_id"]
+
+
+def test_async_rpc_task_keeps_reply_address_on_retry(monkeypatch):
+    import asyncio
+
+    pytest.importorskip("aio_pika")
+    from app.workers.async_worker import AsyncMLWorker
+
+    def failing_save(db, results):
+        raise RuntimeError("database is unavailable")
+
+    monkeypatch.setattr("app.workers.ml_worker.save_prediction_results", failing_save)
+    worker = AsyncMLWorker()
+    worker._channel = FakeAsyncChannel()
+    task = make_tasks(["Покажи список событий"])[0]
+    message = FakeMessage(json.dumps(task))
+    message.reply_to = "amq.gen-replies"
+    message.correlation_id = task["task_id"]
+
+    asyncio.run(worker._on_message(message))
+
+    assert message.outcome == "ack"
+    retried, queue = worker._channel.default_exchange.published[0]
+    assert queue == "ml_tasks.text_to_command.retry.0"
+    assert retried.reply_to == "amq.gen-replies"
+    assert retried.correlation_id == task["task_id"]
+    assert retried.headers["x-attempt"] == 1
+
+
+class CountingModel(FakeModel):
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def predict(self, text):
+        self.calls.append(text)
+        time.sleep(self.delay)
+        return {"command_type": "list_events", "parameters": {"text": text}, "confidence": 0.9}
+
+
+def test_identical_tasks_in_batch_are_predicted_once(monkeypatch):
+    monkeypatch.setattr(settings, "ML_WORKER_BATCH_SIZE", 4)
+    monkeypatch.setattr(counters, "_values", defaultdict(float))
+    worker = make_worker()
+    model = CountingModel()
+    worker.models["text_to_command"] = model
+    tasks = make_tasks(["Покажи список событий", "  Покажи  список событий", "Удали событие"])
+    # тот же текст другого пользователя — отдельная задача
+    tasks += make_tasks(["Покажи список событий"])
+
+    for tag, task in enumerate(tasks, 1):
+        deliver(worker, tag, json.dumps(task))
+    settle(worker)
+
+    assert model.calls == ["Покажи список событий", "Удали событие", "Покажи список событий"]
+    assert worker.channel.acked == [(4, True)]
+    first, duplicate = get_prediction(tasks[0]["prediction_id"]), get_prediction(tasks[1]["prediction_id"])
+    assert duplicate.status == "completed"
+    assert duplicate.output_data == first.output_data
+    assert counters.get("tasks_dedupe_lookups") == 4
+    assert dedupe_hit_rate(counters.snapshot()) == 0.25
+
+
+def test_partial_batch_is_flushed_by_timer(monkeypatch):
+    monkeypatch.setattr(settings, "ML_WORKER_BATCH_SIZE", 10)
+    worker = make_worker()
+    tasks = make_tasks(["Покажи список событий", "Удали событие"])
+
+    for tag, task in enumerate(tasks, 1):
+        deliver(worker, tag, json.dumps(task))
+
+    assert worker.channel.acked == []
+    assert len(worker.connection.timers) == 1
+
+    worker.connection.timers[0]()
+    settle(worker)
+
+    assert worker.channel.acked == [(2, True)]
+    payload = json.loads(get_prediction(tasks[1]["prediction_id"]).output_data)
+    assert payload["command_type"] == "delete_event"
+
+
+def test_malformed_message_is_rejected_without_breaking_batch(monkeypatch):
+    monkeypatch.setattr(settings, "ML_WORKER_BATCH_SIZE", 2)
+    worker = make_worker()
+    tasks = make_tasks(["Покажи список событий", "Удали событие"])
+
+    deliver(worker, 1, json.dumps(tasks[0]))
+    deliver(worker, 2, b"not json")
+    deliver(worker, 3, json.dumps(tasks[1]))
+    settle(worker)
+
+    assert worker.channel.nacked == [(2, False, False)]
+    assert worker.channel.acked == [(3, True)]
+
+
+def test_batch_results_are_written_in_one_transaction(monkeypatch):
+    from app.models.calendar_event import CalendarEventDB
+
+    monkeypatch.setattr(settings, "ML_WORKER_BATCH_SIZE", 2)
+    worker = make_worker()
+    tasks = make_tasks([
+        "Создай \"Планёрка\" завтра в 11:30",
+        "Добавь \"Ретро\" в 16:00",
+    ])
+
+    commits = []
+    original_commit = SessionLocal.class_.commit
+
+    def counting_commit(session):
+        commits.append(session)
+        return original_commit(session)
+
+    monkeypatch.setattr(SessionLocal.class_, "commit", counting_commit)
+
+    for tag, task in enumerate(tasks, 1):
+        deliver(worker, tag, json.dumps(task))
+    settle(worker)
+
+    assert len(commits) == 1
+    assert worker.channel.acked == [(2, True)]
+
+    session = SessionLocal()
+    try:
+        titles = {
+            e.title for e in session.query(CalendarEventDB)
+            .filter(CalendarEventDB.user_id == tasks[0]["user_id"])
+            .all()
+        }
+    finally:
+        session.close()
+    assert titles == {"Планёрка", "Ретро"}
+
+
+def test_batch_goes_to_retry_queue_when_commit_fails(monkeypatch):
+    monkeypatch.setattr(settings, "ML_WORKER_BATCH_SIZE", 2)
+    worker = make_worker()
+    tasks = make_tasks(["Покажи список событий", "Удали событие"])
+
+    def failing_save(db, results):
+        raise RuntimeError("database is unavailable")
+
+    monkeypatch.setattr("app.workers.ml_worker.save_prediction_results", failing_save)
+
+    for tag, task in enumerate(tasks, 1):
+        deliver(worker, tag, json.dumps(task))
+    settle(worker)
+
+    assert worker.channel.nacked == []
+    assert worker.channel.acked == [(2, True)]
+    assert [(queue, body["task_id"]) for queue, body, _ in worker.channel.published] == [
+        ("ml_tasks.text_to_command.retry.0", tasks[0]["task_id"]),
+        ("ml_tasks.text_to_command.retry.0", tasks[1]["task_id"]),
+    ]
+    headers = worker.channel.published[0][2]
+    assert headers["x-attempt"] == 1
+    assert headers["x-origin-queue"] == "ml_tasks.text_to_command"
+    assert "database is unavailable" in headers["x-last-error"]
+    assert get_prediction(tasks[0]["prediction_id"]).output_data is None
+
+
+def test_task_is_dead_lettered_after_max_attempts(monkeypatch):
+    worker = make_worker()
+    task = make_tasks(["Покажи список событий"])[0]
+
+    def failing_save(db, results):
+        raise RuntimeError("database is unavailable")
+
+    monkeypatch.setattr("app.workers.ml_worker.save_prediction_results", failing_save)
+
+    properties = SimpleNamespace(headers={"x-attempt": settings.ML_TASK_MAX_ATTEMPTS - 1})
+    worker._callback(worker.channel, SimpleNamespace(delivery_tag=7), properties, json.dumps(task))
+    settle(worker)
+
+    assert worker.channel.acked == [(7, False)]
+    queue, _, headers = worker.channel.published[0]
+    assert queue == "ml_tasks.dead"
+    assert headers["x-attempt"] == settings.ML_TASK_MAX_ATTEMPTS
+
+
+def test_model_failure_is_saved_as_failed_prediction():
+    class BrokenModel(FakeModel):
+        def predict(self, text):
+            raise ValueError("model exploded")
+
+    worker = make_worker()
+    worker.models["text_to_command"] = BrokenModel()
+    task = make_tasks(["Покажи список событий"])[0]
+
+    worker._callback(worker.channel, SimpleNamespace(delivery_tag=1), None, json.dumps(task))
+    settle(worker)
+
+    assert worker.channel.acked == [(1, False)]
+    prediction = get_prediction(task["prediction_id"])
+    assert prediction.status == "failed"
+    assert prediction.error == "model exploded"
+
+
+class FakeMessage:
+    def __init__(self, body):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.outcome = None
+        self.headers = None
+        self.priority = None
+        self.reply_to = None
+        self.correlation_id = None
+
+    async def ack(self):
+        self.outcome = "ack"
+
+    async def nack(self, requeue=True):
+        self.outcome = ("nack", requeue)
+
+    async def reject(self, requeue=False):
+        self.outcome = ("reject", requeue)
+
+
+class FakeExchange:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, message, routing_key):
+        self.published.append((message, routing_key))
+
+
+class FakeAsyncChannel:
+    def __init__(self):
+        self.default_exchange = FakeExchange()
+
+
+class SlowModel(FakeModel):
+    def __init__(self, delay):
+        self.delay = delay
+
+    def predict(self, text):
+        time.sleep(self.delay)
+        return {"command_type": "list_events", "parameters": {}, "confidence": 0.9}
+
+
+def test_async_worker_keeps_several_deliveries_in_flight(monkeypatch):
+    import asyncio
+    import time
+
+    pytest.importorskip("aio_pika")
+    from app.workers.async_worker import AsyncMLWorker
+
+    monkeypatch.setattr(settings, "ML_WORKER_INFERENCE_THREADS", 4)
+    # одинаковые тексты иначе посчитались бы один раз
+    monkeypatch.setattr(settings, "ML_WORKER_DEDUPE", False)
+    worker = AsyncMLWorker()
+    worker.models["text_to_command"] = SlowModel(0.2)
+    tasks = make_tasks(["Покажи список событий"] * 4)
+    messages = [FakeMessage(json.dumps(task)) for task in tasks]
+
+    async def consume_all():
+        await asyncio.gather(*(worker._on_message(m) for m in messages))
+
+    started = time.perf_counter()
+    asyncio.run(consume_all())
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.6
+    assert [m.outcome for m in messages] == ["ack"] * 4
+    for task in tasks:
+        assert get_prediction(task["prediction_id"]).output_data is not None
+
+
+def test_async_worker_computes_identical_in_flight_tasks_once(monkeypatch):
+    import asyncio
+
+    pytest.importorskip("aio_pika")
+    from app.workers.async_worker import AsyncMLWorker
+
+    monkeypatch.setattr(settings, "ML_WORKER_INFERENCE_THREADS", 4)
+    monkeypatch.setattr(counters, "_values", defaultdict(float))
+    worker = AsyncMLWorker()
+    model = CountingModel(delay=0.2)
+    worker.models["text_to_command"] = model
+    tasks = make_tasks(["Покажи список событий"] * 3)
+    messages = [FakeMessage(json.dumps(task)) for task in tasks]
+
+    async def consume_all():
+        await asyncio.gather(*(worker._on_message(m) for m in messages))
+
+    asyncio.run(consume_all())
+
+    assert model.calls == ["Покажи список событий"]
+    assert [m.outcome for m in messages] == ["ack"] * 3
+    for task in tasks:
+        assert get_prediction(task["prediction_id"]).status == "completed"
+    assert counters.get("tasks_dedupe_hits") == 2
+    assert worker._in_flight == {}
+
+
+def test_async_worker_rejects_malformed_message():
+    import asyncio
+
+    pytest.importorskip("aio_pika")
+    from app.workers.async_worker import AsyncMLWorker
+
+    worker = AsyncMLWorker()
+    message = FakeMessage(b"not json")
+    asyncio.run(worker._on_message(message))
+    assert message.outcome == ("reject", False)
+
+
+def test_slow_inference_does_not_block_connection_thread():
+    # брокер рвёт соединение, если клиент молчит дольше двух интервалов heartbeat;
+    # здесь интервал сжат до 0.15 с, а инференс идёт целую секунду
+    heartbeat_timeout = 0.3
+    worker = make_worker()
+    worker.models["text_to_command"] = SlowModel(1.0)
+    task = make_tasks(["Покажи список событий"])[0]
+
+    started = time.perf_counter()
+    worker._callback(
+        worker.channel, SimpleNamespace(delivery_tag=1), None, json.dumps(task)
+    )
+    assert time.perf_counter() - started < 0.1
+
+    ticks = [time.perf_counter()]
+    while not worker.channel.acked and time.perf_counter() - started < 5:
+        time.sleep(0.05)
+        worker.connection.process_data_events()
+        ticks.append(time.perf_counter())
+
+    max_gap = max(b - a for a, b in zip(ticks, ticks[1:]))
+    assert max_gap < heartbeat_timeout
+    assert worker.channel.acked == [(1, False)]
+    assert worker.channel.nacked == []
+    assert get_prediction(task["prediction_id"]).output_data is not None
+
+
+def test_fair_queue_round_robins_between_users():
+    from app.workers.fair_queue import FairQueue
+
+    queue = FairQueue()
+    for i in range(3):
+        queue.put("heavy", f"heavy-{i}")
+    queue.put("light-1", "light-1")
+    queue.put("light-2", "light-2")
+
+    assert queue.get_many(10) == ["heavy-0", "light-1", "light-2", "heavy-1", "heavy-2"]
+    assert len(queue) == 0
+
+
+def test_fair_scheduling_lets_light_user_overtake_heavy_backlog(monkeypatch):
+    import threading
+
+    monkeypatch.setattr(settings, "ML_WORKER_FAIR_SCHEDULING", True)
+    worker = make_worker()
+    heavy = make_tasks(["Покажи список событий"] * 4)
+    light = make_tasks(["Удали событие"])
+
+    processed = []
+
+    class RecordingModel(FakeModel):
+        def predict(self, text):
+            processed.append(text)
+            return {"command_type": "unknown", "parameters": {}, "confidence": 0.0}
+
+    worker.models["text_to_command"] = RecordingModel()
+
+    # занимаем поток инференса, чтобы весь бэклог успел накопиться
+    release = threading.Event()
+    worker._executor.submit(release.wait)
+
+    tag = 0
+    for task in heavy + light:
+        tag += 1
+        worker._fair_callback(
+            worker.channel, SimpleNamespace(delivery_tag=tag), None, json.dumps(task)
+        )
+    release.set()
+    settle(worker)
+
+    assert processed[:2] == ["Покажи список событий", "Удали событие"]
+    assert sorted(worker.channel.acked) == [(t, False) for t in range(1, 6)]
+
+
+def test_fair_scheduling_coalesces_duplicates_across_the_window(monkeypatch):
+    import threading
+
+    monkeypatch.setattr(settings, "ML_WORKER_FAIR_SCHEDULING", True)
+    monkeypatch.setattr(settings, "ML_WORKER_BATCH_SIZE", 1)
+    worker = make_worker()
+    model = CountingModel()
+    worker.models["text_to_command"] = model
+    repeated = make_tasks(["Покажи список событий", "Удали событие", "Покажи  список событий"])
+    others = make_tasks(["Удали событие"]) + make_tasks(["Покажи список событий"])
+
+    release = threading.Event()
+    worker._executor.submit(release.wait)
+    for tag, task in enumerate(repeated + others, 1):
+        worker._fair_callback(worker.channel, SimpleNamespace(delivery_tag=tag), None, json.dumps(task))
+    release.set()
+    settle(worker)
+
+    # повтор первого пользователя досчитан вместе с первой задачей, а не отдельным predict
+    assert len(model.calls) == 4
+    assert sorted(worker.channel.acked) == [(t, False) for t in range(1, 6)]
+    first, duplicate = get_prediction(repeated[0]["prediction_id"]), get_prediction(repeated[2]["prediction_id"])
+    assert duplicate.status == "completed"
+    assert duplicate.output_data == first.output_data
+
+
+def get_user(user_id):
+    session = SessionLocal()
+    try:
+        return session.query(UserDB).filter(UserDB.id == user_id).first()
+    finally:
+        session.close()
+
+
+def test_task_past_deadline_is_expired_and_refunded_once():
+    from app.core.metrics import counters
+
+    class ExplodingModel(FakeModel):
+        def predict(self, text):
+            raise AssertionError("expired task must not reach the model")
+
+    worker = make_worker()
+    worker.models["text_to_command"] = ExplodingModel()
+    task = make_tasks(["Покажи список событий"])[0]
+    task["deadline"] = time.time() - 1
+    shed_before = counters.get("tasks_shed_deadline")
+
+    # повторная доставка той же задачи не должна вернуть деньги второй раз
+    for tag in (1, 2):
+        worker._callback(worker.channel, SimpleNamespace(delivery_tag=tag), None, json.dumps(task))
+    settle(worker)
+
+    assert worker.channel.acked == [(1, False), (2, False)]
+    prediction = get_prediction(task["prediction_id"])
+    assert prediction.status == "expired"
+    assert prediction.error == "Deadline exceeded"
+    assert get_user(task["user_id"]).balance == settings.PREDICTION_COST
+    session = SessionLocal()
+    try:
+        refunds = session.query(TransactionDB).filter(TransactionDB.user_id == task["user_id"]).all()
+    finally:
+        session.close()
+    assert [(tx.type.value, tx.amount, tx.balance_after) for tx in refunds] == [
+        ("deposit", settings.PREDICTION_COST, settings.PREDICTION_COST)
+    ]
+    assert counters.get("tasks_shed_deadline") - shed_before == 2
+
+
+def test_task_dropped_on_overflow_is_refunded():
+    worker = make_worker()
+    task = make_tasks(["Покажи список событий"])[0]
+    properties = SimpleNamespace(
+        headers={"x-death": [{"reason": "maxlen", "queue": "ml_tasks.text_to_command"}]},
+        priority=9,
+    )
+
+    worker._shed_callback(worker.channel, SimpleNamespace(delivery_tag=3), properties, json.dumps(task))
+    settle(worker)
+
+    assert worker.channel.acked == [(3, False)]
+    prediction = get_prediction(task["prediction_id"])
+    assert prediction.status == "expired"
+    assert prediction.error == "Dropped: task queue overflow"
+    assert get_user(task["user_id"]).balance == settings.PREDICTION_COST
+
+
+def test_rejected_task_is_forwarded_from_shed_queue_to_dead_letters():
+    worker = make_worker()
+    task = make_tasks(["Покажи список событий"])[0]
+    properties = SimpleNamespace(headers={"x-death": [{"reason": "rejected"}]}, priority=9)
+
+    worker._shed_callback(worker.channel, SimpleNamespace(delivery_tag=4), properties, json.dumps(task))
+
+    assert worker.channel.acked == [(4, False)]
+    queue, body, headers = worker.channel.published[0]
+    assert queue == "ml_tasks.dead"
+    assert body["task_id"] == task["task_id"]
+    assert headers["x-death"][0]["reason"] == "rejected"
+    assert get_prediction(task["prediction_id"]).status == "pending"
+
+
+def test_async_worker_handles_shed_queue_like_the_blocking_worker():
+    import asyncio
+
+    pytest.importorskip("aio_pika")
+    from app.workers.async_worker import AsyncMLWorker
+
+    worker = AsyncMLWorker()
+    worker._channel = FakeAsyncChannel()
+    dropped, rejected = make_tasks(["Покажи список событий", "Удали событие"])
+    overflow = FakeMessage(json.dumps(dropped))
+    overflow.headers = {"x-death": [{"reason": "maxlen"}]}
+    failed = FakeMessage(json.dumps(rejected))
+    failed.headers = {"x-death": [{"reason": "rejected"}]}
+    failed.priority = 9
+
+    asyncio.run(worker._on_shed(overflow))
+    asyncio.run(worker._on_shed(failed))
+
+    assert (overflow.outcome, failed.outcome) == ("ack", "ack")
+    assert get_prediction(dropped["prediction_id"]).error == "Dropped: task queue overflow"
+    assert get_user(dropped["user_id"]).balance == settings.PREDICTION_COST
+    forwarded, queue = worker._channel.default_exchange.published[0]
+    assert queue == "ml_tasks.dead"
+    assert forwarded.priority == 9
+    assert get_prediction(rejected["prediction_id"]).status == "pending"
@@ -0,0 +1,120 @@
+import json
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.base import SessionLocal
+from app.models.outbox import OutboxDB
+from app.models.user import UserDB
+from app.rabbitmq.outbox import OutboxRelay, outbox_relay
+from app.rabbitmq.publisher import publisher
+from app.repositories import enqueue_outbox
+
+
+class FakePublisher:
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.published = []
+
+    def publish_tasks(self, tasks):
+        if self.ok:
+            self.published.extend(tasks)
+        return self.ok
+
+    def close(self):
+        pass
+
+
+def make_task():
+    return {
+        "task_id": str(uuid.uuid4()),
+        "user_id": "outbox-user",
+        "task_type": "text_to_command",
+        "input_data": "Покажи список событий",
+        "prediction_id": str(uuid.uuid4()),
+    }
+
+
+def get_row(task_id):
+    session = SessionLocal()
+    try:
+        return session.query(OutboxDB).filter(OutboxDB.id == task_id).first()
+    finally:
+        session.close()
+
+
+def test_prediction_is_written_to_outbox_without_touching_broker(client, monkeypatch):
+    monkeypatch.setattr(settings, "TASK_PUBLISH_MODE", "outbox")
+    monkeypatch.setattr(outbox_relay, "notify", lambda: None)
+
+    def broker_is_down(task):
+        raise AssertionError("request must not publish directly")
+
+    monkeypatch.setattr(publisher, "publish_task", broker_is_down)
+
+    user_id = str(uuid.uuid4())
+    session = SessionLocal()
+    try:
+        session.add(UserDB(
+            id=user_id,
+            name="Outbox User",
+            email=f"{user_id}@example.com",
+            hashed_password="dummy",
+            balance=50.0,
+        ))
+        session.commit()
+    finally:
+        session.close()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+    r = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"})
+    assert r.status_code == 200
+
+    session = SessionLocal()
+    try:
+        rows = [
+            json.loads(row.payload)
+            for row in session.query(OutboxDB).filter(OutboxDB.sent_at.is_(None)).all()
+        ]
+    finally:
+        session.close()
+    task = next(task for task in rows if task["prediction_id"] == r.json()["id"])
+    assert task["user_id"] == user_id
+    assert task["input_data"] == "Покажи список событий"
+    assert task["deadline"] > 0
+
+
+def test_relay_publishes_pending_rows_and_marks_them_sent():
+    task = make_task()
+    session = SessionLocal()
+    try:
+        enqueue_outbox(session, [task])
+    finally:
+        session.close()
+
+    relay = OutboxRelay(FakePublisher())
+    while relay.run_once():
+        pass
+
+    assert task in relay.publisher.published
+    assert get_row(task["task_id"]).sent_at is not None
+
+
+def test_relay_keeps_rows_when_broker_rejects_them():
+    task = make_task()
+    session = SessionLocal()
+    try:
+        enqueue_outbox(session, [task])
+    finally:
+        session.close()
+
+    relay = OutboxRelay(FakePublisher(ok=False))
+    with pytest.raises(RuntimeError):
+        relay.run_once()
+
+    row = get_row(task["task_id"])
+    assert row.sent_at is None
+    assert row.attempts == 1
+    assert row.last_error
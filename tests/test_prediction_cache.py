@@ -0,0 +1,176 @@
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.metrics import Counters, cache_hit_rate
+from app.workers import ml_worker
+from app.workers.prediction_cache import DatabaseCacheTier
+from classes import CachedModel, MLModel, TextToCommandModel
+
+
+class CountingModel(MLModel):
+    def __init__(self):
+        super().__init__("counting", "text_to_command")
+        self.seen = []
+
+    def load_model(self) -> None:
+        self._is_loaded = True
+
+    def predict(self, text):
+        self.seen.append(text)
+        return {"command_type": "unknown", "parameters": {"title": text}, "confidence": 0.0}
+
+    def save_model(self, path: str) -> None:
+        pass
+
+
+class DictTier:
+    def __init__(self):
+        self.values = {}
+
+    def get_many(self, keys):
+        return {key: self.values[key] for key in keys if key in self.values}
+
+    def set_many(self, values, ttl_seconds):
+        self.values.update(values)
+
+
+class BrokenTier:
+    def get_many(self, keys):
+        raise ConnectionError("db is down")
+
+    def set_many(self, values, ttl_seconds):
+        raise ConnectionError("db is down")
+
+
+def make_cache(**kwargs):
+    model = CountingModel()
+    metrics = Counters()
+    cache = CachedModel(model, metrics=metrics, **kwargs)
+    cache.load_model()
+    return cache, model, metrics
+
+
+def test_repeated_phrase_is_served_from_cache():
+    cache, model, metrics = make_cache()
+
+    first = cache.predict("покажи  события ")
+    second = cache.predict("покажи события")
+
+    assert first == second
+    assert model.seen == ["покажи события"]
+    assert metrics.get("prediction_cache_hits") == 1
+    assert metrics.get("prediction_cache_misses") == 1
+    assert cache_hit_rate(metrics.snapshot()) == 0.5
+
+
+def test_duplicates_in_batch_are_predicted_once():
+    cache, model, metrics = make_cache()
+
+    results = cache.predict_batch(["Удали событие", "Покажи события", "Удали  событие"])
+
+    assert model.seen == ["Удали событие", "Покажи события"]
+    assert results[0] == results[2]
+    assert metrics.get("prediction_cache_misses") == 3
+
+
+def test_new_day_is_a_new_key(monkeypatch):
+    cache, model, _ = make_cache()
+    monkeypatch.setattr(cache, "_date_bucket", lambda: "2030-01-01")
+    cache.predict("Создай встречу завтра")
+    monkeypatch.setattr(cache, "_date_bucket", lambda: "2030-01-02")
+    cache.predict("Создай встречу завтра")
+
+    assert len(model.seen) == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache, model, _ = make_cache(ttl_seconds=10)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.predict("Покажи события")
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    cache.predict("Покажи события")
+
+    assert len(model.seen) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, model, metrics = make_cache(max_size=2)
+
+    cache.predict_batch(["a", "b"])
+    cache.predict("a")
+    cache.predict("c")
+    cache.predict_batch(["a", "b"])
+
+    assert model.seen == ["a", "b", "c", "b"]
+    assert metrics.get("prediction_cache_evictions") == 2
+    assert len(cache) == 2
+
+
+def test_shared_tier_is_filled_and_read_by_other_processes():
+    tier = DictTier()
+    first, first_model, _ = make_cache(shared=tier)
+    second, second_model, metrics = make_cache(shared=tier)
+
+    first.predict("Покажи события")
+    result = second.predict("Покажи события")
+    second.predict("Покажи события")
+
+    assert second_model.seen == []
+    assert result == first.predict("Покажи события")
+    assert metrics.get("prediction_cache_shared_hits") == 1
+    assert metrics.get("prediction_cache_hits") == 1
+
+
+def test_broken_shared_tier_is_a_miss():
+    cache, model, _ = make_cache(shared=BrokenTier())
+
+    assert cache.predict("Покажи события")["command_type"] == "unknown"
+    assert model.seen == ["Покажи события"]
+
+
+def test_database_tier_round_trip():
+    tier = DatabaseCacheTier()
+    value = {"command_type": "list_events", "parameters": {}, "confidence": 0.9}
+
+    tier.set_many({"text_to_command:2030-01-01:покажи события": value}, 60)
+    tier.set_many({"text_to_command:2030-01-01:покажи события": value, "expired": value}, -1)
+
+    assert tier.get_many(["text_to_command:2030-01-01:покажи события", "missing"]) == {}
+    tier.set_many({"text_to_command:2030-01-01:покажи события": value}, 60)
+    assert tier.get_many(["text_to_command:2030-01-01:покажи события"]) == {
+        "text_to_command:2030-01-01:покажи события": value
+    }
+
+
+def test_worker_and_inline_path_share_the_cache(monkeypatch):
+    monkeypatch.setattr(settings, "ML_WORKER_ESCALATION_MODEL", "")
+    worker = ml_worker.MLWorker(task_types=["text_to_command"])
+    model = worker.models["text_to_command"]
+    assert isinstance(model, CachedModel)
+
+    task = {"task_id": "t1", "prediction_id": "p1", "user_id": "u1",
+            "task_type": "text_to_command", "input_data": "Покажи события"}
+    batch_result = worker._process_batch([task])[0]
+    # inline-путь API вызывает _process_task той же модели
+    inline_result = worker._process_task({**task, "task_id": "t2", "prediction_id": "p2"})
+
+    assert inline_result["output_data"] == batch_result["output_data"]
+    assert len(model) == 1
+
+
+def test_rules_results_match_uncached():
+    rules = TextToCommandModel(model_path="dummy_path")
+    rules.load_model()
+    cache = CachedModel(rules)
+    cache.load_model()
+    texts = ["Создай \"Обед\" завтра в 13:00", "Удали событие", "Привет", "Создай \"Обед\" завтра в 13:00"]
+
+    assert cache.predict_batch(texts) == rules.predict_batch(texts)
+
+
+def test_predict_requires_loaded_model():
+    with pytest.raises(RuntimeError):
+        CachedModel(CountingModel()).predict("Покажи события")
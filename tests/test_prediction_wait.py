@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from app.api import predictions
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.rabbitmq.publisher import publisher
+from app.rabbitmq.results import result_notifier
+from app.repositories import save_prediction_results
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    monkeypatch.setattr(settings, "PREDICTION_EXECUTION_MODE", "queue")
+    published = []
+    monkeypatch.setattr(publisher, "publish_task", lambda task: published.append(task) or True)
+    return published
+
+
+def finish_later(task, delay):
+    # воркер в другом процессе: сохраняет результат и сообщает о нём через обменник результатов
+    def run():
+        time.sleep(delay)
+        session = SessionLocal()
+        try:
+            save_prediction_results(session, [{
+                'task_id': task['task_id'],
+                'prediction_id': task['prediction_id'],
+                'output_data': json.dumps({"command_type": "list_events"}),
+                'confidence': 0.9,
+                'status': 'completed',
+            }])
+        finally:
+            session.close()
+        result_notifier.notify({
+            'prediction_id': task['prediction_id'],
+            'user_id': task['user_id'],
+            'status': 'completed',
+        })
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_wait_returns_as_soon_as_worker_reports_result(client, queued, make_user):
+    headers = make_user().headers
+    prediction_id = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"}).json()["id"]
+    worker = finish_later(queued[0], 0.2)
+
+    start = time.perf_counter()
+    r = client.get(f"/predictions/{prediction_id}?wait=10s", headers=headers)
+    elapsed = time.perf_counter() - start
+    worker.join()
+
+    assert r.status_code == 200
+    assert r.json()["status"] == "completed"
+    assert json.loads(r.json()["output_data"])["command_type"] == "list_events"
+    assert elapsed < 5
+    assert result_notifier.waiting() == 0
+
+
+def test_wait_reads_the_database_off_the_event_loop(client, queued, make_user, monkeypatch):
+    headers = make_user().headers
+    prediction_id = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"}).json()["id"]
+    on_loop = []
+
+    def get_prediction(db, prediction_id, user_id):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return original(db, prediction_id, user_id)
+
+    original = predictions.get_prediction
+    monkeypatch.setattr(predictions, "get_prediction", get_prediction)
+
+    r = client.get(f"/predictions/{prediction_id}?wait=100ms", headers=headers)
+
+    assert r.json()["status"] == "pending"
+    assert on_loop == [False, False]
+
+
+def test_wait_times_out_with_pending_prediction(client, queued, make_user):
+    headers = make_user().headers
+    prediction_id = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"}).json()["id"]
+
+    start = time.perf_counter()
+    r = client.get(f"/predictions/{prediction_id}?wait=200ms", headers=headers)
+
+    assert r.status_code == 200
+    assert r.json()["status"] == "pending"
+    assert 0.2 <= time.perf_counter() - start < 5
+    assert result_notifier.waiting() == 0
+
+
+def test_prediction_of_another_user_is_not_found(client, queued, make_user):
+    prediction_id = client.post(
+        "/predict/text", headers=make_user().headers, json={"text": "Покажи список событий"}
+    ).json()["id"]
+
+    r = client.get(f"/predictions/{prediction_id}", headers=make_user().headers)
+    assert r.status_code == 404
+
+
+def test_malformed_wait_is_rejected(client, queued, make_user):
+    headers = make_user().headers
+    prediction_id = client.post("/predict/text", headers=headers, json={"text": "Покажи список событий"}).json()["id"]
+
+    assert client.get(f"/predictions/{prediction_id}?wait=soon", headers=headers).status_code == 400
+    assert client.get(f"/predictions/{prediction_id}", headers=headers).json()["status"] == "pending"
+
+
+def test_sync_prediction_returns_worker_reply(client, monkeypatch, make_user):
+    monkeypatch.setattr(publisher, "call", lambda task: {
+        'prediction_id': task['prediction_id'],
+        'output_data': json.dumps({"command_type": "list_events"}),
+        'confidence': 0.9,
+        'status': 'completed',
+    })
+
+    r = client.post("/predict/text/sync", headers=make_user().headers, json={"text": "Покажи список событий"})
+
+    assert r.status_code == 200
+    assert r.json()["status"] == "completed"
+    assert r.json()["confidence"] == 0.9
+
+
+def test_sync_prediction_without_reply_stays_pending(client, monkeypatch, make_user):
+    monkeypatch.setattr(publisher, "call", lambda task: None)
+
+    r = client.post("/predict/text/sync", headers=make_user().headers, json={"text": "Покажи список событий"})
+
+    assert r.status_code == 200
+    assert r.json()["status"] == "pending"
+
+
+def test_sync_prediction_publish_failure_refunds_the_charge(client, monkeypatch, make_user):
+    def fail(task):
+        raise RuntimeError("broker is down")
+
+    monkeypatch.setattr(publisher, "call", fail)
+    headers = make_user().headers
+
+    r = client.post("/predict/text/sync", headers=headers, json={"text": "Покажи список событий"})
+
+    assert r.status_code == 500
+    assert client.get("/users/me/balance", headers=headers).json()["balance"] == 50.0
+    predictions = client.get("/users/me/predictions", headers=headers).json()
+    assert [(p["status"], p["error"]) for p in predictions] == [("failed", "Failed to publish task to queue")]
+    txs = client.get("/users/me/transactions", headers=headers).json()
+    assert sorted(tx["type"] for tx in txs) == ["deposit", "withdrawal"]
+
+
+def test_result_listener_starts_with_the_app(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.rabbitmq.results import result_listener
+
+    started = []
+    monkeypatch.setattr(result_listener, "start", lambda: started.append(True))
+
+    with TestClient(app):
+        assert started == [True]
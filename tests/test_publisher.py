@@ -0,0 +1,238 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from concurrent.futures import Future
+
+import pika
+import pytest
+from pika.exceptions import NackError
+
+from app.core.config import settings
+from app.rabbitmq.publisher import RabbitMQPublisher
+from app.rabbitmq.publisher_thread import PublisherThread
+from app.rabbitmq.topology import PRIORITIES, binding_specs, queue_specs
+
+
+class FakeChannel:
+    def __init__(self):
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.published.append((exchange, routing_key, json.loads(body), properties))
+
+
+class FakeIOLoop:
+    # выполняет колбэки сразу в вызывающем потоке; auto_ack — брокер подтверждает всё опубликованное
+    def __init__(self, io, auto_ack=True):
+        self.io = io
+        self.auto_ack = auto_ack
+        self.callbacks = 0
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks += 1
+        callback()
+        if self.auto_ack and self.io._delivery_tag:
+            confirm(self.io, self.io._delivery_tag, multiple=True)
+
+
+def confirm(io, delivery_tag, multiple=False, ack=True):
+    method_class = pika.spec.Basic.Ack if ack else pika.spec.Basic.Nack
+    io._on_confirm(SimpleNamespace(method=method_class(delivery_tag=delivery_tag, multiple=multiple)))
+
+
+def make_io(ready=True, auto_ack=True):
+    io = PublisherThread()
+    io._channel = FakeChannel()
+    io._ioloop = FakeIOLoop(io, auto_ack=auto_ack)
+    io._ready = ready
+    io.start = lambda: None
+    io._reply_queue = "amq.gen-replies"
+    return io
+
+
+def make_publisher():
+    publisher = RabbitMQPublisher()
+    publisher._io = make_io()
+    publisher.channel = publisher._io._channel
+    return publisher
+
+
+def make_task(task_type="text_to_command", **extra):
+    task = {
+        "task_id": "task-id",
+        "user_id": "user-id",
+        "task_type": task_type,
+        "input_data": "Покажи список событий",
+        "prediction_id": "prediction-id",
+    }
+    task.update(extra)
+    return task
+
+
+def test_tasks_are_routed_by_type_and_priority():
+    publisher = make_publisher()
+
+    assert publisher.publish_task(make_task())
+    assert publisher.publish_task(make_task("speech_to_text", priority="bulk"))
+
+    (exchange, key, _, props), (_, stt_key, _, stt_props) = publisher.channel.published
+    assert exchange == "ml_tasks"
+    assert key == "task.text_to_command.interactive"
+    assert props.priority == PRIORITIES["interactive"]
+    assert stt_key == "task.speech_to_text.bulk"
+    assert stt_props.priority == PRIORITIES["bulk"]
+    assert props.priority > stt_props.priority
+
+
+def test_each_task_type_has_its_own_priority_queue():
+    specs = dict(queue_specs())
+    bindings = dict(binding_specs())
+
+    for queue in ("ml_tasks.text_to_command", "ml_tasks.speech_to_text"):
+        assert specs[queue]["x-max-priority"] == 10
+        assert queue in bindings
+    assert bindings["ml_tasks.speech_to_text"] == "task.speech_to_text.*"
+
+
+def test_task_deadline_becomes_header_and_message_ttl():
+    publisher = make_publisher()
+    deadline = time.time() + 30
+
+    assert publisher.publish_task(make_task(deadline=deadline))
+
+    props = publisher.channel.published[0][3]
+    assert props.headers["x-deadline"] == deadline
+    assert 29000 <= int(props.expiration) <= 30000
+
+
+def test_task_queues_are_bounded_and_shed_to_their_own_queue():
+    specs = dict(queue_specs())
+
+    arguments = specs["ml_tasks.text_to_command"]
+    assert arguments["x-max-length"] == settings.RABBITMQ_QUEUE_MAX_LENGTH
+    assert arguments["x-overflow"] == "drop-head"
+    assert arguments["x-dead-letter-routing-key"] == "ml_tasks.text_to_command.shed"
+    assert "ml_tasks.text_to_command.shed" in specs
+
+
+def test_tasks_submitted_before_the_flush_go_out_in_one_pass():
+    io = make_io(ready=False, auto_ack=False)
+    futures = [io.submit(make_task(task_id=str(i))) for i in range(5)]
+    assert io._channel.published == []
+
+    io._on_ready()
+
+    assert [body["task_id"] for _, _, body, _ in io._channel.published] == [str(i) for i in range(5)]
+    assert not any(future.done() for future in futures)
+
+    # одно подтверждение multiple=True разрешает всю пачку
+    confirm(io, 5, multiple=True)
+    assert all(future.result(timeout=1) is True for future in futures)
+    assert io._unconfirmed == {}
+
+
+def test_nack_fails_only_the_rejected_message():
+    io = make_io(auto_ack=False)
+    first, second = io.submit(make_task()), io.submit(make_task())
+
+    confirm(io, 1, ack=False)
+    confirm(io, 2)
+
+    with pytest.raises(NackError):
+        first.result(timeout=1)
+    assert second.result(timeout=1) is True
+
+
+def test_cancelled_task_is_not_published():
+    io = make_io(ready=False)
+    cancelled, kept = io.submit(make_task(task_id="cancelled")), io.submit(make_task(task_id="kept"))
+    assert cancelled.cancel()
+
+    io._on_ready()
+    confirm(io, 1)
+
+    assert [body["task_id"] for _, _, body, _ in io._channel.published] == ["kept"]
+    assert kept.result(timeout=1) is True
+
+
+def test_full_pending_queue_fails_fast(monkeypatch):
+    monkeypatch.setattr(settings, "PUBLISHER_MAX_PENDING", 1)
+    io = make_io(ready=False)
+    io.submit(make_task())
+
+    with pytest.raises(RuntimeError):
+        io.submit(make_task()).result(timeout=0)
+
+
+def test_abandoned_tasks_do_not_hold_pending_slots(monkeypatch):
+    monkeypatch.setattr(settings, "PUBLISHER_MAX_PENDING", 2)
+    monkeypatch.setattr(settings, "BROKER_CALL_BUDGET_MS", 10)
+    publisher = make_publisher()
+    publisher._io._ready = False
+
+    # брокер недоступен: вызовы не дождались подтверждения и отменили свои задачи
+    assert publisher.publish_tasks([make_task(), make_task()]) is False
+    abandoned = publisher._io.submit(make_task())
+    abandoned.cancel()
+    assert len(publisher._io._pending) == 0
+
+    # брокер вернулся: новые задачи принимаются и уходят, отменённые — нет
+    publisher._io._ready = True
+    assert publisher.publish_tasks([make_task(task_id="fresh-1"), make_task(task_id="fresh-2")])
+    assert [body["task_id"] for _, _, body, _ in publisher.channel.published] == ["fresh-1", "fresh-2"]
+
+
+def test_publish_tasks_returns_false_when_broker_does_not_confirm(monkeypatch):
+    monkeypatch.setattr(settings, "BROKER_CALL_BUDGET_MS", 10)
+    publisher = make_publisher()
+    publisher._io._ioloop.auto_ack = False
+
+    assert publisher.publish_tasks([make_task(), make_task()]) is False
+
+
+def reply_to(io, correlation_id, result):
+    io._on_reply(None, None, SimpleNamespace(correlation_id=correlation_id), json.dumps(result))
+
+
+def test_rpc_call_waits_for_the_reply_with_its_correlation_id():
+    publisher = make_publisher()
+    outcome = {}
+    caller = threading.Thread(target=lambda: outcome.update(reply=publisher.call(make_task(), timeout=5)))
+    caller.start()
+
+    deadline = time.time() + 5
+    while not publisher.channel.published and time.time() < deadline:
+        time.sleep(0.01)
+    props = publisher.channel.published[0][3]
+    assert props.reply_to == "amq.gen-replies"
+    assert props.correlation_id == "task-id"
+
+    # чужой ответ не будит вызывающего
+    reply_to(publisher._io, "other-task", {"status": "completed"})
+    reply_to(publisher._io, "task-id", {"status": "completed", "confidence": 0.9})
+    caller.join(timeout=5)
+
+    assert outcome["reply"] == {"status": "completed", "confidence": 0.9}
+    assert publisher._io._replies == {}
+
+
+def test_rpc_call_returns_none_and_forgets_reply_on_timeout():
+    publisher = make_publisher()
+
+    assert publisher.call(make_task(), timeout=0.01) is None
+    assert publisher._io._replies == {}
+    # опоздавший ответ молча отбрасывается
+    reply_to(publisher._io, "task-id", {"status": "completed"})
+
+
+def test_connection_loss_fails_pending_rpc_calls():
+    io = make_io(auto_ack=False)
+    reply = Future()
+    io.submit(make_task(), reply=reply)
+
+    io._fail_unconfirmed(RuntimeError("connection lost"))
+
+    with pytest.raises(RuntimeError):
+        reply.result(timeout=1)
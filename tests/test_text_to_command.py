@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+import pytest
+
+from classes import TextToCommandModel
+
+
+@pytest.fixture(scope="module")
+def model():
+    model = TextToCommandModel(model_path="dummy_path")
+    model.load_model()
+    return model
+
+
+@pytest.mark.parametrize("text, command_type", [
+    ("Покажи список событий", "list_events"),
+    ("Удали событие и покажи список", "delete_event"),
+    ("Обнови встречу", "update_event"),
+    ("show my events", "list_events"),
+    # создание важнее остальных ключевых слов, где бы они ни стояли
+    ("Покажи и добавь событие", "create_event"),
+    ("Просто текст без команды", "unknown"),
+])
+def test_intent_follows_keyword_priority(model, text, command_type):
+    assert model.predict(text)["command_type"] == command_type
+
+
+def test_create_extracts_title_date_and_time(model):
+    result = model.predict("Добавь “Созвон с командой” завтра в 10.30")
+    start = (date.today() + timedelta(days=1)).isoformat()
+
+    assert result["parameters"] == {
+        "title": "Созвон с командой",
+        "start_time": f"{start}T10:30:00",
+        "end_time": f"{start}T11:30:00",
+    }
+
+
+def test_create_without_title_and_time_uses_defaults(model):
+    params = model.predict("create meeting")["parameters"]
+
+    assert params["title"] == "create meeting"
+    assert params["start_time"] == f"{date.today().isoformat()}T09:00:00"
+
+
+def test_predict_batch_matches_predict(model):
+    texts = ["Покажи список событий", "Добавь \"Ретро\" завтра в 16:00", "create meeting", "Привет"]
+
+    assert model.predict_batch(texts) == [model.predict(text) for text in texts]
+    assert model.predict_batch([]) == []
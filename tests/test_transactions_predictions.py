@@ -2,7 +2,7 @@ from app.db.base import SessionLocal
 from app.models.transaction import TransactionDB
 from app.models.user import UserDB
 from app.rabbitmq.publisher import publisher
-from app.repositories import deposit, withdraw
+from app.repositories import deposit, submit_predictions, withdraw
 
 
 def login(client, email, password):
@@ -338,3 +338,173 @@ def test_prediction_queue_publish_failure_returns_500(client, monkeypatch):
     assert r.status_code == 500
 
 
+def test_batch_prediction_charges_once_and_publishes_all_tasks(client, monkeypatch, make_user):
+    headers = make_user(50.0).headers
+    batches = []
+    monkeypatch.setattr(publisher, "publish_tasks", lambda tasks: batches.append(tasks) or True)
+
+    texts = ["Покажи список событий", "Удали событие", "Создай событие на завтра в 15:00"]
+    r = client.post("/predict/text/batch", headers=headers, json={"texts": texts})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["charged"] == 30.0
+    assert body["balance"] == 20.0
+    assert len(body["prediction_ids"]) == 3
+
+    assert len(batches) == 1
+    assert [task["input_data"] for task in batches[0]] == texts
+    assert [task["prediction_id"] for task in batches[0]] == body["prediction_ids"]
+    assert {task["priority"] for task in batches[0]} == {"bulk"}
+
+    r = client.get("/users/me/predictions", headers=headers)
+    assert sorted(p["id"] for p in r.json()) == sorted(body["prediction_ids"])
+
+    r = client.get("/users/me/transactions", headers=headers)
+    txs = r.json()
+    assert [tx["type"] for tx in txs] == ["withdrawal"] * 3
+    assert sorted(tx["balance_after"] for tx in txs) == [20.0, 30.0, 40.0]
+
+
+def test_batch_prediction_insufficient_funds_changes_nothing(client, monkeypatch, make_user):
+    headers = make_user(25.0).headers
+    monkeypatch.setattr(publisher, "publish_tasks", lambda tasks: True)
+
+    r = client.post("/predict/text/batch", headers=headers, json={"texts": ["a", "b", "c"]})
+    assert r.status_code == 400
+
+    assert client.get("/users/me/balance", headers=headers).json()["balance"] == 25.0
+    assert client.get("/users/me/predictions", headers=headers).json() == []
+    assert client.get("/users/me/transactions", headers=headers).json() == []
+
+
+def test_batch_prediction_rejects_oversized_batch(client, make_user):
+    from app.core.config import settings
+
+    headers = make_user(1_000_000.0).headers
+    texts = ["text"] * (settings.PREDICTION_BATCH_MAX_SIZE + 1)
+
+    r = client.post("/predict/text/batch", headers=headers, json={"texts": texts})
+    assert r.status_code == 422
+
+
+def test_concurrent_submissions_do_not_lose_balance_updates(make_user):
+    from concurrent.futures import ThreadPoolExecutor
+
+    user_id = make_user(50.0).id
+
+    def submit(_):
+        session = SessionLocal()
+        try:
+            submit_predictions(session, user_id, ["Покажи список событий"], "text_to_command", 10.0)
+            return True
+        except ValueError:
+            return False
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outcomes = list(pool.map(submit, range(20)))
+
+    # денег ровно на пять предсказаний: остальные запросы отклонены, а не списаны «в минус»
+    assert outcomes.count(True) == 5
+    session = SessionLocal()
+    try:
+        user = session.query(UserDB).filter(UserDB.id == user_id).first()
+        assert user.balance == 0.0
+        txs = session.query(TransactionDB).filter(TransactionDB.user_id == user_id).all()
+        assert len(txs) == 5
+        assert sorted(tx.balance_after for tx in txs) == [0.0, 10.0, 20.0, 30.0, 40.0]
+    finally:
+        session.close()
+
+
+def test_deposits_overlapping_submissions_do_not_lose_charges(make_user):
+    from concurrent.futures import ThreadPoolExecutor
+
+    user_id = make_user(1000.0).id
+
+    def work(i):
+        session = SessionLocal()
+        try:
+            if i % 2:
+                deposit(session, user_id, 5.0)
+            else:
+                submit_predictions(session, user_id, ["Покажи список событий"], "text_to_command", 10.0)
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(work, range(40)))
+
+    session = SessionLocal()
+    try:
+        # 20 пополнений по 5 и 20 списаний по 10
+        assert session.get(UserDB, user_id).balance == 1000.0 + 100.0 - 200.0
+    finally:
+        session.close()
+
+
+def test_concurrent_withdrawals_never_overdraw(make_user):
+    from concurrent.futures import ThreadPoolExecutor
+
+    user_id = make_user(50.0).id
+
+    def spend(_):
+        session = SessionLocal()
+        try:
+            withdraw(session, user_id, 10.0)
+            return True
+        except ValueError:
+            return False
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outcomes = list(pool.map(spend, range(20)))
+
+    assert outcomes.count(True) == 5
+    session = SessionLocal()
+    try:
+        assert session.get(UserDB, user_id).balance == 0.0
+    finally:
+        session.close()
+
+
+def test_redelivered_results_are_applied_once(make_user):
+    import json
+
+    from app.models.calendar_event import CalendarEventDB
+    from app.models.prediction import PredictionDB
+    from app.repositories import save_prediction_results, submit_predictions
+
+    user_id = make_user(50.0).id
+    session = SessionLocal()
+    try:
+        predictions, _, tasks = submit_predictions(
+            session, user_id, ["Создай встречу", "Покажи события"], "text_to_command", 10.0
+        )
+        payload = {"command_type": "create_event", "parameters": {"title": "Встреча"}, "confidence": 0.9}
+        created = {
+            'task_id': tasks[0]['task_id'],
+            'prediction_id': tasks[0]['prediction_id'],
+            'output_data': json.dumps(payload),
+            'confidence': 0.9,
+            'status': 'completed',
+            'payload': payload,
+        }
+        expired = {'task_id': tasks[1]['task_id'], 'prediction_id': tasks[1]['prediction_id'], 'status': 'expired'}
+
+        # брокер доставляет задачи at-least-once: результат сохраняется повторно
+        save_prediction_results(session, [created])
+        save_prediction_results(session, [created])
+        # просроченная и возвращённая задача, досчитанная при повторной доставке
+        assert save_prediction_results(session, [expired], refund_amount=10.0) == 1
+        late = {**created, 'task_id': tasks[1]['task_id'], 'prediction_id': tasks[1]['prediction_id']}
+        assert save_prediction_results(session, [late, expired], refund_amount=10.0) == 0
+
+        events = session.query(CalendarEventDB).filter(CalendarEventDB.user_id == user_id).all()
+        assert len(events) == 1
+        assert session.get(PredictionDB, tasks[1]['prediction_id']).status == 'expired'
+        assert session.get(UserDB, user_id).balance == 40.0
+    finally:
+        session.close()
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.api.events import _stream
+from app.core.config import settings
+from app.core.events import RESYNC, UserEvents, user_events
+from app.db.base import SessionLocal
+from app.rabbitmq.publisher import publisher
+from app.rabbitmq.results import result_notifier
+from app.repositories import deposit
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_events_reach_every_subscriber_of_the_user():
+    hub = UserEvents()
+
+    async def scenario():
+        first, second = hub.subscribe("u1"), hub.subscribe("u1")
+        other = hub.subscribe("u2")
+        # publish зовут потоки запросов и слушатель брокера, а не event loop
+        await asyncio.to_thread(hub.publish, "u1", {"type": "transaction", "balance": 40.0})
+        events = await asyncio.wait_for(asyncio.gather(first.get(), second.get()), 1)
+        assert events == [{"type": "transaction", "balance": 40.0}] * 2
+        assert other.empty()
+
+        hub.unsubscribe("u1", first)
+        hub.unsubscribe("u1", second)
+        hub.unsubscribe("u2", other)
+        assert hub.subscribers() == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_gets_resync_instead_of_backlog(monkeypatch):
+    monkeypatch.setattr(settings, "EVENTS_QUEUE_SIZE", 3)
+    hub = UserEvents()
+
+    async def scenario():
+        queue = hub.subscribe("u1")
+        for i in range(5):
+            hub.publish("u1", {"type": "prediction", "prediction_ids": [str(i)]})
+        await asyncio.sleep(0)
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        assert RESYNC in events
+        assert len(events) <= 3
+
+    asyncio.run(scenario())
+
+
+def test_stream_formats_events_and_unsubscribes_on_close():
+    async def scenario():
+        queue = user_events.subscribe("stream-user")
+        stream = _stream(FakeRequest(), "stream-user", queue)
+        assert (await stream.__anext__()).startswith("retry:")
+
+        user_events.publish("stream-user", {"type": "transaction", "balance": 10.0})
+        chunk = await asyncio.wait_for(stream.__anext__(), 1)
+        assert chunk == 'event: transaction\ndata: {"type": "transaction", "balance": 10.0}\n\n'
+
+        await stream.aclose()
+        assert user_events.subscribers() == 0
+
+    asyncio.run(scenario())
+
+
+def test_deposit_and_prediction_are_pushed_to_the_user(client, monkeypatch, make_user):
+    monkeypatch.setattr(settings, "PREDICTION_EXECUTION_MODE", "queue")
+    published = []
+    monkeypatch.setattr(publisher, "publish_task", lambda task: published.append(task) or True)
+    user = make_user()
+    user_id, headers = user.id, user.headers
+
+    def deposit_funds():
+        session = SessionLocal()
+        try:
+            deposit(session, user_id, 25.0)
+        finally:
+            session.close()
+
+    async def scenario():
+        queue = user_events.subscribe(user_id)
+        try:
+            await asyncio.to_thread(deposit_funds)
+            assert (await asyncio.wait_for(queue.get(), 1))["balance"] == 75.0
+
+            r = await asyncio.to_thread(
+                client.post, "/predict/text", headers=headers, json={"text": "Покажи список событий"}
+            )
+            prediction_id = r.json()["id"]
+            charged = await asyncio.wait_for(queue.get(), 1)
+            created = await asyncio.wait_for(queue.get(), 1)
+            assert charged == {"type": "transaction", "balance": 65.0}
+            assert created["prediction_ids"] == [prediction_id]
+
+            # готовый результат воркера приходит через слушатель обменника результатов
+            threading.Thread(target=result_notifier.notify, args=({
+                "prediction_id": prediction_id, "user_id": user_id, "status": "completed",
+            },)).start()
+            done = await asyncio.wait_for(queue.get(), 1)
+            assert done == {"type": "prediction", "prediction_ids": [prediction_id], "status": "completed"}
+        finally:
+            user_events.unsubscribe(user_id, queue)
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("query", ["", "?token=not-a-jwt"])
+def test_stream_requires_valid_token(client, query):
+    assert client.get(f"/users/me/events/stream{query}").status_code == 401
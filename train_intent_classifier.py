@@ -0,0 +1,30 @@
+"""
+Обучение IntentClassifierModel на размеченных командах (JSONL: {"text": ..., "label": ...})
+
+Запуск: python train_intent_classifier.py [data/intent_commands.jsonl] [models/intent_classifier.npz]
+"""
+import os
+import sys
+import time
+
+from classes.intent_classifier_model import IntentClassifierModel, read_jsonl
+
+
+def main():
+    data_path = sys.argv[1] if len(sys.argv) > 1 else "data/intent_commands.jsonl"
+    model_path = sys.argv[2] if len(sys.argv) > 2 else "models/intent_classifier.npz"
+
+    texts, labels = read_jsonl(data_path)
+    model = IntentClassifierModel(model_path)
+    start = time.perf_counter()
+    model.train(texts, labels)
+    print(f"Trained on {len(texts)} commands in {time.perf_counter() - start:.1f} s, labels: {model.get_labels()}")
+
+    if os.path.dirname(model_path):
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    model.save_model(model_path)
+    print(f"Saved {model_path} ({os.path.getsize(model_path) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()